@@ -3,23 +3,30 @@ AI-powered features API routes
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Dict, Any
 import logging
 
 from app.models.schemas import (
+    ChatRequest,
     TravelQueryRequest,
     ParsedTravelQuery,
     ApiResponse
 )
-from app.services.ai_service import AIService
+from app.services.ai_service import CHAT_ERROR_RESPONSE, AIService, get_ai_service
+from app.services.circuit_breaker import OPEN, circuit_breaker_status
+from app.services.route_service import RouteService
 from app.core.config import get_ai_config
+from app.core.database import get_async_db
+from app.utils.streaming import SSE_MEDIA_TYPE, STREAM_HEADERS, sse_event
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Dependency injection
-def get_ai_service() -> AIService:
-    return AIService()
+# Dependency injection (get_ai_service returns the process-wide AIService)
+def get_route_service(db: AsyncSession = Depends(get_async_db)) -> RouteService:
+    return RouteService(db=db)
 
 
 @router.post("/parse-query", response_model=ApiResponse)
@@ -86,13 +93,17 @@ async def optimize_travel_route(
     destinations: List[str],
     start_location: str,
     preferences: Dict[str, Any],
-    ai_service: AIService = Depends(get_ai_service)
+    route_service: RouteService = Depends(get_route_service)
 ):
     """
-    Optimize travel route using AI algorithms
+    Optimize travel route over the destination distance matrix
+
+    Small routes are solved exactly, larger ones with nearest-neighbour
+    construction plus 2-opt/Or-opt improvement. Set preferences.annotate
+    to add AI-written travel notes to the computed route.
     """
     try:
-        optimized_route = await ai_service.optimize_route(
+        optimized_route = await route_service.optimize_route(
             destinations=destinations,
             start_location=start_location,
             preferences=preferences
@@ -146,6 +157,12 @@ async def get_model_status():
                 "query_parsing"
             ]
         
+        # Provider health; calls to a provider with an open circuit fail fast
+        breakers = circuit_breaker_status()
+        status["circuit_state"] = breakers.get(status["provider"], {}).get("state", "closed")
+        status["available"] = status["available"] and status["circuit_state"] != OPEN
+        status["circuit_breakers"] = breakers
+        
         return ApiResponse(
             success=True,
             message="Model status retrieved successfully",
@@ -190,3 +207,29 @@ async def chat_with_ai(
             status_code=500,
             detail=f"Failed to process chat message: {str(e)}"
         )
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_ai(
+    request: ChatRequest,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Chat with AI assistant, streaming the response as Server-Sent Events
+
+    Emits a `token` event ({"text": ...}) for each piece of the response as
+    the model generates it, then a `done` event with the full response, or
+    an `error` event if generation fails part-way.
+    """
+    async def events() -> AsyncIterator[str]:
+        chunks = []
+        try:
+            async for chunk in ai_service.chat_stream(request.message, request.context):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            yield sse_event("done", {"response": "".join(chunks)})
+        except Exception as e:
+            logger.error(f"Error in AI chat stream: {str(e)}")
+            yield sse_event("error", {"message": CHAT_ERROR_RESPONSE})
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=STREAM_HEADERS)
@@ -3,9 +3,11 @@ Destinations API routes
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
+from app.core.database import get_async_db
 from app.models.schemas import (
     DestinationSchema,
     DestinationSearchResponse,
@@ -17,13 +19,14 @@ from app.models.schemas import (
 )
 from app.services.destination_service import DestinationService
 from app.services.sentiment_service import SentimentService
+from app.utils.pagination import InvalidCursorError
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Dependency injection
-def get_destination_service() -> DestinationService:
-    return DestinationService()
+def get_destination_service(db: AsyncSession = Depends(get_async_db)) -> DestinationService:
+    return DestinationService(db=db)
 
 def get_sentiment_service() -> SentimentService:
     return SentimentService()
@@ -37,8 +40,12 @@ async def search_destinations(
     city: Optional[str] = Query(None, description="Filter by city"),
     province: Optional[str] = Query(None, description="Filter by province"),
     min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum rating"),
+    fuzzy: bool = Query(False, description="Typo-tolerant matching ordered by similarity"),
+    similarity_threshold: Optional[float] = Query(None, ge=0, le=1, description="Minimum similarity for fuzzy matching"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (overrides page)"),
+    include_total: bool = Query(True, description="Compute the exact total (estimated when false)"),
     destination_service: DestinationService = Depends(get_destination_service)
 ):
     """
@@ -60,11 +67,17 @@ async def search_destinations(
             query=q,
             filters=filters,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            fuzzy=fuzzy,
+            similarity_threshold=similarity_threshold,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return result
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching destinations: {str(e)}")
         raise HTTPException(
@@ -109,15 +122,24 @@ async def get_destination(
 async def list_destinations(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (overrides page)"),
+    include_total: bool = Query(True, description="Compute the exact total (estimated when false)"),
     destination_service: DestinationService = Depends(get_destination_service)
 ):
     """
     List all destinations with pagination
     """
     try:
-        result = await destination_service.list_destinations(page=page, page_size=page_size)
+        result = await destination_service.list_destinations(
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+            include_total=include_total
+        )
         return result
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing destinations: {str(e)}")
         raise HTTPException(
@@ -2,30 +2,43 @@
 Travel planning API routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, List, Optional
 import logging
 
 from app.models.schemas import (
     TravelQueryRequest,
     ItineraryGenerationRequest,
     ItineraryGenerationResponse,
+    ItineraryUpdateRequest,
     ApiResponse,
     ParsedTravelQuery
 )
-from app.services.ai_service import AIService
-from app.services.itinerary_service import ItineraryService
+from app.services.ai_service import AIService, get_ai_service
+from app.services.itinerary_service import (
+    InvalidItineraryUpdateError,
+    ItineraryService,
+    NoDestinationsFoundError
+)
 from app.core.config import settings
+from app.core.database import get_async_db, get_async_session_factory
+from app.utils.streaming import (
+    NDJSON_MEDIA_TYPE,
+    SSE_MEDIA_TYPE,
+    STREAM_HEADERS,
+    ndjson_line,
+    sse_event
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Dependency injection
-def get_ai_service() -> AIService:
-    return AIService()
-
-def get_itinerary_service() -> ItineraryService:
-    return ItineraryService()
+# Dependency injection (get_ai_service returns the process-wide AIService)
+def get_itinerary_service(db: AsyncSession = Depends(get_async_db)) -> ItineraryService:
+    return ItineraryService(db=db)
 
 
 @router.post("/query", response_model=ApiResponse)
@@ -99,6 +112,8 @@ async def generate_itinerary(
 
         return itinerary_response
 
+    except NoDestinationsFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating itinerary: {str(e)}")
         raise HTTPException(
@@ -107,6 +122,55 @@ async def generate_itinerary(
         )
 
 
+@router.post("/generate-itinerary/stream")
+async def stream_itinerary(
+    request: ItineraryGenerationRequest,
+    http_request: Request,
+    session_factory: async_sessionmaker = Depends(get_async_session_factory)
+):
+    """
+    Generate an itinerary, streaming it day by day as it is planned
+
+    Frames, in order: `header` (the itinerary without its days), one `day`
+    per trip day, then `summary` with the total cost and AI notes; an
+    `error` frame ends a stream that fails part-way, and is the only frame
+    when no destinations match the trip. Sent as Server-Sent
+    Events when the client accepts text/event-stream, newline-delimited
+    JSON otherwise.
+    """
+    use_sse = SSE_MEDIA_TYPE in http_request.headers.get("accept", "")
+    frame = sse_event if use_sse else ndjson_line
+    destination_ids: List[str] = []
+    itinerary_service: Optional[ItineraryService] = None
+
+    async def frames() -> AsyncIterator[str]:
+        nonlocal itinerary_service
+        # The stream outlives the request's dependencies, so it has its own
+        # session, opened (and always closed) only once streaming starts
+        async with session_factory() as db:
+            itinerary_service = ItineraryService(db=db)
+            try:
+                async for event, data in itinerary_service.generate_itinerary_stream(request):
+                    if event == "day":
+                        destination_ids.extend(item.destination.id for item in data.items)
+                    yield frame(event, data)
+            except Exception as e:
+                logger.error(f"Error streaming itinerary: {str(e)}")
+                yield frame("error", {"detail": f"Failed to generate itinerary: {str(e)}"})
+
+    async def update_sentiments():
+        # Runs once the stream is finished, with every planned destination
+        if itinerary_service is not None:
+            await itinerary_service.update_destination_sentiments(destination_ids)
+
+    return StreamingResponse(
+        frames(),
+        media_type=SSE_MEDIA_TYPE if use_sse else NDJSON_MEDIA_TYPE,
+        headers=STREAM_HEADERS,
+        background=BackgroundTask(update_sentiments)
+    )
+
+
 @router.get("/itinerary/{itinerary_id}")
 async def get_itinerary(
     itinerary_id: str,
@@ -142,11 +206,12 @@ async def get_itinerary(
 @router.put("/itinerary/{itinerary_id}")
 async def update_itinerary(
     itinerary_id: str,
-    updates: dict,
+    updates: ItineraryUpdateRequest,
     itinerary_service: ItineraryService = Depends(get_itinerary_service)
 ):
     """
-    Update an existing itinerary
+    Update an existing itinerary's details and move, insert or remove its
+    items; only the days the operations touch are re-timed and re-costed
     """
     try:
         updated_itinerary = await itinerary_service.update_itinerary(itinerary_id, updates)
@@ -165,6 +230,8 @@ async def update_itinerary(
 
     except HTTPException:
         raise
+    except InvalidItineraryUpdateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error updating itinerary: {str(e)}")
         raise HTTPException(
@@ -2,30 +2,125 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.engine import Engine
 import logging
-from typing import Generator
+import time
+from typing import Generator, AsyncGenerator, Dict, Any
 
-from app.core.config import get_settings
+from app.core.config import get_settings, Settings
+from app.utils.metrics import LatencyStats
 
 logger = logging.getLogger(__name__)
 
+
+class PoolStatistics:
+    """Connection pool checkout statistics"""
+
+    def __init__(self):
+        self.wait_time = LatencyStats()
+        self.timeouts = 0
+
+    def get_summary(self) -> Dict[str, Any]:
+        return {
+            "checkout_wait": self.wait_time.get_summary(),
+            "timeouts": self.timeouts
+        }
+
+
+class InstrumentedPoolMixin:
+    """Records how long callers wait for a pooled connection"""
+
+    def __init__(self, *args, **kwargs):
+        self.statistics = PoolStatistics()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.statistics.timeouts += 1
+            raise
+        finally:
+            self.statistics.wait_time.record(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    """QueuePool with checkout statistics (sync engine)"""
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """QueuePool with checkout statistics (asyncio engine)"""
+
+
+def is_sqlite_url(database_url: str) -> bool:
+    """Check whether a database URL points at SQLite"""
+    return database_url.startswith("sqlite")
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    scheme, _, rest = database_url.partition("://")
+    dialect = scheme.split("+")[0]
+
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return database_url
+
+
+def get_engine_options(settings: Settings, use_async: bool = False) -> Dict[str, Any]:
+    """
+    Get engine keyword arguments for the configured database backend.
+
+    SQLite (tests/local development) shares one static connection, every
+    other backend gets a real connection pool sized from settings.
+    """
+    options: Dict[str, Any] = {"echo": settings.debug}  # Log SQL queries in debug mode
+
+    if is_sqlite_url(settings.database_url):
+        options.update({
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False}
+        })
+    else:
+        options.update({
+            "poolclass": InstrumentedAsyncQueuePool if use_async else InstrumentedQueuePool,
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_pre_ping": settings.db_pool_pre_ping
+        })
+
+    return options
+
+
 # Database engine configuration
 _settings = get_settings()
-engine = create_engine(
-    _settings.database_url,
-    poolclass=StaticPool,
-    connect_args={
-        "check_same_thread": False  # Only needed for SQLite
-    } if "sqlite" in _settings.database_url else {},
-    echo=_settings.debug  # Log SQL queries in debug mode
+engine = create_engine(_settings.database_url, **get_engine_options(_settings))
+
+# Async engine used by the API; the sync engine stays for scripts and migrations
+async_engine = create_async_engine(
+    get_async_database_url(_settings.database_url),
+    **get_engine_options(_settings, use_async=True)
 )
 
-# Session factory
+# Session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Base class for all models
 Base = declarative_base()
@@ -45,18 +140,54 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get an async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """
+    Dependency to get the async session factory, for work that outlives the
+    request (e.g. streamed responses) and opens its own session
+    """
+    return AsyncSessionLocal
+
+
 def create_tables():
     """
     Create all tables in the database
     """
     try:
+        from app.models.database_models import upgrade_schema as upgrade_tables
+
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            upgrade_tables(connection)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
         raise
 
 
+async def upgrade_schema(session_factory: async_sessionmaker = AsyncSessionLocal):
+    """
+    Add the columns, indexes and search DDL that tables created by an
+    earlier version lack
+    """
+    from app.models.database_models import upgrade_schema as upgrade_tables
+
+    try:
+        async with session_factory() as db:
+            await db.run_sync(lambda session: upgrade_tables(session.connection()))
+            await db.commit()
+        logger.info("Database schema up to date")
+    except Exception as e:
+        logger.error(f"Error upgrading database schema: {str(e)}")
+
+
 def drop_tables():
     """
     Drop all tables in the database (use with caution!)
@@ -75,9 +206,30 @@ def check_database_connection() -> bool:
     """
     try:
         with engine.connect() as connection:
-            connection.execute("SELECT 1")
+            connection.execute(text("SELECT 1"))
         logger.info("Database connection successful")
         return True
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
         return False
+
+
+def get_pool_status(bind: Engine = None) -> Dict[str, Any]:
+    """
+    Get connection pool usage for sizing the pool
+    """
+    pool = (bind or async_engine.sync_engine).pool
+    status = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow
+        })
+    if isinstance(pool, InstrumentedPoolMixin):
+        status.update(pool.statistics.get_summary())
+
+    return status
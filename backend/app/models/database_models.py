@@ -4,7 +4,8 @@ SQLAlchemy database models
 
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, DateTime, Text, JSON,
-    ForeignKey, Table, Index, UniqueConstraint
+    ForeignKey, Table, Index, UniqueConstraint, DDL, event,
+    bindparam, inspect, select, update
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -12,7 +13,9 @@ from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
 
+from app.core.config import get_settings
 from app.core.database import Base
+from app.utils.geo import geohash_encode
 
 
 # Association table for many-to-many relationship between destinations and tags
@@ -68,6 +71,7 @@ class Destination(Base):
     city = Column(String(100), nullable=False, index=True)
     province = Column(String(100), nullable=False, index=True)
     country = Column(String(100), default="Indonesia")
+    geohash = Column(String(12), nullable=True, index=True)  # maintained from latitude/longitude
     
     # Ratings and reviews
     rating = Column(Float, default=0.0)
@@ -158,6 +162,7 @@ class Itinerary(Base):
     # Status
     is_public = Column(Boolean, default=False)
     is_template = Column(Boolean, default=False)
+    template_key = Column(String(64), nullable=True, index=True)  # request shape a template answers
     status = Column(String(20), default="draft")  # draft, published, archived
     
     # AI metadata
@@ -174,7 +179,10 @@ class Itinerary(Base):
     
     # Relationships
     user = relationship("User", back_populates="itineraries")
-    days = relationship("ItineraryDay", back_populates="itinerary", cascade="all, delete-orphan")
+    days = relationship(
+        "ItineraryDay", back_populates="itinerary", cascade="all, delete-orphan",
+        order_by="ItineraryDay.day_number"
+    )
 
 
 class ItineraryDay(Base):
@@ -192,7 +200,10 @@ class ItineraryDay(Base):
     
     # Relationships
     itinerary = relationship("Itinerary", back_populates="days")
-    items = relationship("ItineraryItem", back_populates="day", cascade="all, delete-orphan")
+    items = relationship(
+        "ItineraryItem", back_populates="day", cascade="all, delete-orphan",
+        order_by="ItineraryItem.order_index"
+    )
     
     # Unique constraint
     __table_args__ = (
@@ -219,7 +230,7 @@ class ItineraryItem(Base):
     transportation_notes = Column(Text, nullable=True)
     
     # Foreign keys
-    day_id = Column(UUID(as_uuid=True), ForeignKey("itinerary_days.id"), nullable=False)
+    day_id = Column(UUID(as_uuid=True), ForeignKey("itinerary_days.id"), nullable=False, index=True)
     destination_id = Column(UUID(as_uuid=True), ForeignKey("destinations.id"), nullable=False)
     
     # Relationships
@@ -284,3 +295,175 @@ class SentimentAnalysis(Base):
     
     # Relationships
     destination = relationship("Destination", back_populates="sentiment_analysis")
+
+
+# Full-text search index for destinations.
+# Postgres: weighted, unaccented Indonesian tsvector (name > city/province >
+# description) kept up to date as a generated column with a GIN index.
+# SQLite: external-content FTS5 table kept in sync by triggers, so tests
+# exercise the same ranked search path.
+TEXT_SEARCH_CONFIG = "jelajah_id"
+
+_postgres_search_ddl = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{TEXT_SEARCH_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {TEXT_SEARCH_CONFIG} (COPY = indonesian);
+            ALTER TEXT SEARCH CONFIGURATION {TEXT_SEARCH_CONFIG}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, indonesian_stem;
+        END IF;
+    END
+    $$
+    """,
+    f"""
+    ALTER TABLE destinations ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(city, '') || ' ' || coalesce(province, '')), 'B') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_destination_search_vector ON destinations USING GIN (search_vector)",
+    # Trigram indexes for typo-tolerant (fuzzy) lookup
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_destination_name_trgm ON destinations USING GIN (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_destination_city_trgm ON destinations USING GIN (city gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_destination_province_trgm ON destinations USING GIN (province gin_trgm_ops)",
+]
+
+_sqlite_search_ddl = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS destinations_fts USING fts5(
+        name, city, province, description,
+        content='destinations', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS destinations_fts_insert AFTER INSERT ON destinations BEGIN
+        INSERT INTO destinations_fts (rowid, name, city, province, description)
+        VALUES (new.rowid, new.name, new.city, new.province, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS destinations_fts_delete AFTER DELETE ON destinations BEGIN
+        INSERT INTO destinations_fts (destinations_fts, rowid, name, city, province, description)
+        VALUES ('delete', old.rowid, old.name, old.city, old.province, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS destinations_fts_update AFTER UPDATE ON destinations BEGIN
+        INSERT INTO destinations_fts (destinations_fts, rowid, name, city, province, description)
+        VALUES ('delete', old.rowid, old.name, old.city, old.province, old.description);
+        INSERT INTO destinations_fts (rowid, name, city, province, description)
+        VALUES (new.rowid, new.name, new.city, new.province, new.description);
+    END
+    """,
+]
+
+for statement in _postgres_search_ddl:
+    event.listen(Destination.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+for statement in _sqlite_search_ddl:
+    event.listen(Destination.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+event.listen(
+    Destination.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS destinations_fts").execute_if(dialect="sqlite")
+)
+
+
+# Geospatial lookup. Every backend gets a geohash column (set on flush) so
+# radius queries become a few index range scans; Postgres with PostGIS can
+# additionally use a geography column with a GiST index (USE_POSTGIS=true).
+@event.listens_for(Destination, "before_insert")
+@event.listens_for(Destination, "before_update")
+def _set_destination_geohash(mapper, connection, target):
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = geohash_encode(target.latitude, target.longitude)
+
+
+def _postgis_enabled(ddl, target, bind, **kw) -> bool:
+    return bind.dialect.name == "postgresql" and get_settings().use_postgis
+
+
+_postgis_ddl = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    ALTER TABLE destinations ADD COLUMN IF NOT EXISTS location geography(Point, 4326)
+    GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_destination_location_gist ON destinations USING GIST (location)",
+]
+
+for statement in _postgis_ddl:
+    event.listen(Destination.__table__, "after_create", DDL(statement).execute_if(callable_=_postgis_enabled))
+
+
+# Schema upgrades. create_all only creates missing tables, and the DDL above
+# only runs when the destinations table is created, so databases created by
+# an earlier version get the newer columns, indexes and search/geo DDL here
+# (every statement is idempotent; run on startup).
+_added_columns = [
+    Destination.__table__.c.geohash,
+    Itinerary.__table__.c.template_key,
+]
+
+_added_indexed_columns = _added_columns + [ItineraryItem.__table__.c.day_id]
+
+
+def upgrade_schema(connection):
+    """Bring existing tables up to date with the models"""
+    inspector = inspect(connection)
+    dialect = connection.dialect.name
+
+    for column in _added_columns:
+        table = column.table
+        if not inspector.has_table(table.name):
+            continue
+        if column.name not in {existing["name"] for existing in inspector.get_columns(table.name)}:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}"
+            )
+
+    for column in _added_indexed_columns:
+        if inspector.has_table(column.table.name):
+            for index in column.table.indexes:
+                if index.columns.contains_column(column):
+                    index.create(connection, checkfirst=True)
+
+    if not inspector.has_table(Destination.__tablename__):
+        return
+
+    if dialect == "postgresql":
+        statements = _postgres_search_ddl + (_postgis_ddl if get_settings().use_postgis else [])
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    elif dialect == "sqlite":
+        had_fts = inspector.has_table("destinations_fts")
+        for statement in _sqlite_search_ddl:
+            connection.exec_driver_sql(statement)
+        if not had_fts:
+            # Index the rows written before the FTS table and its triggers existed
+            connection.exec_driver_sql("INSERT INTO destinations_fts (destinations_fts) VALUES ('rebuild')")
+
+    # Geohashes are set on flush; fill them in for rows written before the column
+    table = Destination.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.latitude, table.c.longitude).where(
+            table.c.geohash.is_(None),
+            table.c.latitude.isnot(None),
+            table.c.longitude.isnot(None)
+        )
+    ).all()
+    if rows:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("destination_id")).values(geohash=bindparam("value")),
+            [
+                {"destination_id": dest_id, "value": geohash_encode(latitude, longitude)}
+                for dest_id, latitude, longitude in rows
+            ]
+        )
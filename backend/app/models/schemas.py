@@ -3,7 +3,7 @@ Pydantic schemas for API request/response models
 """
 
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Annotated, Literal, Union
 from datetime import datetime, date
 from enum import Enum
 
@@ -84,6 +84,7 @@ class DestinationSchema(BaseModel):
     facilities: List[str] = []
     tags: List[str] = []
     sentiment: Optional[SentimentAnalysisSchema] = None
+    distance_km: Optional[float] = None  # Set by nearby search
 
 
 class TransportationSchema(BaseModel):
@@ -154,6 +155,56 @@ class ItineraryGenerationRequest(BaseModel):
     start_date: Optional[date] = None
 
 
+class ItineraryItemMove(BaseModel):
+    op: Literal["move"]
+    item_id: str
+    to_day: int = Field(..., gt=0)
+    position: Optional[int] = Field(None, ge=0)  # None appends to the day
+
+
+class ItineraryItemInsert(BaseModel):
+    op: Literal["insert"]
+    destination_id: str
+    day: int = Field(..., gt=0)
+    position: Optional[int] = Field(None, ge=0)  # None appends to the day
+    duration: Optional[int] = Field(None, gt=0)  # in minutes, typical for the category if omitted
+    notes: Optional[str] = None
+
+
+class ItineraryItemRemove(BaseModel):
+    op: Literal["remove"]
+    item_id: str
+
+
+ItineraryOperation = Annotated[
+    Union[ItineraryItemMove, ItineraryItemInsert, ItineraryItemRemove],
+    Field(discriminator="op")
+]
+
+
+class ItineraryUpdateRequest(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    description: Optional[str] = None
+    is_public: Optional[bool] = None
+    status: Optional[Literal["draft", "published", "archived"]] = None
+    operations: List[ItineraryOperation] = []  # applied in order
+
+    @validator('title', 'is_public', 'status')
+    def validate_not_null(cls, v):
+        # Omit a field to leave it unchanged; only description may be cleared
+        if v is None:
+            raise ValueError('May not be null')
+        return v
+
+    class Config:
+        extra = "forbid"  # other itinerary fields are derived, not set directly
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=2000)
+    context: Dict[str, Any] = {}
+
+
 class SentimentAnalysisRequest(BaseModel):
     destination_id: str
     force_refresh: bool = False
@@ -169,15 +220,19 @@ class ApiResponse(BaseModel):
 
 class PaginatedResponse(BaseModel):
     items: List[Any]
-    total: int = Field(..., ge=0)
+    total: Optional[int] = Field(None, ge=0)  # None when include_total=false and no estimate
+    total_estimated: bool = False
     page: int = Field(..., gt=0)
     page_size: int = Field(..., gt=0)
-    total_pages: int = Field(..., ge=0)
+    total_pages: Optional[int] = Field(None, ge=0)
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
 
 
 class DestinationSearchResponse(BaseModel):
     destinations: List[DestinationSchema]
-    total: int
+    total: Optional[int] = None  # None when include_total=false and no estimate
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
     query: str
     filters_applied: Dict[str, Any] = {}
 
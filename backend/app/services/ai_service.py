@@ -2,27 +2,75 @@
 AI Service for natural language processing and travel recommendations
 """
 
+import asyncio
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Any, Optional, Tuple
 from datetime import datetime, date
 
+import aiohttp
+import httpx
+import numpy as np
+
 from app.models.schemas import ParsedTravelQuery, TravelerType, ActivityLevel
-# from app.core.config import get_ai_config  # Temporarily disabled
+from app.core.config import get_ai_config, get_settings
+from app.services.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from app.services.provider_executor import ProviderExecutor
+from app.services.response_cache import ResponseCache, cache_key
+from app.services.semantic_cache import SemanticCache, numbers_scope, places_scope, sentence_transformer_embedder
+from app.services.single_flight import SingleFlight
+from app.utils.metrics import LatencyStats
 from app.utils.prompt_templates import PromptTemplates
 
 logger = logging.getLogger(__name__)
 
+# Generation settings shared by every provider
+MAX_NEW_TOKENS = 500
+TEMPERATURE = 0.3
+
+CHAT_ERROR_RESPONSE = "Maaf, saya mengalami kesulitan memproses pertanyaan Anda. Silakan coba lagi."
+
 
 class AIService:
     """
     Service for AI-powered travel planning features
     """
     
-    def __init__(self):
-        self.ai_config = get_ai_config()
+    def __init__(self, ai_config: Optional[Dict[str, Any]] = None):
+        self.settings = get_settings()
+        self.ai_config = ai_config or get_ai_config()
         self.provider = self.ai_config.get("provider", "none")
         self._client = None
+        # Long-lived keep-alive connections to the provider, opened on first call
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._aiohttp_session: Optional[aiohttp.ClientSession] = None
+        # Threads for blocking SDK calls (Watsonx, Replicate), created on first call
+        self._executor: Optional[ProviderExecutor] = None
+        # Initialized Watsonx model handles by (model_id, generation params)
+        self._watsonx_models: Dict[str, Any] = {}
+        self._watsonx_lock = threading.Lock()
+        self._response_cache: Optional[ResponseCache] = None
+        if self.settings.ai_cache_enabled:
+            self._response_cache = ResponseCache(
+                max_entries=self.settings.ai_cache_max_entries,
+                redis_url=self.settings.redis_url if self.settings.ai_cache_use_redis else None
+            )
+        # Concurrent identical prompts share one provider call
+        self._in_flight = SingleFlight()
+        # Time to first token of streamed chat responses
+        self.first_token_time = LatencyStats()
+        self._semantic_cache: Optional[SemanticCache] = None
+        if self.settings.ai_semantic_cache_enabled:
+            embed = sentence_transformer_embedder(self.settings.ai_semantic_cache_model)
+            if embed is not None:
+                self._semantic_cache = SemanticCache(
+                    embed,
+                    threshold=self.settings.ai_semantic_cache_threshold,
+                    max_entries=self.settings.ai_semantic_cache_max_entries,
+                    ttl=self.settings.ai_semantic_cache_ttl
+                )
         self._initialize_client()
     
     def _initialize_client(self):
@@ -32,8 +80,11 @@ class AIService:
                 self._initialize_watsonx_client()
             elif self.provider == "openai":
                 self._initialize_openai_client()
-            elif self.provider == "huggingface":
-                self._initialize_huggingface_client()
+            elif self.provider == "replicate":
+                self._initialize_replicate_client()
+            elif self.provider in ("huggingface", "ibm_watson"):
+                # Plain HTTP APIs, served by the pooled HTTP clients
+                pass
             else:
                 logger.warning("No AI provider configured. AI features will be limited.")
         except Exception as e:
@@ -43,15 +94,7 @@ class AIService:
     def _initialize_watsonx_client(self):
         """Initialize IBM Watsonx client"""
         try:
-            from ibm_watsonx_ai import APIClient
-            from ibm_watsonx_ai import Credentials
-            
-            credentials = Credentials(
-                url=self.ai_config["url"],
-                api_key=self.ai_config["api_key"]
-            )
-            
-            self._client = APIClient(credentials)
+            self._client = self._new_watsonx_client()
             logger.info("IBM Watsonx client initialized successfully")
             
         except ImportError:
@@ -61,13 +104,26 @@ class AIService:
             logger.error(f"Failed to initialize IBM Watsonx client: {str(e)}")
             raise
     
+    def _new_watsonx_client(self):
+        """Authenticated Watsonx client (constructing one exchanges the API key for an IAM token)"""
+        from ibm_watsonx_ai import APIClient
+        from ibm_watsonx_ai import Credentials
+        
+        credentials = Credentials(
+            url=self.ai_config["url"],
+            api_key=self.ai_config["api_key"]
+        )
+        return APIClient(credentials)
+    
     def _initialize_openai_client(self):
         """Initialize OpenAI client"""
         try:
             import openai
             
-            openai.api_key = self.ai_config["api_key"]
-            self._client = openai
+            self._client = openai.AsyncOpenAI(
+                api_key=self.ai_config["api_key"],
+                http_client=self._get_http_client()
+            )
             logger.info("OpenAI client initialized successfully")
             
         except ImportError:
@@ -77,26 +133,82 @@ class AIService:
             logger.error(f"Failed to initialize OpenAI client: {str(e)}")
             raise
     
-    def _initialize_huggingface_client(self):
-        """Initialize Hugging Face client"""
+    def _initialize_replicate_client(self):
+        """Initialize Replicate client"""
         try:
-            from transformers import pipeline
+            import replicate
             
-            # Use a lightweight model for development
-            self._client = pipeline(
-                "text-generation",
-                model=settings.huggingface_model,
-                token=self.ai_config["api_key"]
-            )
-            logger.info("Hugging Face client initialized successfully")
+            self._client = replicate.Client(api_token=self.ai_config["api_token"])
+            logger.info("Replicate client initialized successfully")
             
         except ImportError:
-            logger.error("Transformers library not installed. Install with: pip install transformers torch")
+            logger.error("Replicate library not installed. Install with: pip install replicate")
             raise
         except Exception as e:
-            logger.error(f"Failed to initialize Hugging Face client: {str(e)}")
+            logger.error(f"Failed to initialize Replicate client: {str(e)}")
             raise
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive HTTPX client (Hugging Face, OpenAI)"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.settings.ai_http_max_connections,
+                    max_keepalive_connections=self.settings.ai_http_max_keepalive_connections,
+                    keepalive_expiry=self.settings.ai_http_keepalive_expiry
+                ),
+                timeout=self.settings.ai_http_timeout
+            )
+        return self._http_client
+    
+    def _get_aiohttp_session(self) -> aiohttp.ClientSession:
+        """Shared keep-alive aiohttp session (IBM Watson Orchestrate)"""
+        if self._aiohttp_session is None or self._aiohttp_session.closed:
+            self._aiohttp_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.settings.ai_http_max_connections,
+                    keepalive_timeout=self.settings.ai_http_keepalive_expiry
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.settings.ai_http_timeout)
+            )
+        return self._aiohttp_session
+    
+    def _get_executor(self) -> ProviderExecutor:
+        """Bounded thread pool for the provider's blocking SDK calls"""
+        if self._executor is None:
+            max_workers = (
+                self.settings.ai_watsonx_max_workers if self.provider == "ibm_watsonx"
+                else self.settings.ai_replicate_max_workers
+            )
+            self._executor = ProviderExecutor(self.provider, max_workers)
+        return self._executor
+    
+    def executor_stats(self) -> Dict[str, Any]:
+        """Thread pool occupancy and queue wait times per provider"""
+        return {self._executor.name: self._executor.stats()} if self._executor else {}
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache size, hit/miss counts and coalesced provider calls"""
+        stats = self._response_cache.stats() if self._response_cache else {}
+        stats["coalesced_calls"] = self._in_flight.shared
+        if self._semantic_cache is not None:
+            stats["semantic"] = self._semantic_cache.stats()
+        return stats
+    
+    async def aclose(self):
+        """Close pooled provider connections"""
+        if self._response_cache is not None:
+            await self._response_cache.aclose()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._aiohttp_session is not None and not self._aiohttp_session.closed:
+            await self._aiohttp_session.close()
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._aiohttp_session = None
+        self._http_client = None
+    
     async def parse_travel_query(self, query: str) -> ParsedTravelQuery:
         """
         Parse natural language travel query into structured data
@@ -105,18 +217,21 @@ class AIService:
             if self.provider == "none":
                 return self._fallback_parse_query(query)
             
-            prompt = self._create_parsing_prompt(query)
-            
-            if self.provider == "ibm_watsonx":
-                response = await self._call_watsonx(prompt)
-            elif self.provider == "openai":
-                response = await self._call_openai(prompt)
-            elif self.provider == "huggingface":
-                response = await self._call_huggingface(prompt)
-            else:
-                return self._fallback_parse_query(query)
+            # Without a place it can tell apart, similar wording may still be
+            # a different trip: only the exact response cache applies then
+            vector, cached = None, None
+            scope = self._semantic_scope(query)
+            if self._names_place(query):
+                vector, cached = await self._semantic_lookup(query, scope)
+            if cached is not None:
+                return cached.model_copy(deep=True)
             
-            return self._parse_ai_response(response, query)
+            prompt = self._create_parsing_prompt(query)
+            response = await self._generate(prompt, "parse_query")
+            parsed = self._parse_ai_response(response, query)
+            if vector is not None:
+                self._semantic_cache.store(vector, scope, parsed)
+            return parsed
             
         except Exception as e:
             logger.error(f"Error parsing travel query: {str(e)}")
@@ -126,49 +241,153 @@ class AIService:
         """Create prompt for parsing travel query"""
         return PromptTemplates.travel_query_parser(query)
     
+    def _semantic_scope(self, text: str) -> str:
+        """
+        Facts embeddings blur (numbers, known destinations, capitalized place
+        names) that must match for two queries to share an answer
+        """
+        destination = self._fallback_parse_query(text).destination or ''
+        return f"{numbers_scope(text)}|{destination}|{places_scope(text)}"
+    
+    def _names_place(self, text: str) -> bool:
+        """Whether the text names a known destination or a capitalized place"""
+        return bool(self._fallback_parse_query(text).destination or places_scope(text))
+    
+    async def _semantic_lookup(self, text: str, scope: str) -> Tuple[Optional[np.ndarray], Any]:
+        """(embedding, answer to a similar earlier query), (None, None) if unavailable"""
+        if self._semantic_cache is None:
+            return None, None
+        try:
+            vector = await self._semantic_cache.embed_text(text)
+        except Exception as e:
+            logger.error(f"Error embedding query for semantic cache: {str(e)}")
+            return None, None
+        return vector, self._semantic_cache.lookup(vector, scope)
+    
+    async def _generate(self, prompt: str, purpose: str) -> str:
+        """
+        Get the provider's response to a prompt, reusing a cached response
+        to an identical prompt, or joining the provider call for one
+        already in flight
+        """
+        key = self._cache_key(prompt)
+        if self._response_cache is not None:
+            response = await self._response_cache.get(key, purpose)
+            if response is not None:
+                return response
+        
+        return await self._in_flight.run(key, lambda: self._call_and_cache(prompt, key, purpose))
+    
+    def _cache_key(self, prompt: str) -> str:
+        params = {"max_new_tokens": MAX_NEW_TOKENS, "temperature": TEMPERATURE}
+        return cache_key(self.provider, self.ai_config.get("model"), params, prompt)
+    
+    async def _call_and_cache(self, prompt: str, key: str, purpose: str) -> str:
+        response = await self._call_provider(prompt)
+        if self._response_cache is not None:
+            await self._response_cache.set(key, response, self._cache_ttl(purpose))
+        return response
+    
+    async def _call_provider(self, prompt: str) -> str:
+        """
+        Send a prompt to the configured provider through its circuit
+        breaker, which fails instantly while the provider is unhealthy
+        """
+        if self.provider == "ibm_watsonx":
+            call = self._call_watsonx
+        elif self.provider == "ibm_watson":
+            call = self._call_ibm_watson
+        elif self.provider == "replicate":
+            call = self._call_replicate
+        elif self.provider == "openai":
+            call = self._call_openai
+        elif self.provider == "huggingface":
+            call = self._call_huggingface
+        else:
+            raise ValueError(f"No AI provider available: {self.provider}")
+        return await get_circuit_breaker(self.provider).call(call, prompt)
+    
+    def _cache_ttl(self, purpose: str) -> int:
+        """Seconds a response to this kind of request may be reused"""
+        return {
+            "parse_query": self.settings.ai_cache_ttl_parse_query,
+            "recommendations": self.settings.ai_cache_ttl_recommendations,
+            "budget": self.settings.ai_cache_ttl_budget,
+            "route_notes": self.settings.ai_cache_ttl_route_notes,
+            "chat": self.settings.ai_cache_ttl_chat
+        }.get(purpose, 0)
+    
+    def _get_watsonx_model(self, parameters: Dict[str, Any]):
+        """
+        Get the Watsonx model handle for these parameters, creating it once.
+        Handles share the APIClient, so they reuse its IAM token instead of
+        authenticating and fetching model metadata per call.
+        """
+        key = json.dumps([self.ai_config["model"], parameters], sort_keys=True)
+        with self._watsonx_lock:
+            model = self._watsonx_models.get(key)
+            if model is None:
+                model = self._new_watsonx_model(self._client, parameters)
+                self._watsonx_models[key] = model
+            return model
+    
+    def _new_watsonx_model(self, client, parameters: Dict[str, Any]):
+        from ibm_watsonx_ai.foundation_models import ModelInference
+        
+        return ModelInference(
+            model_id=self.ai_config["model"],
+            params=parameters,
+            api_client=client,
+            project_id=self.ai_config["project_id"]
+        )
+    
+    def _generate_watsonx(self, parameters: Dict[str, Any], prompt: str) -> str:
+        """Blocking Watsonx generation (the first call also creates the model handle)"""
+        return self._get_watsonx_model(parameters).generate_text(prompt=prompt)
+    
+    async def refresh_watsonx_token(self, interval: float):
+        """
+        Keep the Watsonx IAM token fresh in the background, so generation
+        calls never wait for a token exchange: every interval (shorter than
+        the token's lifetime) a new client is authenticated and the model
+        handles are re-created on it before replacing the old ones
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._rebuild_watsonx_client)
+            except Exception as e:
+                logger.error(f"Error refreshing Watsonx token: {str(e)}")
+    
+    def _rebuild_watsonx_client(self):
+        client = self._new_watsonx_client()
+        with self._watsonx_lock:
+            keys = list(self._watsonx_models)
+        models = {key: self._new_watsonx_model(client, json.loads(key)[1]) for key in keys}
+        with self._watsonx_lock:
+            self._client = client
+            self._watsonx_models = models
+    
+    def _watsonx_parameters(self) -> Dict[str, Any]:
+        from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+        
+        return {
+            GenParams.DECODING_METHOD: "greedy",
+            GenParams.MAX_NEW_TOKENS: MAX_NEW_TOKENS,
+            GenParams.MIN_NEW_TOKENS: 1,
+            GenParams.TEMPERATURE: TEMPERATURE,
+            GenParams.STOP_SEQUENCES: ["\n\n"]
+        }
+    
     async def _call_watsonx(self, prompt: str) -> str:
         """Call IBM Watsonx API"""
         try:
-            from ibm_watsonx_ai.foundation_models import Model
-            from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
-
-            # Model parameters
-            parameters = {
-                GenParams.DECODING_METHOD: "greedy",
-                GenParams.MAX_NEW_TOKENS: 500,
-                GenParams.MIN_NEW_TOKENS: 1,
-                GenParams.TEMPERATURE: 0.3,
-                GenParams.STOP_SEQUENCES: ["\n\n"]
-            }
+            parameters = self._watsonx_parameters()
 
-            # Initialize model
-            model = Model(
-                model_id=self.ai_config["model"],
-                params=parameters,
-                credentials=self._client.credentials,
-                project_id=self.ai_config["project_id"]
-            )
-
-            # Generate response
-            response = model.generate_text(prompt=prompt)
+            # Generate response (blocking SDK calls, run on the provider's threads)
+            response = await self._get_executor().run(self._generate_watsonx, parameters, prompt)
             return response
 
-        except ImportError:
-            logger.warning("IBM Watsonx library not available, using fallback")
-            # Fallback response for development
-            response = {
-                "destination": "Bali",
-                "duration": 3,
-                "budget": 5000000,
-                "traveler_count": 2,
-                "traveler_type": "family",
-                "interests": ["pantai", "kuliner"],
-                "activity_level": "moderate",
-                "extracted_keywords": ["Bali", "3 hari", "keluarga", "pantai", "kuliner", "5 juta"],
-                "confidence": 0.85
-            }
-            return json.dumps(response)
-
         except Exception as e:
             logger.error(f"Error calling Watsonx: {str(e)}")
             raise
@@ -176,108 +395,63 @@ class AIService:
     async def _call_openai(self, prompt: str) -> str:
         """Call OpenAI API"""
         try:
-            import openai
-
-            client = openai.AsyncOpenAI(api_key=self.ai_config["api_key"])
-
-            response = await client.chat.completions.create(
-                model=self.ai_config["model"],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a travel planning assistant for Indonesia. Extract structured information from natural language travel queries and respond with valid JSON only."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
+            response = await self._client.chat.completions.create(**self._openai_request(prompt))
 
             return response.choices[0].message.content
 
-        except ImportError:
-            logger.warning("OpenAI library not available, using fallback")
-            # Fallback response for development
-            response = {
-                "destination": "Jakarta",
-                "duration": 2,
-                "budget": 3000000,
-                "traveler_count": 1,
-                "traveler_type": "solo",
-                "interests": ["kuliner", "budaya"],
-                "activity_level": "moderate",
-                "extracted_keywords": ["Jakarta", "2 hari", "solo", "kuliner", "budaya"],
-                "confidence": 0.75
-            }
-            return json.dumps(response)
-
         except Exception as e:
             logger.error(f"Error calling OpenAI: {str(e)}")
             raise
     
+    def _openai_request(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "model": self.ai_config["model"],
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a travel planning assistant for Indonesia. Extract structured information from natural language travel queries and respond with valid JSON only."
+                },
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_NEW_TOKENS
+        }
+    
+    def _huggingface_request(self, prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """(url, headers, payload) for the Hugging Face Inference API"""
+        headers = {"Authorization": f"Bearer {self.ai_config['api_key']}"}
+
+        # Use Hugging Face Inference API for better performance
+        api_url = f"https://api-inference.huggingface.co/models/{self.ai_config['model']}"
+
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": MAX_NEW_TOKENS,
+                "temperature": TEMPERATURE,
+                "return_full_text": False
+            }
+        }
+        return api_url, headers, payload
+    
     async def _call_huggingface(self, prompt: str) -> str:
         """Call Hugging Face model"""
         try:
-            # For Hugging Face Inference API
-            import httpx
-
-            headers = {"Authorization": f"Bearer {self.ai_config['api_key']}"}
-
-            # Use Hugging Face Inference API for better performance
-            api_url = f"https://api-inference.huggingface.co/models/{settings.huggingface_model}"
-
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 500,
-                    "temperature": 0.3,
-                    "return_full_text": False
-                }
-            }
-
-            async with httpx.AsyncClient() as client:
-                response = await client.post(api_url, headers=headers, json=payload)
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
-                        return result[0].get("generated_text", "")
-                    return str(result)
-                else:
-                    logger.warning(f"Hugging Face API error: {response.status_code}")
-                    raise Exception(f"API error: {response.status_code}")
-
-        except ImportError:
-            logger.warning("Required libraries not available, using fallback")
-            # Fallback response for development
-            response = {
-                "destination": "Yogyakarta",
-                "duration": 3,
-                "budget": 2500000,
-                "traveler_count": 2,
-                "traveler_type": "couple",
-                "interests": ["budaya", "sejarah"],
-                "activity_level": "moderate",
-                "extracted_keywords": ["Yogyakarta", "3 hari", "couple", "budaya", "sejarah"],
-                "confidence": 0.70
-            }
-            return json.dumps(response)
+            api_url, headers, payload = self._huggingface_request(prompt)
+            response = await self._get_http_client().post(api_url, headers=headers, json=payload)
+
+            if response.status_code == 200:
+                result = response.json()
+                if isinstance(result, list) and len(result) > 0:
+                    return result[0].get("generated_text", "")
+                return str(result)
+            else:
+                logger.warning(f"Hugging Face API error: {response.status_code}")
+                raise Exception(f"API error: {response.status_code}")
 
         except Exception as e:
             logger.error(f"Error calling Hugging Face: {str(e)}")
-            # Return fallback response instead of raising
-            response = {
-                "destination": None,
-                "duration": None,
-                "budget": None,
-                "traveler_count": None,
-                "traveler_type": None,
-                "interests": [],
-                "activity_level": "moderate",
-                "extracted_keywords": [],
-                "confidence": 0.3
-            }
-            return json.dumps(response)
+            raise
     
     def _parse_ai_response(self, response: str, original_query: str) -> ParsedTravelQuery:
         """Parse AI response into ParsedTravelQuery object"""
@@ -393,12 +567,7 @@ class AIService:
             prompt = PromptTemplates.destination_recommender(preferences)
 
             if self.provider != "none":
-                if self.provider == "ibm_watsonx":
-                    response = await self._call_watsonx(prompt)
-                elif self.provider == "openai":
-                    response = await self._call_openai(prompt)
-                elif self.provider == "huggingface":
-                    response = await self._call_huggingface(prompt)
+                response = await self._generate(prompt, "recommendations")
 
                 # Parse AI response
                 try:
@@ -437,58 +606,19 @@ class AIService:
             "reasoning": "Rekomendasi berdasarkan preferensi umum dan popularitas destinasi"
         }
     
-    async def optimize_route(self, destinations: List[str], start_location: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
-        """Optimize travel route using AI"""
+    async def annotate_route(self, route: Dict[str, Any]) -> Optional[str]:
+        """Write travel notes for a route computed by the route solver"""
         try:
-            prompt = PromptTemplates.route_optimizer(destinations, start_location, preferences)
-
-            if self.provider != "none":
-                if self.provider == "ibm_watsonx":
-                    response = await self._call_watsonx(prompt)
-                elif self.provider == "openai":
-                    response = await self._call_openai(prompt)
-                elif self.provider == "huggingface":
-                    response = await self._call_huggingface(prompt)
-
-                # Parse AI response
-                try:
-                    json_start = response.find('{')
-                    json_end = response.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        json_str = response[json_start:json_end]
-                        return json.loads(json_str)
-                except:
-                    pass
+            if self.provider == "none":
+                return None
 
-            # Fallback optimization (simple ordering)
-            return {
-                "optimized_route": destinations,
-                "route_details": [
-                    {
-                        "from": start_location if i == 0 else destinations[i-1],
-                        "to": dest,
-                        "distance_km": 50,
-                        "travel_time_minutes": 90,
-                        "transportation": "car",
-                        "cost_estimate": 100000
-                    }
-                    for i, dest in enumerate(destinations)
-                ],
-                "total_distance": len(destinations) * 50,
-                "total_time": len(destinations) * 90,
-                "total_cost": len(destinations) * 100000,
-                "optimization_score": 0.7,
-                "alternatives": ["Pertimbangkan transportasi umum untuk menghemat biaya"]
-            }
+            prompt = PromptTemplates.route_annotator(route)
+            response = await self._generate(prompt, "route_notes")
+            return response.strip() or None
 
         except Exception as e:
-            logger.error(f"Error optimizing route: {str(e)}")
-            return {
-                "optimized_route": destinations,
-                "total_distance": 0,
-                "estimated_time": 0,
-                "optimization_score": 0.5
-            }
+            logger.error(f"Error annotating route: {str(e)}")
+            return None
     
     async def chat(self, message: str, context: Dict[str, Any]) -> str:
         """Chat with AI assistant"""
@@ -496,31 +626,162 @@ class AIService:
             prompt = PromptTemplates.chat_assistant(message, context)
 
             if self.provider != "none":
-                if self.provider == "ibm_watson":
-                    response = await self._call_ibm_watson(prompt)
-                elif self.provider == "ibm_watsonx":
-                    response = await self._call_watsonx(prompt)
-                elif self.provider == "replicate":
-                    response = await self._call_replicate(prompt)
-                elif self.provider == "openai":
-                    response = await self._call_openai(prompt)
-                elif self.provider == "huggingface":
-                    response = await self._call_huggingface(prompt)
-
-                return response.strip()
+                scope = self._chat_scope(message, context)
+                vector, cached = await self._semantic_lookup(message, scope)
+                if cached is not None:
+                    return cached
+                
+                response = (await self._generate(prompt, "chat")).strip()
+                if vector is not None:
+                    self._semantic_cache.store(vector, scope, response)
+                return response
 
             # Fallback response
             return self._generate_fallback_chat_response(message, context)
 
+        except CircuitOpenError:
+            logger.warning(f"{self.provider} circuit open, answering chat locally")
+            return self._generate_fallback_chat_response(message, context)
         except Exception as e:
             logger.error(f"Error in chat: {str(e)}")
-            return "Maaf, saya mengalami kesulitan memproses pertanyaan Anda. Silakan coba lagi."
+            return self._generate_fallback_chat_response(message, context)
+
+    def _chat_scope(self, message: str, context: Dict[str, Any]) -> str:
+        return f"{self._semantic_scope(message)}|{json.dumps(context, sort_keys=True, default=str)}"
+
+    async def chat_stream(self, message: str, context: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Chat with AI assistant, yielding the response in pieces as the
+        provider generates them. Cached and fallback responses (including the
+        local one while the provider's circuit is open) arrive as a single
+        piece; provider errors are raised to the caller.
+        """
+        if self.provider == "none":
+            yield self._generate_fallback_chat_response(message, context)
+            return
+
+        scope = self._chat_scope(message, context)
+        vector, cached = await self._semantic_lookup(message, scope)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = PromptTemplates.chat_assistant(message, context)
+        key = self._cache_key(prompt)
+        if self._response_cache is not None:
+            cached = await self._response_cache.get(key, "chat")
+            if cached is not None:
+                yield cached.strip()
+                return
+
+        breaker = get_circuit_breaker(self.provider)
+        if not breaker.allow():
+            logger.warning(f"{self.provider} circuit open, answering chat locally")
+            yield self._generate_fallback_chat_response(message, context)
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        try:
+            async for chunk in self._stream_provider(prompt):
+                if not chunk:
+                    continue
+                if not chunks:
+                    self.first_token_time.record(time.perf_counter() - started)
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            breaker.record_failure()
+            logger.error(f"Error streaming chat response: {str(e)}")
+            raise
+        except BaseException:
+            # Client went away: the call neither failed nor completed
+            breaker.release()
+            raise
+        breaker.record_success(time.perf_counter() - started)
+
+        response = "".join(chunks)
+        if self._response_cache is not None:
+            await self._response_cache.set(key, response, self._cache_ttl("chat"))
+        if vector is not None:
+            self._semantic_cache.store(vector, scope, response.strip())
+
+    async def _stream_provider(self, prompt: str) -> AsyncIterator[str]:
+        """Text pieces of the provider's response, as they are generated"""
+        if self.provider == "openai":
+            stream = await self._client.chat.completions.create(**self._openai_request(prompt), stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        elif self.provider == "ibm_watsonx":
+            parameters = self._watsonx_parameters()
+            async for chunk in self._iterate_on_executor(
+                lambda: self._get_watsonx_model(parameters).generate_text_stream(prompt=prompt)
+            ):
+                yield chunk
+
+        elif self.provider == "huggingface":
+            # Text Generation Inference streams tokens as server-sent events
+            api_url, headers, payload = self._huggingface_request(prompt)
+            async with self._get_http_client().stream(
+                "POST", api_url, headers=headers, json={**payload, "stream": True}
+            ) as response:
+                if response.status_code != 200:
+                    raise Exception(f"API error: {response.status_code}")
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        token = json.loads(line[len("data:"):]).get("token") or {}
+                        if not token.get("special"):
+                            yield token.get("text", "")
+
+        elif self.provider == "replicate":
+            async for chunk in self._iterate_on_executor(
+                lambda: (str(event) for event in self._client.stream(
+                    self._replicate_model(), input=self._replicate_input(prompt)
+                ))
+            ):
+                yield chunk
+
+        elif self.provider == "ibm_watson":
+            # No streaming API: the whole response is one piece
+            yield await self._call_ibm_watson(prompt)
+
+        else:
+            raise ValueError(f"No AI provider available: {self.provider}")
+
+    async def _iterate_on_executor(self, iterable: Callable[[], Iterable[str]]) -> AsyncIterator[str]:
+        """
+        Consume a blocking iterator on the provider's threads, yielding each
+        item as soon as the thread produces it
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for item in iterable():
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        producer = asyncio.ensure_future(self._get_executor().run(produce))
+        try:
+            while (item := await queue.get()) is not finished:
+                yield item
+            await producer  # raises the iterator's error, if any
+        finally:
+            stop.set()
+            # Keep an abandoned producer's error from being reported as unhandled
+            producer.add_done_callback(lambda done: done.cancelled() or done.exception())
 
     async def _call_ibm_watson(self, prompt: str) -> str:
         """Call IBM Watson Orchestrate API"""
         try:
-            import aiohttp
-
             headers = {
                 "Authorization": f"Bearer {self.ai_config['api_key']}",
                 "Content-Type": "application/json"
@@ -529,22 +790,21 @@ class AIService:
             payload = {
                 "model": self.ai_config.get("model", "granite-13b-chat-v2"),
                 "prompt": prompt,
-                "max_tokens": 500,
-                "temperature": 0.3,
+                "max_tokens": MAX_NEW_TOKENS,
+                "temperature": TEMPERATURE,
                 "project_id": self.ai_config.get("project_id")
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ai_config['url']}/v1/generate",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("generated_text", "")
-                    else:
-                        raise Exception(f"IBM Watson API error: {response.status}")
+            async with self._get_aiohttp_session().post(
+                f"{self.ai_config['url']}/v1/generate",
+                headers=headers,
+                json=payload
+            ) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return result.get("generated_text", "")
+                else:
+                    raise Exception(f"IBM Watson API error: {response.status}")
 
         except Exception as e:
             logger.error(f"Error calling IBM Watson: {str(e)}")
@@ -553,32 +813,34 @@ class AIService:
     async def _call_replicate(self, prompt: str) -> str:
         """Call Replicate API for IBM Granite model"""
         try:
-            import replicate
-
-            # Initialize Replicate client
-            client = replicate.Client(api_token=self.ai_config["api_token"])
-
-            # Call IBM Granite model via Replicate
-            output = client.run(
-                self.ai_config.get("model", "ibm-granite/granite-3.3-8b-instruct"),
-                input={
-                    "prompt": prompt,
-                    "max_tokens": 500,
-                    "temperature": 0.3,
-                    "top_p": 0.9
-                }
-            )
-
-            # Replicate returns a generator, join the output
-            if hasattr(output, '__iter__'):
-                return ''.join(output)
-            else:
-                return str(output)
+            return await self._get_executor().run(self._run_replicate, prompt)
 
         except Exception as e:
             logger.error(f"Error calling Replicate: {str(e)}")
             raise
 
+    def _run_replicate(self, prompt: str) -> str:
+        """Blocking Replicate prediction, including reading its streamed output"""
+        # Call IBM Granite model via Replicate
+        output = self._client.run(self._replicate_model(), input=self._replicate_input(prompt))
+
+        # Replicate returns a generator, join the output
+        if hasattr(output, '__iter__'):
+            return ''.join(output)
+        else:
+            return str(output)
+
+    def _replicate_model(self) -> str:
+        return self.ai_config.get("model", "ibm-granite/granite-3.3-8b-instruct")
+
+    def _replicate_input(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "prompt": prompt,
+            "max_tokens": MAX_NEW_TOKENS,
+            "temperature": TEMPERATURE,
+            "top_p": 0.9
+        }
+
     def _generate_fallback_chat_response(self, message: str, context: Dict[str, Any]) -> str:
         """Generate fallback chat response"""
         message_lower = message.lower()
@@ -610,12 +872,7 @@ class AIService:
             prompt = PromptTemplates.budget_estimator(destination, duration, traveler_count, comfort_level)
 
             if self.provider != "none":
-                if self.provider == "ibm_watsonx":
-                    response = await self._call_watsonx(prompt)
-                elif self.provider == "openai":
-                    response = await self._call_openai(prompt)
-                elif self.provider == "huggingface":
-                    response = await self._call_huggingface(prompt)
+                response = await self._generate(prompt, "budget")
 
                 # Parse AI response
                 try:
@@ -659,3 +916,23 @@ class AIService:
         except Exception as e:
             logger.error(f"Error estimating budget: {str(e)}")
             raise
+
+
+# Process-wide instance, created by the application lifespan (or on first use)
+_ai_service: Optional[AIService] = None
+
+
+def get_ai_service() -> AIService:
+    """Get the shared AIService"""
+    global _ai_service
+    if _ai_service is None:
+        _ai_service = AIService()
+    return _ai_service
+
+
+async def close_ai_service():
+    """Close the shared AIService's provider connections"""
+    global _ai_service
+    if _ai_service is not None:
+        await _ai_service.aclose()
+        _ai_service = None
@@ -0,0 +1,216 @@
+"""
+Circuit breakers for AI provider calls.
+
+A provider that is down or timing out costs every request its full timeout.
+Each provider gets a breaker that watches a rolling window of calls and
+opens when too many fail or are too slow; while open, calls fail instantly
+so callers move on to the next provider or the local fallback. After a
+cool-down the breaker lets a single trial call through (half-open) and
+closes again if it succeeds.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit open for AI provider {name}")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling window of calls"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_call_rate: float = 0.8,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        open_seconds: float = 30.0
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()  # (finished at, failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (reserves the trial call when half-open)"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: float):
+        self._record(failed=False, slow=latency > self.slow_call_seconds)
+
+    def record_failure(self):
+        self._record(failed=True, slow=False)
+
+    def release(self):
+        """Forget an allowed call that was abandoned (e.g. cancelled) before finishing"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        succeeded: Optional[Callable[[Any], bool]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Await func(*args, **kwargs) through the breaker. Exceptions, and
+        results rejected by `succeeded`, count as failures.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+
+        if succeeded is not None and not succeeded(result):
+            self.record_failure()
+        else:
+            self.record_success(time.monotonic() - started)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+            return {
+                "state": state,
+                "calls": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(slow / calls, 3) if calls else 0.0,
+                "rejected": self.rejected,
+                "retry_in": round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+                if state == OPEN else 0.0
+            }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._state = CLOSED
+            self._trial_in_flight = False
+            self.rejected = 0
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def _record(self, failed: bool, slow: bool):
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._trial_in_flight = False
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                return
+            if state == OPEN:
+                return  # a call that started before the circuit opened
+
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, is_failed, _ in self._calls if is_failed)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+
+# Process-wide breakers by provider name, shared by every service
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get the breaker for a provider, creating it from settings"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            settings = get_settings()
+            breaker = CircuitBreaker(
+                name,
+                failure_rate=settings.ai_breaker_failure_rate,
+                slow_call_seconds=settings.ai_breaker_slow_call_seconds,
+                slow_call_rate=settings.ai_breaker_slow_call_rate,
+                window_seconds=settings.ai_breaker_window_seconds,
+                min_calls=settings.ai_breaker_min_calls,
+                open_seconds=settings.ai_breaker_open_seconds
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def circuit_breaker_status() -> Dict[str, Dict[str, Any]]:
+    """Status of every provider breaker created so far"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.status() for breaker in breakers}
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        _breakers.clear()
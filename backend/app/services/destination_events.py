@@ -0,0 +1,62 @@
+"""
+Committed destination changes, for the in-process indexes that mirror the
+destinations table.
+
+Changes are collected on every flush and handed to the subscribers only once
+the transaction commits, so rolled back rows never show up in an index.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.database_models import Destination
+
+logger = logging.getLogger(__name__)
+
+# {destination_id: indexed fields, or None once deleted or deactivated}
+DestinationChanges = Dict[str, Optional[Dict[str, Any]]]
+
+INDEXED_FIELDS = ("name", "city", "province", "latitude", "longitude")
+
+_PENDING_CHANGES = "destination_changes"
+_subscribers: List[Callable[[DestinationChanges], None]] = []
+
+
+def on_destination_changes(subscriber: Callable[[DestinationChanges], None]):
+    """Register a function called with the destination changes of each commit"""
+    _subscribers.append(subscriber)
+    return subscriber
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_destination_changes(session, flush_context):
+    changes = session.info.setdefault(_PENDING_CHANGES, {})
+    for target in list(session.new) + list(session.dirty):
+        if isinstance(target, Destination):
+            active = target.is_active is not False
+            changes[str(target.id)] = (
+                {field: getattr(target, field) for field in INDEXED_FIELDS} if active else None
+            )
+    for target in session.deleted:
+        if isinstance(target, Destination):
+            changes[str(target.id)] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_destination_changes(session):
+    changes = session.info.pop(_PENDING_CHANGES, None)
+    if not changes:
+        return
+    for subscriber in _subscribers:
+        try:
+            subscriber(changes)
+        except Exception as e:
+            logger.error(f"Error applying destination changes: {str(e)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_destination_changes(session):
+    session.info.pop(_PENDING_CHANGES, None)
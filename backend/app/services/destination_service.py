@@ -2,10 +2,16 @@
 Destination Service for managing travel destinations
 """
 
+import heapq
+import json
 import logging
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+import math
+import re
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select, and_, or_, func, text, literal, literal_column, table, column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.models.schemas import (
     DestinationSchema,
     DestinationSearchResponse,
@@ -14,19 +20,61 @@ from app.models.schemas import (
     PriceRange,
     LocationSchema
 )
-from app.models.database_models import Destination, Tag, Facility
-from app.core.database import get_db
+from app.models.database_models import Destination, Tag, Facility, TEXT_SEARCH_CONFIG
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.services.distance_matrix import DistanceMatrix, get_distance_matrix
+from app.services.geo_index import GeoIndex, destination_geo_index, load_destination_geo_index
+from app.services.trigram_index import destination_trigram_index, INDEXED_FIELDS
+from app.utils.geo import bounding_box, geohash_cells, haversine_km
+from app.utils.pagination import (
+    SortKey,
+    InvalidCursorError,
+    encode_cursor,
+    decode_cursor,
+    keyset_condition
+)
 
 logger = logging.getLogger(__name__)
 
+# Colloquial place names that share no trigrams with the official name
+PLACE_ALIASES = {
+    "jogja": "yogyakarta",
+    "jogjakarta": "yogyakarta",
+    "djogja": "yogyakarta",
+    "yogya": "yogyakarta",
+    "jkt": "jakarta",
+    "bdg": "bandung",
+    "sby": "surabaya",
+}
+
 
 class DestinationService:
     """
     Service for managing destinations and related operations
     """
 
-    def __init__(self, db: Session = None):
-        self.db = db or next(get_db())
+    def __init__(self, db: AsyncSession = None):
+        self.db = db or AsyncSessionLocal()
+
+    @staticmethod
+    def _with_relations(stmt):
+        """
+        Eager-load tags and facilities with one extra query each (instead of
+        two lazy loads per row) so schema conversion never hits the database
+        """
+        return stmt.options(
+            selectinload(Destination.tags),
+            selectinload(Destination.facilities)
+        )
+
+    @staticmethod
+    def _parse_id(destination_id: str) -> Optional[uuid.UUID]:
+        """Parse a destination ID, returning None for malformed IDs"""
+        try:
+            return uuid.UUID(str(destination_id))
+        except ValueError:
+            return None
 
     def _destination_to_schema(self, destination: Destination) -> DestinationSchema:
         """Convert database model to Pydantic schema"""
@@ -51,53 +99,173 @@ class DestinationService:
             sentiment=None  # Will be populated separately if needed
         )
     
+    @property
+    def _dialect(self) -> str:
+        return self.db.get_bind().dialect.name
+
+    @staticmethod
+    def _search_terms(query: str) -> List[str]:
+        """Split a free-text query into word tokens safe for FTS syntax"""
+        return re.findall(r"\w+", query.lower())
+
+    def _apply_text_search(self, stmt, query: str):
+        """
+        Apply full-text search to a destination query.
+
+        Returns the filtered statement and the sort keys ranking the matches
+        (name matches first, then city/province, then description).
+        """
+        terms = self._search_terms(query)
+        if not terms:
+            return stmt, []
+
+        if self._dialect == "postgresql":
+            # Prefix match every term so partial words ("yogya") still hit
+            ts_query = func.to_tsquery(
+                literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"),
+                " & ".join(f"{term}:*" for term in terms)
+            )
+            search_vector = literal_column("destinations.search_vector")
+            rank = func.ts_rank_cd(search_vector, ts_query)
+            return stmt.where(search_vector.op("@@")(ts_query)), [(rank, True)]
+
+        if self._dialect == "sqlite":
+            fts = table("destinations_fts", column("rowid"))
+            rank = func.bm25(literal_column("destinations_fts"), 10.0, 5.0, 5.0, 1.0)
+            stmt = stmt.join(fts, fts.c.rowid == literal_column("destinations.rowid")).where(
+                text("destinations_fts MATCH :fts_query").bindparams(
+                    fts_query=" ".join(f'"{term}"*' for term in terms)
+                )
+            )
+            return stmt, [(rank, False)]
+
+        # Other backends: unindexed substring match
+        search_filter = or_(
+            Destination.name.ilike(f"%{query}%"),
+            Destination.description.ilike(f"%{query}%"),
+            Destination.city.ilike(f"%{query}%"),
+            Destination.province.ilike(f"%{query}%")
+        )
+        return stmt.where(search_filter), []
+
+    @staticmethod
+    def _expand_aliases(value: str) -> str:
+        return " ".join(PLACE_ALIASES.get(word, word) for word in re.findall(r"\w+", value.lower()))
+
+    async def _get_trigram_index(self):
+        """Get the in-process trigram index, (re)building it on first use and once stale"""
+        if destination_trigram_index.is_stale(get_settings().trigram_index_refresh_interval):
+            result = await self.db.execute(
+                select(Destination.id, Destination.name, Destination.city, Destination.province)
+                .where(Destination.is_active == True)
+            )
+            destination_trigram_index.build(result.all())
+        return destination_trigram_index
+
+    async def _apply_fuzzy_search(
+        self,
+        stmt,
+        value: str,
+        fields: Tuple[str, ...],
+        threshold: float
+    ):
+        """
+        Apply typo-tolerant trigram matching on the given columns.
+
+        Postgres filters with the pg_trgm word-similarity operator (served by
+        the GIN trigram indexes) and returns a similarity sort key. Other
+        backends use the in-process trigram index and return its scores.
+        """
+        term = self._expand_aliases(value)
+        if not term:
+            return stmt, [], None
+
+        if self._dialect == "postgresql":
+            # The <% operator compares against this transaction-local threshold
+            await self.db.execute(
+                select(func.set_config("pg_trgm.word_similarity_threshold", str(threshold), True))
+            )
+            columns = [getattr(Destination, field) for field in fields]
+            matches = or_(*[literal(term).op("<%")(col) for col in columns])
+            scores = [func.word_similarity(term, col) for col in columns]
+            score = func.greatest(*scores) if len(scores) > 1 else scores[0]
+            return stmt.where(matches), [(score, True)], None
+
+        index = await self._get_trigram_index()
+        scores = index.search(term, fields=fields, threshold=threshold)
+        ids = [uuid.UUID(destination_id) for destination_id in scores]
+        return stmt.where(Destination.id.in_(ids)), [], scores
+
     async def search_destinations(
         self,
         query: Optional[str] = None,
         filters: Dict[str, Any] = None,
         page: int = 1,
-        page_size: int = 20
+        page_size: int = 20,
+        fuzzy: bool = False,
+        similarity_threshold: Optional[float] = None,
+        cursor: Optional[str] = None,
+        include_total: bool = True
     ) -> DestinationSearchResponse:
         """
         Search destinations with filters
+
+        With fuzzy=True the query and the city/province filters tolerate
+        typos and colloquial names, and results are ordered by similarity.
+        Passing the previous response's next_cursor continues after its last
+        row (keyset pagination) instead of using page offsets.
         """
         try:
+            if similarity_threshold is None:
+                similarity_threshold = get_settings().fuzzy_search_threshold
+
             # Build query
-            db_query = self.db.query(Destination).filter(Destination.is_active == True)
+            stmt = select(Destination).where(Destination.is_active == True)
 
             # Apply text search
+            sort_keys: List[SortKey] = []
+            fuzzy_scores = None
             if query:
-                search_filter = or_(
-                    Destination.name.ilike(f"%{query}%"),
-                    Destination.description.ilike(f"%{query}%"),
-                    Destination.city.ilike(f"%{query}%"),
-                    Destination.province.ilike(f"%{query}%")
-                )
-                db_query = db_query.filter(search_filter)
+                if fuzzy:
+                    stmt, sort_keys, fuzzy_scores = await self._apply_fuzzy_search(
+                        stmt, query, INDEXED_FIELDS, similarity_threshold
+                    )
+                else:
+                    stmt, sort_keys = self._apply_text_search(stmt, query)
 
             # Apply filters
             if filters:
                 if filters.get("category"):
-                    db_query = db_query.filter(Destination.category == filters["category"])
+                    stmt = stmt.where(Destination.category == filters["category"])
 
                 if filters.get("price_range"):
-                    db_query = db_query.filter(Destination.price_range == filters["price_range"])
-
-                if filters.get("city"):
-                    db_query = db_query.filter(Destination.city.ilike(f"%{filters['city']}%"))
+                    stmt = stmt.where(Destination.price_range == filters["price_range"])
 
-                if filters.get("province"):
-                    db_query = db_query.filter(Destination.province.ilike(f"%{filters['province']}%"))
+                for field in ("city", "province"):
+                    if not filters.get(field):
+                        continue
+                    if fuzzy:
+                        stmt, _, _ = await self._apply_fuzzy_search(
+                            stmt, filters[field], (field,), similarity_threshold
+                        )
+                    else:
+                        column_ = getattr(Destination, field)
+                        stmt = stmt.where(column_.ilike(f"%{filters[field]}%"))
 
                 if filters.get("min_rating"):
-                    db_query = db_query.filter(Destination.rating >= filters["min_rating"])
-
-            # Get total count
-            total = db_query.count()
+                    stmt = stmt.where(Destination.rating >= filters["min_rating"])
 
-            # Apply pagination
-            offset = (page - 1) * page_size
-            destinations_db = db_query.offset(offset).limit(page_size).all()
+            if fuzzy_scores is not None:
+                # Similarity scores live in process: rank matching IDs here
+                # and load only the requested page
+                destinations_db, total, next_cursor = await self._fetch_ranked_page(
+                    stmt, fuzzy_scores, page, page_size, cursor
+                )
+                total_estimated = False
+            else:
+                destinations_db, total, total_estimated, next_cursor = await self._fetch_page(
+                    stmt, sort_keys, page, page_size, cursor, include_total
+                )
 
             # Convert to schemas
             destinations = [self._destination_to_schema(dest) for dest in destinations_db]
@@ -105,6 +273,8 @@ class DestinationService:
             return DestinationSearchResponse(
                 destinations=destinations,
                 total=total,
+                total_estimated=total_estimated,
+                next_cursor=next_cursor,
                 query=query or "",
                 filters_applied=filters or {}
             )
@@ -113,32 +283,171 @@ class DestinationService:
             logger.error(f"Error searching destinations: {str(e)}")
             raise
     
+    async def _estimate_count(self, stmt) -> Optional[int]:
+        """
+        Get the planner's row estimate for a query (Postgres only); far
+        cheaper than COUNT(*) on large result sets
+        """
+        if self._dialect != "postgresql":
+            return None
+
+        try:
+            compiled = stmt.with_only_columns(Destination.id).compile(
+                dialect=self.db.get_bind().dialect,
+                compile_kwargs={"literal_binds": True}
+            )
+            connection = await self.db.connection()
+            result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"Could not estimate row count: {str(e)}")
+            return None
+
+    async def _fetch_page(
+        self,
+        stmt,
+        sort_keys: List[SortKey],
+        page: int,
+        page_size: int,
+        cursor: Optional[str],
+        include_total: bool
+    ) -> Tuple[List[Destination], Optional[int], bool, Optional[str]]:
+        """
+        Get one page of destinations ordered by sort_keys (rating and id are
+        always appended as tie-breakers).
+
+        Returns (destinations, total, total_estimated, next_cursor).
+        """
+        sort_keys = sort_keys + [
+            (func.coalesce(Destination.rating, 0.0), True),
+            (Destination.id, True)
+        ]
+
+        # Get total count
+        total_estimated = False
+        if include_total:
+            total = await self.db.scalar(select(func.count()).select_from(stmt.subquery()))
+        else:
+            total = await self._estimate_count(stmt)
+            total_estimated = total is not None
+
+        page_stmt = stmt
+        if cursor:
+            values = decode_cursor(cursor, len(sort_keys))
+            values[-1] = self._parse_id(values[-1])
+            if values[-1] is None:
+                raise InvalidCursorError("Malformed cursor: invalid destination id")
+            page_stmt = page_stmt.where(keyset_condition(sort_keys, values))
+        else:
+            page_stmt = page_stmt.offset((page - 1) * page_size)
+
+        # Fetch one extra row to know whether another page exists
+        result = await self.db.execute(
+            self._with_relations(page_stmt)
+            .add_columns(*[expression for expression, _ in sort_keys])
+            .order_by(*[expression.desc() if descending else expression.asc()
+                        for expression, descending in sort_keys])
+            .limit(page_size + 1)
+        )
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor([*rows[-1][1:-1], str(rows[-1][-1])])
+
+        return [row[0] for row in rows], total, total_estimated, next_cursor
+
+    async def _fetch_ranked_page(
+        self,
+        stmt,
+        scores: Dict[str, float],
+        page: int,
+        page_size: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[Destination], int, Optional[str]]:
+        """Get one page of destinations ordered by precomputed scores"""
+        result = await self.db.execute(stmt.with_only_columns(Destination.id, Destination.rating))
+        ranked = sorted(
+            ((scores.get(str(row.id), 0.0), row.rating or 0.0, str(row.id)) for row in result.all()),
+            reverse=True
+        )
+
+        if cursor:
+            score, rating, last_id = decode_cursor(cursor, 3)
+            if not isinstance(score, (int, float)) or not isinstance(rating, (int, float)):
+                raise InvalidCursorError("Malformed cursor: invalid sort values")
+            after = (score, rating, str(last_id))
+            remaining = [key for key in ranked if key < after]
+        else:
+            remaining = ranked[(page - 1) * page_size:]
+
+        page_keys = remaining[:page_size]
+        next_cursor = encode_cursor(page_keys[-1]) if len(remaining) > page_size else None
+        page_ids = [uuid.UUID(key[2]) for key in page_keys]
+        if not page_ids:
+            return [], len(ranked), None
+
+        result = await self.db.execute(
+            self._with_relations(select(Destination)).where(Destination.id.in_(page_ids))
+        )
+        by_id = {dest.id: dest for dest in result.scalars().all()}
+        return [by_id[dest_id] for dest_id in page_ids if dest_id in by_id], len(ranked), next_cursor
+
     async def get_destination(self, destination_id: str) -> Optional[DestinationSchema]:
         """
         Get a specific destination by ID
         """
         try:
-            # Mock implementation - would query actual database
-            return None
-            
+            parsed_id = self._parse_id(destination_id)
+            if parsed_id is None:
+                return None
+
+            result = await self.db.execute(
+                self._with_relations(select(Destination)).where(
+                    Destination.id == parsed_id,
+                    Destination.is_active == True
+                )
+            )
+            destination = result.scalars().first()
+
+            return self._destination_to_schema(destination) if destination else None
+
         except Exception as e:
             logger.error(f"Error getting destination: {str(e)}")
             raise
     
-    async def list_destinations(self, page: int = 1, page_size: int = 20) -> PaginatedResponse:
+    async def list_destinations(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> PaginatedResponse:
         """
         List all destinations with pagination
         """
         try:
-            # Mock implementation - would query actual database
+            stmt = select(Destination).where(Destination.is_active == True)
+
+            destinations_db, total, total_estimated, next_cursor = await self._fetch_page(
+                stmt, [], page, page_size, cursor, include_total
+            )
+            items = [self._destination_to_schema(dest) for dest in destinations_db]
+
             return PaginatedResponse(
-                items=[],
-                total=0,
+                items=items,
+                total=total,
+                total_estimated=total_estimated,
                 page=page,
                 page_size=page_size,
-                total_pages=0
+                total_pages=math.ceil(total / page_size) if total is not None else None,
+                next_cursor=next_cursor
             )
-            
+
         except Exception as e:
             logger.error(f"Error listing destinations: {str(e)}")
             raise
@@ -150,12 +459,206 @@ class DestinationService:
         limit: int = 10
     ) -> List[DestinationSchema]:
         """
-        Find destinations near a specific destination
+        Find destinations near a specific destination, closest first
         """
         try:
-            # Mock implementation - would use geospatial queries
-            return []
+            parsed_id = self._parse_id(destination_id)
+            if parsed_id is None:
+                return []
+
+            origin = (await self._get_coordinates_many([parsed_id])).get(parsed_id)
+            if origin is None:
+                return []
+
+            return await self.get_destinations_near(
+                *origin, radius_km=radius_km, limit=limit, exclude_id=parsed_id
+            )
             
         except Exception as e:
             logger.error(f"Error finding nearby destinations: {str(e)}")
             raise
+
+    async def get_destinations_near(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float = 50,
+        limit: int = 10,
+        exclude_id: Optional[uuid.UUID] = None
+    ) -> List[DestinationSchema]:
+        """
+        Find destinations closest to a point, with distance_km set
+        """
+        try:
+            settings = get_settings()
+            if settings.use_geo_index:
+                index = await self._get_geo_index()
+                ranked = [
+                    (uuid.UUID(dest_id), distance_km)
+                    for dest_id, distance_km in index.nearest(
+                        latitude, longitude, limit, radius_km=radius_km,
+                        exclude=[exclude_id] if exclude_id else ()
+                    )
+                ]
+            elif self._dialect == "postgresql" and settings.use_postgis:
+                ranked = await self._nearby_postgis((latitude, longitude), radius_km, limit, exclude_id)
+            else:
+                ranked = await self._nearby_bounding_box((latitude, longitude), radius_km, limit, exclude_id)
+
+            distances = dict(ranked)
+            nearby = await self.get_destinations_by_ids([dest_id for dest_id, _ in ranked])
+            for schema in nearby:
+                schema.distance_km = round(distances[uuid.UUID(schema.id)], 3)
+            return nearby
+
+        except Exception as e:
+            logger.error(f"Error finding destinations near point: {str(e)}")
+            raise
+
+    async def get_destinations_by_ids(self, destination_ids: List[uuid.UUID]) -> List[DestinationSchema]:
+        """
+        Get active destinations by ID, in the given order
+        """
+        if not destination_ids:
+            return []
+
+        result = await self.db.execute(
+            self._with_relations(select(Destination)).where(
+                Destination.id.in_(destination_ids),
+                Destination.is_active == True
+            )
+        )
+        by_id = {dest.id: dest for dest in result.scalars().all()}
+        return [self._destination_to_schema(by_id[dest_id]) for dest_id in destination_ids if dest_id in by_id]
+
+    async def get_visit_details(self, destination_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Entry fee and opening hours of destinations, by ID, for scheduling
+        visits
+        """
+        parsed_ids = [dest_id for dest_id in map(self._parse_id, destination_ids) if dest_id]
+        if not parsed_ids:
+            return {}
+
+        result = await self.db.execute(
+            select(Destination.id, Destination.entry_fee, Destination.opening_hours)
+            .where(Destination.id.in_(parsed_ids))
+        )
+        return {
+            str(row.id): {"entry_fee": row.entry_fee, "opening_hours": row.opening_hours}
+            for row in result
+        }
+
+    async def get_distance_matrix(self, destination_ids: List[str]) -> DistanceMatrix:
+        """
+        Get the pairwise distance/duration matrix for destinations; unknown
+        or inactive IDs are left out
+        """
+        try:
+            parsed_ids = [dest_id for dest_id in map(self._parse_id, destination_ids) if dest_id]
+            coordinates = await self._get_coordinates_many(parsed_ids)
+            return get_distance_matrix(
+                (str(dest_id), *coordinates[dest_id]) for dest_id in parsed_ids if dest_id in coordinates
+            )
+
+        except Exception as e:
+            logger.error(f"Error building distance matrix: {str(e)}")
+            raise
+
+    async def _get_geo_index(self) -> GeoIndex:
+        """Get the in-process geo index, building it on first use"""
+        if not destination_geo_index.ready:
+            await load_destination_geo_index(self.db)
+        return destination_geo_index
+
+    async def _get_coordinates_many(
+        self,
+        destination_ids: List[uuid.UUID]
+    ) -> Dict[uuid.UUID, Tuple[float, float]]:
+        """(latitude, longitude) of active destinations, from the geo index where possible"""
+        coordinates = {}
+        if get_settings().use_geo_index:
+            index = await self._get_geo_index()
+            for dest_id in destination_ids:
+                found = index.coordinates(dest_id)
+                if found is not None:
+                    coordinates[dest_id] = found
+
+        missing = [dest_id for dest_id in destination_ids if dest_id not in coordinates]
+        if missing:
+            result = await self.db.execute(
+                select(Destination.id, Destination.latitude, Destination.longitude).where(
+                    Destination.id.in_(missing),
+                    Destination.is_active == True
+                )
+            )
+            # Not indexed (yet): created by another worker since the last rebuild
+            coordinates.update({dest_id: (lat, lon) for dest_id, lat, lon in result.all()})
+        return coordinates
+
+
+    async def _nearby_bounding_box(
+        self,
+        origin: Tuple[float, float],
+        radius_km: float,
+        limit: int,
+        exclude_id: Optional[uuid.UUID] = None
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """
+        Nearest destinations via index prefilter plus exact haversine ranking.
+
+        The geohash cells covering the radius become range scans on the
+        geohash index and the bounding box trims cell overhang, so only
+        candidates that can be inside the radius are fetched (coordinates
+        only) and ranked exactly.
+        """
+        latitude, longitude = origin
+        box = bounding_box(latitude, longitude, radius_km)
+        min_lat, max_lat, min_lon, max_lon = box
+
+        stmt = select(Destination.id, Destination.latitude, Destination.longitude).where(
+            Destination.is_active == True,
+            Destination.latitude.between(min_lat, max_lat),
+            Destination.longitude.between(min_lon, max_lon)
+        )
+        if exclude_id is not None:
+            stmt = stmt.where(Destination.id != exclude_id)
+        cells = [cell for cell in geohash_cells(box) if cell]
+        if cells:
+            # "{" sorts right after "z", the last geohash character
+            stmt = stmt.where(or_(*(
+                and_(Destination.geohash >= cell, Destination.geohash < cell + "{")
+                for cell in cells
+            )))
+
+        result = await self.db.execute(stmt)
+        candidates = []
+        for dest_id, dest_lat, dest_lon in result.all():
+            distance_km = haversine_km(latitude, longitude, dest_lat, dest_lon)
+            if distance_km <= radius_km:
+                candidates.append((distance_km, str(dest_id), dest_id))
+
+        return [(dest_id, distance_km) for distance_km, _, dest_id in heapq.nsmallest(limit, candidates)]
+
+    async def _nearby_postgis(
+        self,
+        origin: Tuple[float, float],
+        radius_km: float,
+        limit: int,
+        exclude_id: Optional[uuid.UUID] = None
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """Nearest destinations via the PostGIS geography column and GiST index"""
+        latitude, longitude = origin
+        location = literal_column("destinations.location")
+        point = func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+        distance_km = func.ST_Distance(location, point) / 1000.0
+
+        stmt = select(Destination.id, distance_km).where(
+            Destination.is_active == True,
+            func.ST_DWithin(location, point, radius_km * 1000.0)
+        )
+        if exclude_id is not None:
+            stmt = stmt.where(Destination.id != exclude_id)
+
+        result = await self.db.execute(stmt.order_by(distance_km, Destination.id).limit(limit))
+        return [(dest_id, float(distance)) for dest_id, distance in result.all()]
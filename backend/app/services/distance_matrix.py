@@ -0,0 +1,147 @@
+"""
+Distance and travel-time matrices between destinations.
+
+All pairwise great-circle distances for a destination set are computed in
+one batched NumPy expression. Travel times and costs are derived per
+transportation mode from speed profiles (average speed, road detour factor
+and fixed overhead such as boarding). Matrices are cached per destination
+set, keyed on ids and coordinates, so moved destinations never reuse a
+stale matrix.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schemas import TransportationType
+from app.utils.geo import haversine_km_radians
+
+logger = logging.getLogger(__name__)
+
+MATRIX_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class TravelProfile:
+    """How a transportation mode turns straight-line distance into time and cost"""
+    speed_kmh: float  # average door-to-door speed while moving
+    detour_factor: float  # route length / straight-line distance
+    overhead_minutes: float  # boarding, check-in, parking per leg
+    cost_per_km: float  # IDR per person per route km
+
+
+SPEED_PROFILES: Dict[TransportationType, TravelProfile] = {
+    TransportationType.WALKING: TravelProfile(4.5, 1.2, 0, 0),
+    TransportationType.MOTORCYCLE: TravelProfile(30, 1.3, 0, 1500),
+    TransportationType.CAR: TravelProfile(35, 1.3, 5, 4000),
+    TransportationType.BUS: TravelProfile(25, 1.35, 20, 500),
+    TransportationType.TRAIN: TravelProfile(70, 1.2, 30, 400),
+    TransportationType.BOAT: TravelProfile(25, 1.1, 45, 2000),
+    TransportationType.FLIGHT: TravelProfile(600, 1.05, 120, 1200),
+}
+
+# Straight-line distance limits for the default mode of a leg
+MAX_WALKING_KM = 1.5
+MAX_DRIVING_KM = 300
+
+
+def suggest_transportation(distance_km: float) -> TransportationType:
+    """Default transportation mode for a leg of the given straight-line length"""
+    if distance_km <= MAX_WALKING_KM:
+        return TransportationType.WALKING
+    if distance_km <= MAX_DRIVING_KM:
+        return TransportationType.CAR
+    return TransportationType.FLIGHT
+
+
+class DistanceMatrix:
+    """
+    Pairwise distances for a fixed destination set; rows and columns follow
+    `ids`, use `index` to find a destination's row
+    """
+
+    def __init__(self, ids: Sequence[str], latitudes: Sequence[float], longitudes: Sequence[float]):
+        self.ids: Tuple[str, ...] = tuple(ids)
+        self.index: Dict[str, int] = {destination_id: i for i, destination_id in enumerate(self.ids)}
+
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+        self.distance_km = haversine_km_radians(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        self.distance_km.setflags(write=False)
+
+        self._lock = threading.Lock()
+        self._durations: Dict[TransportationType, np.ndarray] = {}
+        self._costs: Dict[TransportationType, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def duration_minutes(self, mode: TransportationType = TransportationType.CAR) -> np.ndarray:
+        """Travel time matrix in minutes for a transportation mode"""
+        with self._lock:
+            if mode not in self._durations:
+                profile = SPEED_PROFILES[mode]
+                minutes = self.distance_km * profile.detour_factor / profile.speed_kmh * 60
+                minutes = minutes + profile.overhead_minutes
+                np.fill_diagonal(minutes, 0)
+                minutes.setflags(write=False)
+                self._durations[mode] = minutes
+            return self._durations[mode]
+
+    def cost(self, mode: TransportationType = TransportationType.CAR) -> np.ndarray:
+        """Travel cost matrix in IDR per person for a transportation mode"""
+        with self._lock:
+            if mode not in self._costs:
+                profile = SPEED_PROFILES[mode]
+                costs = self.distance_km * profile.detour_factor * profile.cost_per_km
+                costs.setflags(write=False)
+                self._costs[mode] = costs
+            return self._costs[mode]
+
+    def leg(self, from_id: str, to_id: str, mode: TransportationType = None) -> Dict[str, float]:
+        """Distance, duration and cost between two destinations"""
+        i, j = self.index[str(from_id)], self.index[str(to_id)]
+        distance_km = float(self.distance_km[i, j])
+        mode = mode or suggest_transportation(distance_km)
+        return {
+            "transportation": mode,
+            "distance_km": distance_km,
+            "duration_minutes": float(self.duration_minutes(mode)[i, j]),
+            "cost": float(self.cost(mode)[i, j])
+        }
+
+
+_matrix_cache: "OrderedDict[Tuple, DistanceMatrix]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_distance_matrix(points: Iterable[Tuple[str, float, float]]) -> DistanceMatrix:
+    """
+    Get the matrix for (id, latitude, longitude) points, in id order,
+    reusing a cached matrix for the same destinations and coordinates
+    """
+    key = tuple(sorted({(str(destination_id), float(lat), float(lon)) for destination_id, lat, lon in points}))
+
+    with _cache_lock:
+        matrix = _matrix_cache.get(key)
+        if matrix is not None:
+            _matrix_cache.move_to_end(key)
+            return matrix
+
+    ids, latitudes, longitudes = zip(*key) if key else ((), (), ())
+    matrix = DistanceMatrix(ids, latitudes, longitudes)
+
+    with _cache_lock:
+        _matrix_cache[key] = matrix
+        if len(_matrix_cache) > MATRIX_CACHE_SIZE:
+            _matrix_cache.popitem(last=False)
+    return matrix
+
+
+def clear_distance_matrix_cache():
+    with _cache_lock:
+        _matrix_cache.clear()
@@ -0,0 +1,269 @@
+"""
+In-process spatial index over destination coordinates.
+
+Nearby lookups, route optimization and itinerary building ask "which
+destinations are closest to this point" many times per request; answering
+from memory avoids a database round trip per question. Coordinates are held
+in contiguous NumPy arrays (radians) and ranked by haversine distance,
+through a scikit-learn BallTree when it is installed and a vectorized
+brute-force scan otherwise (a few milliseconds at 100k destinations).
+
+The index is built from the destinations table at startup, updated with
+destination changes committed by this process, and rebuilt periodically to
+pick up changes made by other workers.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.database import AsyncSessionLocal
+from app.models.database_models import Destination
+from app.services.destination_events import DestinationChanges, on_destination_changes
+from app.utils.geo import EARTH_RADIUS_KM, haversine_km_radians
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:
+    BallTree = None
+
+logger = logging.getLogger(__name__)
+
+# Rebuild the tree once this many rows were added or removed since the last
+# build (below it, new rows are scanned brute-force next to the tree)
+MIN_REBUILD_CHANGES = 1024
+REBUILD_RATIO = 0.25
+
+
+class GeoIndex:
+    """k-nearest and radius queries over (id, latitude, longitude) points"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset(0)
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def build(self, rows: Iterable[Tuple[str, float, float]]):
+        """Replace the index contents with (id, latitude, longitude) rows"""
+        rows = list(rows)
+        with self._lock:
+            self._reset(len(rows))
+            if rows:
+                self._ids = [str(row[0]) for row in rows]
+                self._positions = {destination_id: i for i, destination_id in enumerate(self._ids)}
+                coordinates = np.radians(np.array([(row[1], row[2]) for row in rows], dtype=np.float64))
+                self._latitudes[:len(rows)] = coordinates[:, 0]
+                self._longitudes[:len(rows)] = coordinates[:, 1]
+                self._alive[:len(rows)] = True
+                self._size = len(rows)
+            self._build_tree()
+            self.ready = True
+        logger.info(f"Geo index built with {len(rows)} destinations ({'ball tree' if self._tree else 'brute force'})")
+
+    def add(self, destination_id: str, latitude: float, longitude: float):
+        """Insert or move a single destination"""
+        with self._lock:
+            self._remove(str(destination_id))
+            self._append(str(destination_id), latitude, longitude)
+            self._maybe_rebuild()
+
+    def remove(self, destination_id: str):
+        with self._lock:
+            self._remove(str(destination_id))
+            self._maybe_rebuild()
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        self.ready = False
+
+    def coordinates(self, destination_id: str) -> Optional[Tuple[float, float]]:
+        """(latitude, longitude) of an indexed destination"""
+        with self._lock:
+            position = self._positions.get(str(destination_id))
+            if position is None:
+                return None
+            return math.degrees(self._latitudes[position]), math.degrees(self._longitudes[position])
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        radius_km: Optional[float] = None,
+        exclude: Iterable[str] = ()
+    ) -> List[Tuple[str, float]]:
+        """
+        Get up to k (id, distance_km) pairs closest to the point, closest
+        first, optionally limited to radius_km
+        """
+        excluded = {str(destination_id) for destination_id in exclude}
+        lat, lon = math.radians(latitude), math.radians(longitude)
+
+        with self._lock:
+            if not self._positions or k <= 0:
+                return []
+            positions, distances = self._candidates(lat, lon, k + len(excluded), radius_km)
+            if excluded:
+                keep = np.array([self._ids[p] not in excluded for p in positions], dtype=bool)
+                positions, distances = positions[keep], distances[keep]
+
+            if len(positions) > k:
+                top = np.argpartition(distances, k - 1)[:k]
+                positions, distances = positions[top], distances[top]
+            order = np.argsort(distances, kind="stable")
+            return [(self._ids[positions[i]], float(distances[i])) for i in order]
+
+    def within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        exclude: Iterable[str] = ()
+    ) -> List[Tuple[str, float]]:
+        """Get every (id, distance_km) pair within radius_km, closest first"""
+        return self.nearest(latitude, longitude, len(self) or 1, radius_km=radius_km, exclude=exclude)
+
+    def _candidates(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        radius_km: Optional[float]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions and distances of live rows that may be in the answer: the
+        tree's hits plus every row added since the tree was built
+        """
+        positions = [np.empty(0, dtype=np.intp)]
+        distances = [np.empty(0, dtype=np.float64)]
+
+        if self._tree is not None:
+            point = np.array([[lat, lon]])
+            if radius_km is not None:
+                tree_positions, tree_distances = self._tree.query_radius(
+                    point, r=radius_km / EARTH_RADIUS_KM, return_distance=True
+                )
+                tree_positions, tree_distances = tree_positions[0], tree_distances[0]
+            else:
+                # Over-fetch by the removed rows the tree still contains
+                count = min(k + self._dead_in_tree, self._tree_size)
+                tree_distances, tree_positions = self._tree.query(point, k=count)
+                tree_positions, tree_distances = tree_positions[0], tree_distances[0]
+            positions.append(tree_positions.astype(np.intp))
+            distances.append(tree_distances * EARTH_RADIUS_KM)
+
+        start = self._tree_size if self._tree is not None else 0
+        if self._size > start:
+            positions.append(np.arange(start, self._size))
+            distances.append(haversine_km_radians(
+                lat, lon, self._latitudes[start:self._size], self._longitudes[start:self._size]
+            ))
+
+        positions, distances = np.concatenate(positions), np.concatenate(distances)
+        keep = self._alive[positions]
+        if radius_km is not None:
+            keep &= distances <= radius_km
+        return positions[keep], distances[keep]
+
+    def _reset(self, capacity: int):
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._latitudes = np.empty(capacity, dtype=np.float64)
+        self._longitudes = np.empty(capacity, dtype=np.float64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        self._tree = None
+        self._tree_size = 0  # rows [0, _tree_size) are covered by the tree
+        self._dead_in_tree = 0
+
+    def _append(self, destination_id: str, latitude: float, longitude: float):
+        if self._size == len(self._alive):
+            capacity = max(16, 2 * self._size)
+            self._latitudes = np.resize(self._latitudes, capacity)
+            self._longitudes = np.resize(self._longitudes, capacity)
+            self._alive = np.concatenate([self._alive[:self._size], np.zeros(capacity - self._size, dtype=bool)])
+
+        position = self._size
+        self._latitudes[position] = math.radians(latitude)
+        self._longitudes[position] = math.radians(longitude)
+        self._alive[position] = True
+        self._ids.append(destination_id)
+        self._positions[destination_id] = position
+        self._size += 1
+
+    def _remove(self, destination_id: str):
+        position = self._positions.pop(destination_id, None)
+        if position is None:
+            return
+        self._alive[position] = False
+        if position < self._tree_size:
+            self._dead_in_tree += 1
+
+    def _maybe_rebuild(self):
+        changes = (self._size - self._tree_size) + self._dead_in_tree
+        if BallTree is None:
+            changes = self._size - len(self._positions)  # only removed rows cost anything
+        if changes > max(MIN_REBUILD_CHANGES, REBUILD_RATIO * len(self._positions)):
+            self._build_tree()
+
+    def _build_tree(self):
+        """Drop removed rows and rebuild the ball tree over the rest"""
+        live = np.flatnonzero(self._alive[:self._size])
+        if len(live) != self._size:
+            self._ids = [self._ids[p] for p in live]
+            self._positions = {destination_id: i for i, destination_id in enumerate(self._ids)}
+            self._latitudes = self._latitudes[live]
+            self._longitudes = self._longitudes[live]
+            self._alive = np.ones(len(live), dtype=bool)
+            self._size = len(live)
+
+        self._tree = None
+        if BallTree is not None and self._size:
+            coordinates = np.column_stack([self._latitudes[:self._size], self._longitudes[:self._size]])
+            self._tree = BallTree(coordinates, metric="haversine")
+        self._tree_size = self._size
+        self._dead_in_tree = 0
+
+
+# Process-wide index
+destination_geo_index = GeoIndex()
+
+async def load_destination_geo_index(db: AsyncSession) -> GeoIndex:
+    """(Re)build the destination geo index from the database"""
+    result = await db.execute(
+        select(Destination.id, Destination.latitude, Destination.longitude)
+        .where(Destination.is_active == True)
+    )
+    destination_geo_index.build(result.all())
+    return destination_geo_index
+
+
+async def refresh_destination_geo_index(interval: float, session_factory: async_sessionmaker = AsyncSessionLocal):
+    """Build the index now and rebuild it every interval seconds"""
+    while True:
+        try:
+            async with session_factory() as db:
+                await load_destination_geo_index(db)
+        except Exception as e:
+            logger.error(f"Error building geo index: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+@on_destination_changes
+def _apply_destination_changes(changes: DestinationChanges):
+    if not destination_geo_index.ready:
+        return
+    for destination_id, fields in changes.items():
+        if fields is None:
+            destination_geo_index.remove(destination_id)
+        else:
+            destination_geo_index.add(destination_id, fields["latitude"], fields["longitude"])
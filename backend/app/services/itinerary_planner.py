@@ -0,0 +1,501 @@
+"""
+Constraint-based itinerary planner.
+
+Plans a trip from candidate destinations without any LLM call:
+
+1. Candidates are scored on how well they match the traveler's interests,
+   their review-weighted rating, whether their price range suits the
+   budget, and their distance from the trip's anchor; the best ones fill
+   the trip's stop capacity (stops per day follow the activity level).
+2. The chosen stops are clustered geographically into one cluster per day
+   (capacity-bounded k-medoids on the distance matrix), and the days are
+   chained so consecutive days are close to each other.
+3. Each day is ordered with the route solver and scheduled stop by stop,
+   honoring opening hours on that date, the activity level's day window
+   and the trip budget spread over the days. Stops that do not fit are
+   dropped.
+
+A 30-day plan from a few hundred candidates takes tens of milliseconds.
+"""
+
+import math
+import uuid
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schemas import (
+    ActivityLevel,
+    DestinationCategory,
+    DestinationSchema,
+    ItineraryDaySchema,
+    ItineraryGenerationRequest,
+    ItineraryItemSchema,
+    PriceRange,
+    TransportationSchema
+)
+from app.services.distance_matrix import DistanceMatrix, get_distance_matrix
+from app.services.route_solver import solve_route
+from app.utils.geo import haversine_km
+
+# Opening hours as stored on destinations: weekday -> [{"open": "HH:MM", "close": "HH:MM"}]
+OpeningHours = Dict[str, List[Dict[str, str]]]
+
+
+@dataclass(frozen=True)
+class DayProfile:
+    """How much a day holds at an activity level"""
+    stops: int
+    start_minute: int  # day starts (minutes after midnight)
+    end_minute: int  # last visit must end by
+    visit_factor: float  # multiplier on typical visit durations
+
+
+ACTIVITY_PROFILES: Dict[ActivityLevel, DayProfile] = {
+    ActivityLevel.LOW: DayProfile(2, 9 * 60, 17 * 60, 1.25),
+    ActivityLevel.MODERATE: DayProfile(3, 8 * 60, 18 * 60, 1.0),
+    ActivityLevel.HIGH: DayProfile(4, 7 * 60, 20 * 60, 0.8),
+}
+
+# Typical visit length per category, in minutes
+VISIT_MINUTES: Dict[DestinationCategory, int] = {
+    DestinationCategory.BEACH: 150,
+    DestinationCategory.MOUNTAIN: 240,
+    DestinationCategory.CULTURAL: 120,
+    DestinationCategory.HISTORICAL: 120,
+    DestinationCategory.CULINARY: 90,
+    DestinationCategory.ADVENTURE: 180,
+    DestinationCategory.RELIGIOUS: 90,
+    DestinationCategory.SHOPPING: 120,
+    DestinationCategory.NIGHTLIFE: 120,
+    DestinationCategory.NATURE: 150,
+    DestinationCategory.URBAN: 120,
+}
+
+# Interest words (as parsed from queries) and the categories they ask for
+INTEREST_CATEGORIES: Dict[str, Tuple[DestinationCategory, ...]] = {
+    "pantai": (DestinationCategory.BEACH,),
+    "beach": (DestinationCategory.BEACH,),
+    "laut": (DestinationCategory.BEACH,),
+    "gunung": (DestinationCategory.MOUNTAIN,),
+    "mountain": (DestinationCategory.MOUNTAIN,),
+    "hiking": (DestinationCategory.MOUNTAIN, DestinationCategory.ADVENTURE),
+    "budaya": (DestinationCategory.CULTURAL, DestinationCategory.HISTORICAL, DestinationCategory.RELIGIOUS),
+    "culture": (DestinationCategory.CULTURAL, DestinationCategory.HISTORICAL, DestinationCategory.RELIGIOUS),
+    "sejarah": (DestinationCategory.HISTORICAL,),
+    "history": (DestinationCategory.HISTORICAL,),
+    "kuliner": (DestinationCategory.CULINARY,),
+    "makanan": (DestinationCategory.CULINARY,),
+    "food": (DestinationCategory.CULINARY,),
+    "petualangan": (DestinationCategory.ADVENTURE,),
+    "adventure": (DestinationCategory.ADVENTURE,),
+    "religi": (DestinationCategory.RELIGIOUS,),
+    "belanja": (DestinationCategory.SHOPPING,),
+    "shopping": (DestinationCategory.SHOPPING,),
+    "nightlife": (DestinationCategory.NIGHTLIFE,),
+    "alam": (DestinationCategory.NATURE, DestinationCategory.MOUNTAIN, DestinationCategory.BEACH),
+    "nature": (DestinationCategory.NATURE, DestinationCategory.MOUNTAIN, DestinationCategory.BEACH),
+    "kota": (DestinationCategory.URBAN,),
+    "city": (DestinationCategory.URBAN,),
+}
+
+PRICE_LEVELS = [PriceRange.BUDGET, PriceRange.MODERATE, PriceRange.EXPENSIVE, PriceRange.LUXURY]
+# Highest affordable price level by daily budget per person (IDR)
+AFFORDABLE_DAILY_BUDGET = [150000, 500000, 1500000]
+# Entry fee per person assumed when a destination has none recorded (IDR)
+DEFAULT_ENTRY_FEE: Dict[PriceRange, float] = {
+    PriceRange.BUDGET: 10000,
+    PriceRange.MODERATE: 50000,
+    PriceRange.EXPENSIVE: 150000,
+    PriceRange.LUXURY: 400000,
+}
+
+# Score weights; ratings are shrunk towards the prior by review count
+INTEREST_WEIGHT = 0.5
+RATING_WEIGHT = 0.4
+PROXIMITY_WEIGHT = 0.1
+OVER_BUDGET_PENALTY = 0.3  # per price level above what the budget affords
+RATING_PRIOR = 4.0
+RATING_PRIOR_REVIEWS = 50
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SCHEDULE_STEP_MINUTES = 5
+CLUSTER_ITERATIONS = 10
+
+
+@dataclass
+class PlannerCandidate:
+    """A destination that may be visited, with what scheduling needs to know"""
+    destination: DestinationSchema
+    entry_fee: Optional[float] = None  # per person; None falls back to the price range
+    opening_hours: Optional[OpeningHours] = None  # None means always open
+
+    @property
+    def fee(self) -> float:
+        return entry_fee(self.entry_fee, self.destination.price_range)
+
+
+@dataclass
+class Visit:
+    """A visit of an edited day, kept where the traveler put it"""
+    destination_id: str
+    name: str
+    duration: int  # minutes
+    opening_hours: Optional[OpeningHours] = None
+
+
+class UnschedulableVisitError(ValueError):
+    """Raised when a visit kept in place cannot be fitted into its day"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} does not fit its opening hours or the day")
+        self.name = name
+
+
+@dataclass
+class VisitTime:
+    start_time: str
+    end_time: str
+    transportation_to_next: Optional[TransportationSchema] = None
+
+
+def entry_fee(fee: Optional[float], price_range: PriceRange) -> float:
+    """Entry fee per person, assumed from the price range when not recorded"""
+    return fee if fee is not None else DEFAULT_ENTRY_FEE[PriceRange(price_range)]
+
+
+def plan_days(
+    request: ItineraryGenerationRequest,
+    candidates: Sequence[PlannerCandidate],
+    anchor: Optional[Tuple[float, float]] = None
+) -> Iterator[ItineraryDaySchema]:
+    """
+    Plan every day of the trip, yielding each one as it is scheduled.
+    Candidates are expected to be unique destinations.
+    """
+    profile = ACTIVITY_PROFILES[request.activity_level]
+    start_date = request.start_date or date.today()
+
+    chosen = select_candidates(request, candidates, anchor)
+    distances = get_distance_matrix(
+        (c.destination.id, c.destination.location.latitude, c.destination.location.longitude) for c in chosen
+    )
+    rows = [distances.index[str(c.destination.id)] for c in chosen]
+    distance_km = distances.distance_km[np.ix_(rows, rows)]
+
+    clusters = cluster_stops(distance_km, min(request.duration, len(chosen)), profile.stops) if chosen else []
+
+    spent = 0.0
+    for day_num in range(1, request.duration + 1):
+        stops = [chosen[i] for i in clusters[day_num - 1]] if day_num <= len(clusters) else []
+        # The budget is spread evenly; whatever a day leaves unspent carries over
+        allowance = request.budget * day_num / request.duration - spent
+        day = _schedule_day(
+            request, profile, day_num, start_date + timedelta(days=day_num - 1), stops, distances, allowance
+        )
+        spent += day.total_cost
+        yield day
+
+
+def select_candidates(
+    request: ItineraryGenerationRequest,
+    candidates: Sequence[PlannerCandidate],
+    anchor: Optional[Tuple[float, float]] = None
+) -> List[PlannerCandidate]:
+    """The best candidates for the trip, best first, up to its stop capacity"""
+    if not candidates:
+        return []
+    scores = score_candidates(request, candidates, anchor)
+    capacity = request.duration * ACTIVITY_PROFILES[request.activity_level].stops
+    best = np.argsort(-scores, kind="stable")[:capacity]
+    return [candidates[i] for i in best]
+
+
+def score_candidates(
+    request: ItineraryGenerationRequest,
+    candidates: Sequence[PlannerCandidate],
+    anchor: Optional[Tuple[float, float]] = None
+) -> np.ndarray:
+    """Suitability of each candidate for the request (higher is better)"""
+    destinations = [c.destination for c in candidates]
+    wanted_categories, wanted_words = _wanted(request.interests)
+
+    interest = np.array([
+        1.0 if d.category in wanted_categories
+        else 0.5 if wanted_words & {tag.lower() for tag in d.tags}
+        else 0.0
+        for d in destinations
+    ])
+
+    ratings = np.array([d.rating for d in destinations], dtype=np.float64)
+    reviews = np.array([d.review_count for d in destinations], dtype=np.float64)
+    rating = (ratings * reviews + RATING_PRIOR * RATING_PRIOR_REVIEWS) / (reviews + RATING_PRIOR_REVIEWS) / 5
+
+    levels = np.array([PRICE_LEVELS.index(d.price_range) for d in destinations])
+    over_budget = np.maximum(levels - affordable_price_level(request), 0)
+
+    proximity = np.zeros(len(destinations))
+    if anchor is not None:
+        km = np.array([
+            haversine_km(anchor[0], anchor[1], d.location.latitude, d.location.longitude) for d in destinations
+        ])
+        proximity = 1 - km / max(float(km.max()), 1.0)
+
+    return (
+        INTEREST_WEIGHT * interest
+        + RATING_WEIGHT * rating
+        + PROXIMITY_WEIGHT * proximity
+        - OVER_BUDGET_PENALTY * over_budget
+    )
+
+
+def affordable_price_level(request: ItineraryGenerationRequest) -> int:
+    """Index in PRICE_LEVELS of the highest price range the budget suits"""
+    daily_per_person = request.budget / (request.duration * request.traveler_count)
+    for level, limit in enumerate(AFFORDABLE_DAILY_BUDGET):
+        if daily_per_person < limit:
+            return level
+    return len(AFFORDABLE_DAILY_BUDGET)
+
+
+def cluster_stops(distance_km: np.ndarray, clusters: int, capacity: int) -> List[List[int]]:
+    """
+    Split stops into geographically compact groups of at most `capacity`,
+    ordered so consecutive groups are close. Stop 0 (the best) seeds the
+    first medoid, the rest are seeded farthest-first.
+    """
+    n = len(distance_km)
+    medoids = [0]
+    nearest = distance_km[0].copy()
+    while len(medoids) < clusters:
+        nearest[medoids] = -1
+        medoid = int(nearest.argmax())
+        medoids.append(medoid)
+        nearest = np.minimum(nearest, distance_km[medoid])
+
+    groups = _assign(distance_km, medoids, capacity)
+    for _ in range(CLUSTER_ITERATIONS):
+        updated = [group[int(distance_km[np.ix_(group, group)].sum(axis=1).argmin())] for group in groups]
+        if updated == medoids:
+            break
+        medoids = updated
+        groups = _assign(distance_km, medoids, capacity)
+
+    # Chain the days greedily from the first medoid: each day moves on to
+    # the closest cluster not yet visited
+    between = distance_km[np.ix_(medoids, medoids)].copy()
+    order = [0]
+    between[:, 0] = np.inf
+    while len(order) < len(medoids):
+        following = int(between[order[-1]].argmin())
+        order.append(following)
+        between[:, following] = np.inf
+    return [groups[i] for i in order] if n else []
+
+
+def _assign(distance_km: np.ndarray, medoids: List[int], capacity: int) -> List[List[int]]:
+    """
+    Assign stops to their nearest medoid with room; stops that lose the
+    most by not getting their first choice pick first
+    """
+    groups = [[medoid] for medoid in medoids]
+    to_medoid = distance_km[:, medoids]
+    preferences = np.argsort(to_medoid, axis=1)
+    if len(medoids) > 1:
+        ranked = np.sort(to_medoid, axis=1)
+        regret = ranked[:, 1] - ranked[:, 0]
+    else:
+        regret = np.zeros(len(distance_km))
+
+    assigned = set(medoids)
+    for stop in np.argsort(-regret, kind="stable"):
+        stop = int(stop)
+        if stop in assigned:
+            continue
+        for cluster in preferences[stop]:
+            if len(groups[cluster]) < capacity:
+                groups[cluster].append(stop)
+                break
+        assigned.add(stop)
+    return groups
+
+
+def transportation_between(
+    distances: DistanceMatrix,
+    origin: DestinationSchema,
+    destination: DestinationSchema
+) -> TransportationSchema:
+    """Travel leg between two destinations from the distance matrix"""
+    return transportation_leg(distances, origin.id, destination.id, destination.name)
+
+
+def transportation_leg(distances: DistanceMatrix, from_id: str, to_id: str, to_name: str) -> TransportationSchema:
+    leg = distances.leg(from_id, to_id)
+    return TransportationSchema(
+        type=leg["transportation"],
+        duration=max(1, math.ceil(leg["duration_minutes"])),
+        cost=round(leg["cost"]),
+        description=f"{leg['distance_km']:.1f} km ke {to_name}"
+    )
+
+
+def retime_visits(
+    visits: Sequence[Visit],
+    day_date: date,
+    start_minute: int,
+    distances: DistanceMatrix
+) -> List[VisitTime]:
+    """
+    Times and travel legs for a day's visits in the order given, dropping
+    none: each visit starts on arrival, or later when the place opens.
+    Raises UnschedulableVisitError when a visit cannot be held within its
+    opening hours and before the day ends (23:59).
+    """
+    times: List[VisitTime] = []
+    clock = start_minute
+    for previous, visit in zip([None, *visits], visits):
+        if previous is not None:
+            leg = transportation_leg(distances, previous.destination_id, visit.destination_id, visit.name)
+            times[-1].transportation_to_next = leg
+            clock += leg.duration
+        start = _earliest_start(visit.opening_hours, day_date, clock, visit.duration, 24 * 60 - 1)
+        if start is None:
+            raise UnschedulableVisitError(visit.name)
+        times.append(VisitTime(_format_minute(start), _format_minute(start + visit.duration)))
+        clock = start + visit.duration
+    return times
+
+
+def visit_fits(opening_hours: Optional[OpeningHours], day_date: date, start_minute: int, end_minute: int) -> bool:
+    """Whether a visit from start to end minute lies within one opening window on a date"""
+    return any(opens <= start_minute and end_minute <= closes for opens, closes in _windows(opening_hours, day_date))
+
+
+def parse_minute(value: str) -> int:
+    """Minutes after midnight of an "HH:MM" time"""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _schedule_day(
+    request: ItineraryGenerationRequest,
+    profile: DayProfile,
+    day_num: int,
+    day_date: date,
+    stops: List[PlannerCandidate],
+    distances: DistanceMatrix,
+    allowance: float
+) -> ItineraryDaySchema:
+    """Visit a day's stops in route order, dropping those that do not fit"""
+    items = []
+    if stops:
+        rows = [distances.index[str(stop.destination.id)] for stop in stops]
+        order, _ = solve_route(distances.duration_minutes()[np.ix_(rows, rows)])
+        routed = [stops[i] for i in order]
+        # Tight opening hours can defeat the shortest route; try closing order too
+        by_closing = sorted(stops, key=lambda stop: _closing_minute(stop, day_date))
+        items = max(
+            (_schedule(request, profile, day_date, visits, distances, allowance) for visits in (routed, by_closing)),
+            key=len
+        )
+
+    total_cost = sum(item.estimated_cost for item in items) + request.traveler_count * sum(
+        item.transportation_to_next.cost for item in items if item.transportation_to_next
+    )
+    notes = (
+        f"Hari {day_num} - Eksplorasi {request.destination}" if items
+        else f"Hari {day_num} - Hari bebas di {request.destination}"
+    )
+    return ItineraryDaySchema(day=day_num, date=day_date, items=items, total_cost=total_cost, notes=notes)
+
+
+def _schedule(
+    request: ItineraryGenerationRequest,
+    profile: DayProfile,
+    day_date: date,
+    visits: List[PlannerCandidate],
+    distances: DistanceMatrix,
+    allowance: float
+) -> List[ItineraryItemSchema]:
+    items: List[ItineraryItemSchema] = []
+    clock = profile.start_minute
+    spent = 0.0
+    for visit in visits:
+        duration = round(VISIT_MINUTES[visit.destination.category] * profile.visit_factor)
+        leg = transportation_between(distances, items[-1].destination, visit.destination) if items else None
+        arrival = clock + (leg.duration if leg else 0)
+        start = _earliest_start(visit.opening_hours, day_date, arrival, duration, profile.end_minute)
+        cost = visit.fee * request.traveler_count
+        travel_cost = leg.cost * request.traveler_count if leg else 0
+        if start is None or spent + cost + travel_cost > allowance:
+            continue
+
+        if leg:
+            items[-1].transportation_to_next = leg
+        items.append(ItineraryItemSchema(
+            id=str(uuid.uuid4()),
+            destination=visit.destination,
+            start_time=_format_minute(start),
+            end_time=_format_minute(start + duration),
+            duration=duration,
+            estimated_cost=cost,
+            notes=f"Kunjungan ke {visit.destination.name}"
+        ))
+        clock = start + duration
+        spent += cost + travel_cost
+    return items
+
+
+def _earliest_start(
+    opening_hours: Optional[OpeningHours],
+    day_date: date,
+    arrival: int,
+    duration: int,
+    day_end: int
+) -> Optional[int]:
+    """Earliest start at or after arrival that fits a whole visit in opening hours"""
+    arrival = _round_up(arrival)
+    for opens, closes in _windows(opening_hours, day_date):
+        start = max(arrival, opens)
+        if start + duration <= min(closes, day_end):
+            return start
+    return None
+
+
+def _windows(opening_hours: Optional[OpeningHours], day_date: date) -> List[Tuple[int, int]]:
+    """Opening windows on a date in minutes after midnight, earliest first"""
+    if opening_hours is None:
+        return [(0, 24 * 60)]
+    windows = []
+    for window in opening_hours.get(WEEKDAYS[day_date.weekday()]) or []:
+        closes = parse_minute(window["close"])
+        # "23:59" closes at midnight
+        windows.append((parse_minute(window["open"]), 24 * 60 if closes == 24 * 60 - 1 else closes))
+    return sorted(windows)
+
+
+def _closing_minute(visit: PlannerCandidate, day_date: date) -> int:
+    windows = _windows(visit.opening_hours, day_date)
+    return windows[-1][1] if windows else 0
+
+
+def _round_up(minute: int) -> int:
+    return math.ceil(minute / SCHEDULE_STEP_MINUTES) * SCHEDULE_STEP_MINUTES
+
+
+def _format_minute(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _wanted(interests: Sequence[str]) -> Tuple[set, set]:
+    """Categories and tag words asked for by the traveler's interests"""
+    categories, words = set(), set()
+    for interest in interests:
+        word = interest.strip().lower()
+        words.add(word)
+        categories.update(INTEREST_CATEGORIES.get(word, ()))
+        if word in DestinationCategory._value2member_map_:
+            categories.add(DestinationCategory(word))
+    return categories, words
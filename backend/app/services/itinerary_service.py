@@ -2,36 +2,85 @@
 Itinerary Service for generating and managing travel itineraries
 """
 
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date, timedelta
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
+from datetime import datetime, date, time, timedelta
 import uuid
 
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql import func
+
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models.database_models import Destination, Itinerary, ItineraryDay, ItineraryItem
 from app.models.schemas import (
     ItineraryGenerationRequest,
     ItineraryGenerationResponse,
     ItinerarySchema,
     ItineraryDaySchema,
     ItineraryItemSchema,
-    DestinationSchema,
+    ItineraryItemInsert,
+    ItineraryItemMove,
+    ItineraryOperation,
+    ItineraryUpdateRequest,
+    TransportationSchema,
     LocationSchema,
     DestinationCategory,
-    PriceRange
+    TravelerType,
+    ActivityLevel
 )
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, get_ai_service
 from app.services.destination_service import DestinationService
+from app.services.distance_matrix import get_distance_matrix
+from app.services.itinerary_planner import (
+    ACTIVITY_PROFILES,
+    VISIT_MINUTES,
+    PlannerCandidate,
+    UnschedulableVisitError,
+    Visit,
+    entry_fee,
+    parse_minute,
+    plan_days,
+    retime_visits,
+    visit_fits
+)
+from app.services.itinerary_templates import itinerary_template_demand, template_key
 
 logger = logging.getLogger(__name__)
 
+# Destinations further than this from the trip's anchor are not suggested
+ITINERARY_RADIUS_KM = 50
+# Destinations around the anchor the planner chooses from
+PLANNER_CANDIDATE_LIMIT = 200
+# Re-timed days without a previous start begin at the default day start
+DEFAULT_DAY_START = ACTIVITY_PROFILES[ActivityLevel.MODERATE].start_minute
+
+
+class InvalidItineraryUpdateError(ValueError):
+    """Raised when an itinerary operation refers to an unknown day, item or destination"""
+
+
+class NoDestinationsFoundError(ValueError):
+    """Raised when no stored destination matches the trip's requested place"""
+
+    def __init__(self, destination: str):
+        super().__init__(f"No destinations found for {destination}")
+        self.destination = destination
+
 
 class ItineraryService:
     """
     Service for generating and managing travel itineraries
     """
     
-    def __init__(self):
-        self.ai_service = AIService()
-        self.destination_service = DestinationService()
+    def __init__(self, db: AsyncSession = None, ai_service: AIService = None):
+        self.ai_service = ai_service or get_ai_service()
+        self.destination_service = DestinationService(db=db)
+        self.db = self.destination_service.db
     
     async def generate_itinerary(
         self,
@@ -42,89 +91,185 @@ class ItineraryService:
         """
         try:
             logger.info(f"Generating itinerary for {request.destination}, {request.duration} days")
+            itinerary_template_demand.record(request)
             
-            # Mock implementation - would use AI and real destination data
-            itinerary = await self._create_mock_itinerary(request)
+            # Popular trips are served from their precomputed template
+            itinerary = await self._itinerary_from_template(request)
+            if itinerary is None:
+                itinerary = await self._create_itinerary(request)
+            response = ItineraryGenerationResponse(itinerary=itinerary, **self._generation_notes())
+            await self.save_itinerary(response)
             
-            return ItineraryGenerationResponse(
-                itinerary=itinerary,
-                ai_reasoning="Itinerary dibuat berdasarkan preferensi Anda dengan mempertimbangkan jarak, waktu, dan minat wisata.",
-                confidence_score=0.85,
-                alternative_suggestions=[
-                    "Pertimbangkan untuk menambah 1 hari untuk eksplorasi lebih mendalam",
-                    "Coba kunjungi pasar lokal untuk pengalaman kuliner yang autentik"
-                ]
-            )
+            return response
+            
+        except NoDestinationsFoundError:
+            raise
             
         except Exception as e:
             logger.error(f"Error generating itinerary: {str(e)}")
             raise
     
-    async def _create_mock_itinerary(
+    async def generate_itinerary_stream(
         self,
         request: ItineraryGenerationRequest
-    ) -> ItinerarySchema:
+    ) -> AsyncIterator[Tuple[str, Union[BaseModel, Dict[str, Any]]]]:
         """
-        Create a mock itinerary for demonstration
+        Generate an itinerary incrementally as (frame type, payload) pairs:
+        a "header" frame with the itinerary minus its days, a "day" frame
+        for each day as soon as it is planned, then a "summary" frame with
+        the totals. Raises NoDestinationsFoundError before any frame when
+        there is nothing to plan the trip from.
         """
-        itinerary_id = str(uuid.uuid4())
-        start_date = request.start_date or date.today()
-        
-        # Create mock destinations
-        mock_destinations = self._create_mock_destinations(request.destination)
-        
-        # Create itinerary days
-        days = []
-        total_cost = 0
-        
-        for day_num in range(1, request.duration + 1):
-            current_date = start_date + timedelta(days=day_num - 1)
-            
-            # Create items for this day (2-3 destinations per day)
-            day_items = []
-            day_cost = 0
-            
-            destinations_per_day = min(3, len(mock_destinations))
-            for i in range(destinations_per_day):
-                if i < len(mock_destinations):
-                    destination = mock_destinations[i]
-                    
-                    # Calculate time slots
-                    start_time = f"{9 + i * 3}:00"
-                    end_time = f"{11 + i * 3}:00"
-                    
-                    item_cost = 100000 + (i * 50000)  # Mock cost
-                    
-                    item = ItineraryItemSchema(
-                        id=str(uuid.uuid4()),
-                        destination=destination,
-                        start_time=start_time,
-                        end_time=end_time,
-                        duration=120,  # 2 hours
-                        estimated_cost=item_cost,
-                        notes=f"Kunjungan ke {destination.name}"
-                    )
-                    
-                    day_items.append(item)
-                    day_cost += item_cost
-            
-            day = ItineraryDaySchema(
-                day=day_num,
-                date=current_date,
-                items=day_items,
-                total_cost=day_cost,
-                notes=f"Hari {day_num} - Eksplorasi {request.destination}"
-            )
+        try:
+            logger.info(f"Streaming itinerary for {request.destination}, {request.duration} days")
+            itinerary_template_demand.record(request)
             
-            days.append(day)
-            total_cost += day_cost
-        
+            # Found before the header goes out: its id is only sent for an itinerary that gets saved
+            anchor, candidates = await self._find_candidates(request)
+            header = self._itinerary_header(request)
+            yield "header", header
+            
+            days = []
+            for day in plan_days(request, candidates, anchor=(anchor.latitude, anchor.longitude)):
+                days.append(day)
+                yield "day", day
+            
+            total_cost = sum(day.total_cost for day in days)
+            notes = self._generation_notes()
+            itinerary = header.model_copy(update={"days": days, "total_cost": total_cost})
+            await self.save_itinerary(ItineraryGenerationResponse(itinerary=itinerary, **notes))
+            
+            yield "summary", {"total_cost": total_cost, **notes}
+            
+        except NoDestinationsFoundError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming itinerary: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _generation_notes() -> Dict[str, Any]:
+        return {
+            "ai_reasoning": "Itinerary dibuat berdasarkan preferensi Anda dengan mempertimbangkan jarak, waktu, dan minat wisata.",
+            "confidence_score": 0.85,
+            "alternative_suggestions": [
+                "Pertimbangkan untuk menambah 1 hari untuk eksplorasi lebih mendalam",
+                "Coba kunjungi pasar lokal untuk pengalaman kuliner yang autentik"
+            ]
+        }
+    
+    async def _create_itinerary(self, request: ItineraryGenerationRequest) -> ItinerarySchema:
+        """Plan a complete itinerary from the stored destinations around the requested place"""
+        anchor, candidates = await self._find_candidates(request)
+        itinerary = self._itinerary_header(request)
+        itinerary.days = list(plan_days(request, candidates, anchor=(anchor.latitude, anchor.longitude)))
+        itinerary.total_cost = sum(day.total_cost for day in itinerary.days)
+        return itinerary
+    
+    async def _itinerary_from_template(self, request: ItineraryGenerationRequest) -> Optional[ItinerarySchema]:
+        """
+        The stored template of the request's trip adapted to the request,
+        if there is one, every destination in it is still active, it fits the
+        budget and every visit is still within opening hours on its new date
+        """
+        if not get_settings().itinerary_templates_enabled:
+            return None
+        try:
+            result = await self.db.execute(self._with_days(
+                select(Itinerary)
+                .where(Itinerary.is_template == True, Itinerary.template_key == template_key(request))
+                .order_by(Itinerary.created_at.desc())
+                .limit(1)
+            ))
+            template = result.scalar_one_or_none()
+            if template is None:
+                return None
+            
+            destinations = {
+                str(item.destination_id): item.destination
+                for day in template.days for item in day.items
+            }
+            if not all(destination.is_active for destination in destinations.values()):
+                return None
+            
+            itinerary = self._adapt_template(self._itinerary_to_schema(template), request)
+            if itinerary.total_cost > request.budget:
+                return None
+            
+            for day in itinerary.days:
+                for item in day.items:
+                    if not visit_fits(
+                        destinations[item.destination.id].opening_hours, day.date,
+                        parse_minute(item.start_time), parse_minute(item.end_time)
+                    ):
+                        return None
+            return itinerary
+            
+        except Exception as e:
+            logger.error(f"Error loading itinerary template: {str(e)}")
+            return None
+    
+    def _adapt_template(self, template: ItinerarySchema, request: ItineraryGenerationRequest) -> ItinerarySchema:
+        """
+        A template moved to the request's start date, with fresh ids and its
+        costs scaled to the request's traveler count (entry fees and travel
+        legs are per person, so every cost scales linearly)
+        """
+        scale = request.traveler_count / template.traveler_count
+        start_date = request.start_date or date.today()
+        itinerary = self._itinerary_header(request)
+        itinerary.days = [
+            day.model_copy(update={
+                "date": start_date + timedelta(days=day.day - 1),
+                "total_cost": day.total_cost * scale,
+                "items": [
+                    item.model_copy(update={"id": str(uuid.uuid4()), "estimated_cost": item.estimated_cost * scale})
+                    for item in day.items
+                ]
+            })
+            for day in template.days
+        ]
+        itinerary.total_cost = sum(day.total_cost for day in itinerary.days)
+        return itinerary
+    
+    async def build_templates(self, requests: List[ItineraryGenerationRequest]) -> int:
+        """
+        Plan and store a template for each request's trip, replacing the
+        trip's previous template; returns how many templates were stored
+        """
+        built = 0
+        for request in requests:
+            try:
+                itinerary = await self._create_itinerary(request)
+                
+                key = template_key(request)
+                result = await self.db.execute(
+                    select(Itinerary.id).where(Itinerary.is_template == True, Itinerary.template_key == key)
+                )
+                previous = result.scalars().all()
+                await self.save_itinerary(
+                    ItineraryGenerationResponse(itinerary=itinerary, **self._generation_notes()),
+                    template_key=key
+                )
+                for itinerary_id in previous:
+                    await self.delete_itinerary(str(itinerary_id))
+                built += 1
+                
+            except NoDestinationsFoundError as e:
+                logger.info(f"Skipping itinerary template: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error building itinerary template for {request.destination}: {str(e)}")
+        return built
+    
+    @staticmethod
+    def _itinerary_header(request: ItineraryGenerationRequest) -> ItinerarySchema:
+        """The itinerary without its days"""
         return ItinerarySchema(
-            id=itinerary_id,
+            id=str(uuid.uuid4()),
             title=f"Perjalanan {request.duration} Hari ke {request.destination}",
             description=f"Itinerary {request.duration} hari untuk {request.traveler_count} orang di {request.destination}",
-            days=days,
-            total_cost=total_cost,
+            days=[],
+            total_cost=0,
             total_duration=request.duration,
             traveler_count=request.traveler_count,
             traveler_type=request.traveler_type,
@@ -132,84 +277,134 @@ class ItineraryService:
             updated_at=datetime.now()
         )
     
-    def _create_mock_destinations(self, destination_name: str) -> List[DestinationSchema]:
+    async def _find_candidates(
+        self,
+        request: ItineraryGenerationRequest
+    ) -> Tuple[LocationSchema, List[PlannerCandidate]]:
         """
-        Create mock destinations for the itinerary
+        The trip's anchor and every destination around it the planner may
+        choose from, with their entry fees and opening hours
         """
-        destinations = []
-        
-        # Mock destinations based on location
-        if "bali" in destination_name.lower():
-            mock_data = [
-                {
-                    "name": "Pantai Kuta",
-                    "description": "Pantai terkenal dengan sunset yang indah",
-                    "category": DestinationCategory.BEACH,
-                    "city": "Badung",
-                    "lat": -8.7205,
-                    "lng": 115.1693
-                },
-                {
-                    "name": "Pura Tanah Lot",
-                    "description": "Pura Hindu yang ikonik di atas batu karang",
-                    "category": DestinationCategory.RELIGIOUS,
-                    "city": "Tabanan",
-                    "lat": -8.6211,
-                    "lng": 115.0868
-                },
-                {
-                    "name": "Ubud Monkey Forest",
-                    "description": "Hutan suci dengan monyet dan pura kuno",
-                    "category": DestinationCategory.NATURE,
-                    "city": "Ubud",
-                    "lat": -8.5069,
-                    "lng": 115.2581
-                }
-            ]
-        else:
-            # Generic mock destinations
-            mock_data = [
-                {
-                    "name": f"Destinasi Utama {destination_name}",
-                    "description": f"Tempat wisata populer di {destination_name}",
-                    "category": DestinationCategory.CULTURAL,
-                    "city": destination_name,
-                    "lat": -6.2088,
-                    "lng": 106.8456
-                }
-            ]
-        
-        for i, data in enumerate(mock_data):
-            destination = DestinationSchema(
-                id=str(uuid.uuid4()),
-                name=data["name"],
-                description=data["description"],
-                location=LocationSchema(
-                    latitude=data["lat"],
-                    longitude=data["lng"],
-                    address=f"Alamat {data['name']}",
-                    city=data["city"],
-                    province="Bali" if "bali" in destination_name.lower() else "Indonesia"
-                ),
-                category=data["category"],
-                images=[f"https://example.com/image{i+1}.jpg"],
-                rating=4.2 + (i * 0.2),
-                review_count=150 + (i * 50),
-                price_range=PriceRange.MODERATE,
-                facilities=["Parkir", "Toilet", "Warung"],
-                tags=["populer", "instagramable"]
+        anchor = await self._find_anchor(request)
+        if anchor is None:
+            raise NoDestinationsFoundError(request.destination)
+
+        destinations = await self.destination_service.get_destinations_near(
+            anchor.latitude,
+            anchor.longitude,
+            radius_km=ITINERARY_RADIUS_KM,
+            limit=PLANNER_CANDIDATE_LIMIT
+        )
+        if not destinations:
+            raise NoDestinationsFoundError(request.destination)
+        details = await self.destination_service.get_visit_details(
+            [destination.id for destination in destinations]
+        )
+        return anchor, [
+            PlannerCandidate(destination, **details.get(destination.id, {}))
+            for destination in destinations
+        ]
+
+    async def _find_anchor(self, request: ItineraryGenerationRequest) -> Optional[LocationSchema]:
+        """
+        Location of the best text match for the requested place, falling
+        back to a typo-tolerant match (e.g. "jogja", "yogyakrta")
+        """
+        for fuzzy in (False, True):
+            anchor = await self.destination_service.search_destinations(
+                query=request.destination, page_size=1, include_total=False, fuzzy=fuzzy
             )
-            destinations.append(destination)
-        
-        return destinations
+            if anchor.destinations:
+                return anchor.destinations[0].location
+        return None
+
+    async def save_itinerary(
+        self,
+        generated: ItineraryGenerationResponse,
+        user_id: Optional[uuid.UUID] = None,
+        template_key: Optional[str] = None
+    ):
+        """
+        Store a generated itinerary in one transaction: one INSERT for the
+        itinerary, then one bulk INSERT for all its days and one for all
+        their items. With a template_key it is stored as that trip's template.
+        """
+        try:
+            itinerary = generated.itinerary
+            itinerary_id = uuid.UUID(itinerary.id)
+            day_rows, item_rows = [], []
+            for day in itinerary.days:
+                day_id = uuid.uuid4()
+                day_rows.append({
+                    "id": day_id,
+                    "itinerary_id": itinerary_id,
+                    "day_number": day.day,
+                    "date": datetime.combine(day.date, time()),
+                    "total_cost": day.total_cost,
+                    "notes": day.notes
+                })
+                for index, item in enumerate(day.items):
+                    transportation = item.transportation_to_next
+                    item_rows.append({
+                        "id": uuid.UUID(item.id),
+                        "day_id": day_id,
+                        "destination_id": uuid.UUID(item.destination.id),
+                        "start_time": item.start_time,
+                        "end_time": item.end_time,
+                        "duration": item.duration,
+                        "estimated_cost": item.estimated_cost,
+                        "notes": item.notes,
+                        "order_index": index,
+                        "transportation_type": transportation.type.value if transportation else None,
+                        "transportation_duration": transportation.duration if transportation else None,
+                        "transportation_cost": transportation.cost if transportation else None,
+                        "transportation_notes": transportation.description if transportation else None
+                    })
+            
+            await self.db.execute(insert(Itinerary).values(
+                id=itinerary_id,
+                title=itinerary.title,
+                description=itinerary.description,
+                total_cost=itinerary.total_cost,
+                total_duration=itinerary.total_duration,
+                traveler_count=itinerary.traveler_count,
+                traveler_type=itinerary.traveler_type.value,
+                start_date=day_rows[0]["date"] if day_rows else None,
+                end_date=day_rows[-1]["date"] if day_rows else None,
+                ai_generated=True,
+                ai_confidence=generated.confidence_score,
+                ai_reasoning=generated.ai_reasoning,
+                is_template=template_key is not None,
+                template_key=template_key,
+                user_id=user_id,
+                created_at=itinerary.created_at,
+                updated_at=itinerary.updated_at
+            ))
+            # render_nulls keeps rows with and without transportation in one batch
+            if day_rows:
+                await self.db.execute(insert(ItineraryDay).execution_options(render_nulls=True), day_rows)
+            if item_rows:
+                await self.db.execute(insert(ItineraryItem).execution_options(render_nulls=True), item_rows)
+            await self.db.commit()
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Error saving itinerary: {str(e)}")
+            raise
     
     async def get_itinerary(self, itinerary_id: str) -> Optional[ItinerarySchema]:
         """
-        Retrieve a specific itinerary by ID
+        Retrieve a specific itinerary by ID, with all its days, items and
+        their destinations in a fixed number of queries
         """
         try:
-            # Mock implementation - would query database
-            return None
+            parsed_id = DestinationService._parse_id(itinerary_id)
+            if parsed_id is None:
+                return None
+            
+            result = await self.db.execute(self._with_days(select(Itinerary).where(Itinerary.id == parsed_id)))
+            itinerary = result.scalar_one_or_none()
+            return self._itinerary_to_schema(itinerary) if itinerary else None
             
         except Exception as e:
             logger.error(f"Error retrieving itinerary: {str(e)}")
@@ -218,31 +413,256 @@ class ItineraryService:
     async def update_itinerary(
         self,
         itinerary_id: str,
-        updates: Dict[str, Any]
+        updates: ItineraryUpdateRequest
     ) -> Optional[ItinerarySchema]:
         """
-        Update an existing itinerary
+        Update an itinerary's title, description, visibility or status and
+        apply its item operations. Only the items of days an operation
+        touches are loaded; those days are re-timed and re-costed, and only
+        the rows that changed are written
         """
         try:
-            # Mock implementation - would update database
-            return None
+            parsed_id = DestinationService._parse_id(itinerary_id)
+            if parsed_id is None:
+                return None
+            
+            result = await self.db.execute(
+                select(Itinerary).where(Itinerary.id == parsed_id).options(selectinload(Itinerary.days))
+            )
+            itinerary = result.scalar_one_or_none()
+            if itinerary is None:
+                return None
+            
+            for field, value in updates.dict(exclude_unset=True, exclude={"operations"}).items():
+                setattr(itinerary, field, value)
+            if updates.operations:
+                await self._apply_operations(itinerary, updates.operations)
+            itinerary.updated_at = func.now()
+            await self.db.commit()
+            
+            return await self.get_itinerary(itinerary_id)
             
         except Exception as e:
+            await self.db.rollback()
             logger.error(f"Error updating itinerary: {str(e)}")
             raise
     
+    async def _apply_operations(self, itinerary: Itinerary, operations: List[ItineraryOperation]):
+        """Apply move/insert/remove operations, then re-time the days they touched"""
+        days = {day.day_number: day for day in itinerary.days}
+        item_ids = {
+            DestinationService._parse_id(op.item_id) for op in operations if not isinstance(op, ItineraryItemInsert)
+        }
+        target_days = {op.to_day for op in operations if isinstance(op, ItineraryItemMove)} | {
+            op.day for op in operations if isinstance(op, ItineraryItemInsert)
+        }
+        unknown_days = target_days - set(days)
+        if unknown_days:
+            raise InvalidItineraryUpdateError(f"Itinerary has no day {min(unknown_days)}")
+        
+        # Every item of the target days and of the days holding the operated items
+        day_ids = [day.id for day in itinerary.days]
+        result = await self.db.execute(
+            select(ItineraryItem)
+            .where(or_(
+                ItineraryItem.day_id.in_([days[number].id for number in target_days]),
+                ItineraryItem.day_id.in_(
+                    select(ItineraryItem.day_id).where(
+                        ItineraryItem.id.in_(item_ids - {None}),
+                        ItineraryItem.day_id.in_(day_ids)
+                    )
+                )
+            ))
+            .options(joinedload(ItineraryItem.destination))
+            .order_by(ItineraryItem.order_index)
+        )
+        day_numbers = {day.id: day.day_number for day in itinerary.days}
+        loaded: Dict[int, List[ItineraryItem]] = {}
+        items_by_id: Dict[uuid.UUID, Tuple[int, ItineraryItem]] = {}
+        for item in result.scalars().unique():
+            day_number = day_numbers[item.day_id]
+            loaded.setdefault(day_number, []).append(item)
+            items_by_id[item.id] = (day_number, item)
+        
+        destinations = await self._operation_destinations(operations)
+        
+        ordered = {number: list(items) for number, items in loaded.items()}
+        for number in target_days:
+            ordered.setdefault(number, [])
+        # Where each touched day started before the edit
+        day_starts = {number: parse_minute(items[0].start_time) for number, items in ordered.items() if items}
+        
+        for op in operations:
+            if isinstance(op, ItineraryItemInsert):
+                destination = destinations[op.destination_id]
+                item = ItineraryItem(
+                    id=uuid.uuid4(),
+                    day_id=days[op.day].id,
+                    destination_id=destination.id,
+                    destination=destination,
+                    duration=op.duration or VISIT_MINUTES[DestinationCategory(destination.category)],
+                    estimated_cost=entry_fee(destination.entry_fee, destination.price_range) * itinerary.traveler_count,
+                    notes=op.notes or f"Kunjungan ke {destination.name}"
+                )
+                self.db.add(item)
+                self._place(ordered[op.day], item, op.position)
+                continue
+            
+            # Any spelling of the UUID (case, hyphens) names the same item
+            item_id = DestinationService._parse_id(op.item_id)
+            if item_id not in items_by_id:
+                raise InvalidItineraryUpdateError(f"Itinerary has no item {op.item_id}")
+            day_number, item = items_by_id.pop(item_id)
+            ordered[day_number].remove(item)
+            if isinstance(op, ItineraryItemMove):
+                item.day_id = days[op.to_day].id
+                self._place(ordered[op.to_day], item, op.position)
+                items_by_id[item_id] = (op.to_day, item)
+            else:
+                await self.db.delete(item)
+        
+        for number, items in ordered.items():
+            previous_cost = days[number].total_cost or 0.0
+            self._retime_day(days[number], items, day_starts.get(number, DEFAULT_DAY_START), itinerary.traveler_count)
+            itinerary.total_cost = (itinerary.total_cost or 0.0) + days[number].total_cost - previous_cost
+    
+    async def _operation_destinations(self, operations: List[ItineraryOperation]) -> Dict[str, Destination]:
+        """Active destinations the insert operations add, by requested id"""
+        requested = {op.destination_id: DestinationService._parse_id(op.destination_id)
+                     for op in operations if isinstance(op, ItineraryItemInsert)}
+        if not requested:
+            return {}
+        result = await self.db.execute(
+            select(Destination).where(
+                Destination.id.in_({parsed for parsed in requested.values() if parsed is not None}),
+                Destination.is_active == True
+            )
+        )
+        found = {destination.id: destination for destination in result.scalars()}
+        missing = [destination_id for destination_id, parsed in requested.items() if parsed not in found]
+        if missing:
+            raise InvalidItineraryUpdateError(f"Unknown destination {missing[0]}")
+        return {destination_id: found[parsed] for destination_id, parsed in requested.items()}
+    
+    @staticmethod
+    def _place(items: List[ItineraryItem], item: ItineraryItem, position: Optional[int]):
+        items.insert(len(items) if position is None else position, item)
+    
+    @staticmethod
+    def _retime_day(day: ItineraryDay, items: List[ItineraryItem], start_minute: int, traveler_count: int):
+        """Re-time a day's items in their new order and recompute its legs and total"""
+        visits = [
+            Visit(str(item.destination.id), item.destination.name, item.duration, item.destination.opening_hours)
+            for item in items
+        ]
+        distances = get_distance_matrix(
+            (str(item.destination.id), item.destination.latitude, item.destination.longitude) for item in items
+        )
+        try:
+            times = retime_visits(visits, day.date.date(), start_minute, distances)
+        except UnschedulableVisitError as e:
+            raise InvalidItineraryUpdateError(f"Day {day.day_number}: {str(e)}")
+        
+        travel_cost = 0.0
+        for index, (item, time_slot) in enumerate(zip(items, times)):
+            leg = time_slot.transportation_to_next
+            item.order_index = index
+            item.start_time = time_slot.start_time
+            item.end_time = time_slot.end_time
+            item.transportation_type = leg.type.value if leg else None
+            item.transportation_duration = leg.duration if leg else None
+            item.transportation_cost = leg.cost if leg else None
+            item.transportation_notes = leg.description if leg else None
+            travel_cost += leg.cost if leg else 0.0
+        day.total_cost = sum(item.estimated_cost for item in items) + traveler_count * travel_cost
+    
     async def delete_itinerary(self, itinerary_id: str) -> bool:
         """
-        Delete an itinerary
+        Delete an itinerary with its days and items
         """
         try:
-            # Mock implementation - would delete from database
-            return False
+            parsed_id = DestinationService._parse_id(itinerary_id)
+            if parsed_id is None:
+                return False
+            
+            day_ids = select(ItineraryDay.id).where(ItineraryDay.itinerary_id == parsed_id)
+            await self.db.execute(
+                delete(ItineraryItem)
+                .where(ItineraryItem.day_id.in_(day_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await self.db.execute(
+                delete(ItineraryDay)
+                .where(ItineraryDay.itinerary_id == parsed_id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.db.execute(
+                delete(Itinerary)
+                .where(Itinerary.id == parsed_id)
+                .execution_options(synchronize_session=False)
+            )
+            await self.db.commit()
+            return result.rowcount > 0
             
         except Exception as e:
+            await self.db.rollback()
             logger.error(f"Error deleting itinerary: {str(e)}")
             raise
     
+    @staticmethod
+    def _with_days(stmt):
+        """Load itineraries with their days, items and item destinations"""
+        return stmt.options(
+            selectinload(Itinerary.days)
+            .selectinload(ItineraryDay.items)
+            .selectinload(ItineraryItem.destination)
+            .options(selectinload(Destination.tags), selectinload(Destination.facilities))
+        ).execution_options(populate_existing=True)
+    
+    def _itinerary_to_schema(self, itinerary: Itinerary) -> ItinerarySchema:
+        """Convert a loaded itinerary tree to its Pydantic schema"""
+        return ItinerarySchema(
+            id=str(itinerary.id),
+            title=itinerary.title,
+            description=itinerary.description or "",
+            days=[
+                ItineraryDaySchema(
+                    day=day.day_number,
+                    date=day.date.date(),
+                    items=[self._item_to_schema(item) for item in day.items],
+                    total_cost=day.total_cost,
+                    notes=day.notes
+                )
+                for day in itinerary.days
+            ],
+            total_cost=itinerary.total_cost,
+            total_duration=itinerary.total_duration,
+            traveler_count=itinerary.traveler_count,
+            traveler_type=TravelerType(itinerary.traveler_type),
+            created_at=itinerary.created_at,
+            updated_at=itinerary.updated_at or itinerary.created_at
+        )
+    
+    def _item_to_schema(self, item: ItineraryItem) -> ItineraryItemSchema:
+        transportation = None
+        if item.transportation_type:
+            transportation = TransportationSchema(
+                type=item.transportation_type,
+                duration=item.transportation_duration,
+                cost=item.transportation_cost,
+                description=item.transportation_notes or ""
+            )
+        return ItineraryItemSchema(
+            id=str(item.id),
+            destination=self.destination_service._destination_to_schema(item.destination),
+            start_time=item.start_time,
+            end_time=item.end_time,
+            duration=item.duration,
+            notes=item.notes,
+            estimated_cost=item.estimated_cost,
+            transportation_to_next=transportation
+        )
+    
     async def update_destination_sentiments(self, destination_ids: List[str]):
         """
         Background task to update sentiment analysis for destinations
@@ -253,3 +673,24 @@ class ItineraryService:
             
         except Exception as e:
             logger.error(f"Error updating destination sentiments: {str(e)}")
+
+
+async def refresh_itinerary_templates(interval: float, session_factory: async_sessionmaker = AsyncSessionLocal):
+    """
+    Every interval seconds, rebuild the templates of the trips this worker
+    was asked for most often since the last rebuild
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            settings = get_settings()
+            requests = itinerary_template_demand.top(
+                settings.itinerary_template_count, settings.itinerary_template_min_requests
+            )
+            itinerary_template_demand.decay()
+            if requests:
+                async with session_factory() as db:
+                    built = await ItineraryService(db=db).build_templates(requests)
+                logger.info(f"Built {built} itinerary templates")
+        except Exception as e:
+            logger.error(f"Error building itinerary templates: {str(e)}")
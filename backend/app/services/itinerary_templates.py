@@ -0,0 +1,83 @@
+"""
+Demand tracking for precomputed itinerary templates.
+
+Most itinerary requests repeat a handful of trips ("Bali 3 hari keluarga",
+"Yogyakarta 2 hari pasangan"). Every request is counted under a template
+key of what shapes its plan: destination, duration, traveler type,
+activity level and interests. A background job periodically plans and
+stores a template itinerary for the most requested keys, and generation
+serves a matching template (with its dates and costs adapted) instead of
+planning the trip from scratch.
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter
+from typing import Dict, List
+
+from app.models.schemas import ItineraryGenerationRequest
+
+# Keys tracked before the least requested ones are forgotten
+MAX_TRACKED_KEYS = 10000
+
+
+def template_key(request: ItineraryGenerationRequest) -> str:
+    """Key shared by requests a single template can answer"""
+    payload = json.dumps([
+        " ".join(request.destination.lower().split()),
+        request.duration,
+        request.traveler_type.value,
+        request.activity_level.value,
+        sorted({interest.strip().lower() for interest in request.interests})
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TemplateDemand:
+    """Request counts per template key, with the latest request seen for each"""
+
+    def __init__(self, max_keys: int = MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._requests: Dict[str, ItineraryGenerationRequest] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def record(self, request: ItineraryGenerationRequest):
+        key = template_key(request)
+        with self._lock:
+            self._counts[key] += 1
+            self._requests[key] = request
+            if len(self._counts) > self.max_keys:
+                self._keep(self.max_keys // 2)
+
+    def top(self, n: int, min_requests: int = 1) -> List[ItineraryGenerationRequest]:
+        """Latest request of each of the n most requested keys, most requested first"""
+        with self._lock:
+            return [
+                self._requests[key] for key, count in self._counts.most_common(n) if count >= min_requests
+            ]
+
+    def decay(self):
+        """Halve every count, so trips that stop being requested fade out"""
+        with self._lock:
+            for key in self._counts:
+                self._counts[key] //= 2
+            self._keep(len(self._counts))
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._requests.clear()
+
+    def _keep(self, n: int):
+        kept = {key: count for key, count in self._counts.most_common(n) if count > 0}
+        self._counts = Counter(kept)
+        self._requests = {key: self._requests[key] for key in kept}
+
+
+# Process-wide demand, recorded by every itinerary request of this worker
+itinerary_template_demand = TemplateDemand()
@@ -5,14 +5,34 @@ Supports: IBM Watson Orchestrate, Replicate (IBM Granite), Hugging Face
 
 import os
 import json
+import random
 import asyncio
 import aiohttp
 import logging
+from collections import deque
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.circuit_breaker import get_circuit_breaker
+
 logger = logging.getLogger(__name__)
 
+# Latencies kept per provider, and how many are needed before their p95
+# replaces the configured hedge delay
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.2
+
+# Replicate predictions not finished within the Prefer: wait window are
+# streamed, or polled with jittered exponential backoff between these bounds
+REPLICATE_POLL_INITIAL_DELAY = 0.25
+REPLICATE_POLL_MAX_DELAY = 4.0
+REPLICATE_TERMINAL_STATUSES = ('succeeded', 'failed', 'canceled')
+REPLICATE_CANCEL_TIMEOUT = 5.0
+
 class MultiAIService:
     def __init__(self):
         self.ai_provider = os.getenv('AI_PROVIDER', 'ibm_watson')
@@ -24,11 +44,34 @@ class MultiAIService:
         # Replicate Configuration (IBM Granite Model)
         self.replicate_api_token = os.getenv('REPLICATE_API_TOKEN')
         self.replicate_model = os.getenv('REPLICATE_MODEL', 'ibm-granite/granite-3.3-8b-instruct')
+        self.replicate_api_url = os.getenv('REPLICATE_API_URL', 'https://api.replicate.com').rstrip('/')
+        self.replicate_wait = int(os.getenv('REPLICATE_WAIT', '30'))  # Prefer: wait seconds (1-60)
+        self.replicate_timeout = float(os.getenv('REPLICATE_TIMEOUT', '60'))  # whole prediction
         
         # Hugging Face Configuration (Fallback)
         self.huggingface_api_token = os.getenv('HUGGINGFACE_API_TOKEN')
         self.huggingface_model = os.getenv('HUGGINGFACE_MODEL', 'microsoft/DialoGPT-medium')
         
+        # Provider order, and hedging (opt-in, since overlapping calls are all
+        # billed): start the next provider when the current one is slower
+        # than its usual (p95) response time
+        self.provider_priority = [
+            provider.strip()
+            for provider in os.getenv('AI_PROVIDER_PRIORITY', 'ibm_watson,replicate,huggingface').split(',')
+            if provider.strip()
+        ]
+        self.hedging = os.getenv('AI_HEDGING', 'false').lower() == 'true'
+        self.hedge_delay = float(os.getenv('AI_HEDGE_DELAY', '5'))  # until enough latencies are known
+        self.hedge_delays = {  # fixed per-provider delays, e.g. "ibm_watson:3,replicate:8"
+            provider.strip(): float(delay)
+            for provider, delay in (
+                item.split(':') for item in os.getenv('AI_HEDGE_DELAYS', '').split(',') if ':' in item
+            )
+        }
+        self.deadline = float(os.getenv('AI_DEADLINE', '45'))  # seconds for all providers together
+        self._latencies: Dict[str, deque] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        
         logger.info(f"Multi AI Service initialized with provider: {self.ai_provider}")
         logger.info(f"IBM Watson available: {bool(self.ibm_watson_api_key)}")
         logger.info(f"Replicate available: {bool(self.replicate_api_token)}")
@@ -36,49 +79,168 @@ class MultiAIService:
 
     async def process_travel_query(self, query: str, preferences: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Process travel query using available AI providers with fallback chain:
+        Process travel query using available AI providers in priority order
+        (AI_PROVIDER_PRIORITY, by default):
         1. IBM Watson Orchestrate (Primary - for IBM demo)
         2. Replicate IBM Granite (Backup - still IBM model)
         3. Hugging Face (Fallback)
         4. Mock data (Final fallback)
-        """
         
-        # Try IBM Watson Orchestrate first
-        if self.ai_provider == 'ibm_watson' and self.ibm_watson_api_key:
-            try:
-                logger.info("🔵 Attempting IBM Watson Orchestrate...")
-                result = await self._process_with_ibm_watson(query, preferences)
-                if result:
-                    logger.info("✅ IBM Watson Orchestrate successful")
-                    return result
-            except Exception as e:
-                logger.warning(f"❌ IBM Watson failed: {e}")
+        With hedging (AI_HEDGING=true), providers overlap instead of waiting
+        for each other's timeout: the first usable result wins and the rest
+        are cancelled, Replicate predictions included.
+        """
+        providers = self._available_providers()
         
-        # Try Replicate IBM Granite as backup
-        if self.replicate_api_token:
-            try:
-                logger.info("🟡 Attempting Replicate IBM Granite...")
-                result = await self._process_with_replicate(query, preferences)
-                if result:
-                    logger.info("✅ Replicate IBM Granite successful")
-                    return result
-            except Exception as e:
-                logger.warning(f"❌ Replicate failed: {e}")
+        if self.hedging:
+            result = await self._process_hedged(query, preferences, providers)
+        else:
+            result = await self._process_in_sequence(query, preferences, providers)
+        if result:
+            return result
         
-        # Try Hugging Face as fallback
-        if self.huggingface_api_token:
+        # Final fallback to mock data
+        logger.info("🔴 All AI providers failed, using mock data")
+        return self._generate_mock_itinerary(query, preferences)
+
+    def _available_providers(self) -> List[str]:
+        """Configured providers, in priority order"""
+        available = {
+            'ibm_watson': self.ai_provider == 'ibm_watson' and bool(self.ibm_watson_api_key),
+            'replicate': bool(self.replicate_api_token),
+            'huggingface': bool(self.huggingface_api_token)
+        }
+        return [provider for provider in self.provider_priority if available.get(provider)]
+
+    def _provider_call(self, provider: str):
+        return {
+            'ibm_watson': self._process_with_ibm_watson,
+            'replicate': self._process_with_replicate,
+            'huggingface': self._process_with_huggingface
+        }[provider]
+
+    async def _process_in_sequence(
+        self,
+        query: str,
+        preferences: Optional[Dict[str, Any]],
+        providers: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Try one provider after another until one answers"""
+        for provider in providers:
             try:
-                logger.info("🟢 Attempting Hugging Face...")
-                result = await self._process_with_huggingface(query, preferences)
+                logger.info(f"Attempting {provider}...")
+                result = await self._timed_call(provider, query, preferences)
                 if result:
-                    logger.info("✅ Hugging Face successful")
+                    logger.info(f"✅ {provider} successful")
                     return result
             except Exception as e:
-                logger.warning(f"❌ Hugging Face failed: {e}")
-        
-        # Final fallback to mock data
-        logger.info("🔴 All AI providers failed, using mock data")
-        return self._generate_mock_itinerary(query, preferences)
+                logger.warning(f"❌ {provider} failed: {e}")
+        return None
+
+    async def _process_hedged(
+        self,
+        query: str,
+        preferences: Optional[Dict[str, Any]],
+        providers: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Start the first provider, and the next one whenever every running
+        call has outlived its hedge delay or failed. Returns the first
+        parsed JSON result (or, failing that, the first unparsed one) within
+        the deadline; calls still running are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        waiting = list(providers)
+        running: Dict[asyncio.Task, str] = {}
+        unparsed = None
+        next_start = loop.time()
+
+        try:
+            while waiting or running:
+                now = loop.time()
+                if now >= deadline:
+                    logger.warning(f"AI providers missed the {self.deadline}s deadline")
+                    break
+                if waiting and now >= next_start:
+                    provider = waiting.pop(0)
+                    logger.info(f"Attempting {provider}...")
+                    task = asyncio.create_task(self._timed_call(provider, query, preferences))
+                    running[task] = provider
+                    next_start = now + self._hedge_delay(provider)
+                    continue
+
+                timeout = deadline - now
+                if waiting:
+                    timeout = min(timeout, next_start - now)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    provider = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"❌ {provider} failed: {e}")
+                        result = None
+                    if result and 'raw_response' not in result:
+                        logger.info(f"✅ {provider} successful")
+                        return result
+                    unparsed = unparsed or result
+                    # Nothing usable from this one: start the next provider now
+                    next_start = loop.time()
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        return unparsed
+
+    async def _timed_call(
+        self,
+        provider: str,
+        query: str,
+        preferences: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Call a provider through its circuit breaker (raising CircuitOpenError
+        instantly while it is unhealthy), recording how long successful
+        calls take
+        """
+        started = asyncio.get_running_loop().time()
+        result = await get_circuit_breaker(provider).call(
+            self._provider_call(provider), query, preferences, succeeded=bool
+        )
+        if result:
+            latencies = self._latencies.setdefault(provider, deque(maxlen=LATENCY_WINDOW))
+            latencies.append(asyncio.get_running_loop().time() - started)
+        return result
+
+    def _hedge_delay(self, provider: str) -> float:
+        """How long to wait on a provider before starting the next one"""
+        if provider in self.hedge_delays:
+            return self.hedge_delays[provider]
+        latencies = self._latencies.get(provider)
+        if not latencies or len(latencies) < MIN_LATENCY_SAMPLES:
+            return self.hedge_delay
+        return max(MIN_HEDGE_DELAY, float(np.percentile(latencies, 95)))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Shared keep-alive session for every provider"""
+        if self._session is None or self._session.closed:
+            settings = get_settings()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.ai_http_max_connections,
+                    keepalive_timeout=settings.ai_http_keepalive_expiry
+                )
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the shared session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def _process_with_ibm_watson(self, query: str, preferences: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """Process with IBM Watson Orchestrate"""
@@ -106,19 +268,18 @@ class MultiAIService:
             }
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.ibm_watson_url}/v1/text/generation",
-                headers=headers,
-                json=payload,
-                timeout=30
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return self._parse_ai_response(data.get('results', [{}])[0].get('generated_text', ''), 'ibm_watson')
-                else:
-                    logger.error(f"IBM Watson error: {response.status}")
-                    return None
+        async with self._get_session().post(
+            f"{self.ibm_watson_url}/v1/text/generation",
+            headers=headers,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                return self._parse_ai_response(data.get('results', [{}])[0].get('generated_text', ''), 'ibm_watson')
+            else:
+                logger.error(f"IBM Watson error: {response.status}")
+                return None
 
     async def _process_with_replicate(self, query: str, preferences: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """Process with Replicate IBM Granite model"""
@@ -140,42 +301,131 @@ class MultiAIService:
                 "max_tokens": 1000,
                 "temperature": 0.7,
                 "top_p": 0.9
-            }
+            },
+            "stream": True
         }
         
-        async with aiohttp.ClientSession() as session:
-            # Start prediction
-            async with session.post(
-                f"https://api.replicate.com/v1/models/{self.replicate_model}/predictions",
-                headers=headers,
-                json=payload,
-                timeout=30
+        # Prefer: wait holds the request open until the prediction finishes
+        # (up to replicate_wait seconds), which covers most predictions
+        async with self._get_session().post(
+            f"{self.replicate_api_url}/v1/models/{self.replicate_model}/predictions",
+            headers={**headers, 'Prefer': f'wait={self.replicate_wait}'},
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=self.replicate_wait + 10)
+        ) as response:
+            if response.status not in (200, 201):
+                logger.error(f"Replicate error: {response.status}")
+                return None
+            prediction = await response.json()
+        
+        output = await self._replicate_output(prediction, headers)
+        if output is None:
+            return None
+        return self._parse_ai_response(output, 'replicate_granite')
+
+    async def _replicate_output(self, prediction: Dict[str, Any], headers: Dict[str, str]) -> Optional[str]:
+        """Output of a prediction: returned already, streamed, or polled for"""
+        if prediction.get('status') in REPLICATE_TERMINAL_STATUSES:
+            return self._replicate_result(prediction)
+        
+        urls = prediction.get('urls') or {}
+        try:
+            if urls.get('stream'):
+                try:
+                    return await self._stream_replicate(urls['stream'], headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Replicate stream failed, polling instead: {e}")
+            
+            return await self._poll_replicate(prediction, headers)
+        except asyncio.CancelledError:
+            # Lost a hedge (or the caller went away): stop paying for the prediction
+            await self._cancel_replicate(prediction, headers)
+            raise
+
+    async def _cancel_replicate(self, prediction: Dict[str, Any], headers: Dict[str, str]):
+        """Cancel a prediction nobody is waiting for any more"""
+        urls = prediction.get('urls') or {}
+        cancel_url = urls.get('cancel') or f"{self.replicate_api_url}/v1/predictions/{prediction['id']}/cancel"
+        try:
+            async with self._get_session().post(
+                cancel_url,
+                headers={'Authorization': headers['Authorization']},
+                timeout=aiohttp.ClientTimeout(total=REPLICATE_CANCEL_TIMEOUT)
             ) as response:
-                if response.status == 201:
-                    prediction = await response.json()
-                    prediction_id = prediction['id']
-                    
-                    # Poll for completion
-                    for _ in range(30):  # Max 30 attempts (30 seconds)
-                        await asyncio.sleep(1)
-                        async with session.get(
-                            f"https://api.replicate.com/v1/predictions/{prediction_id}",
-                            headers=headers
-                        ) as poll_response:
-                            if poll_response.status == 200:
-                                result = await poll_response.json()
-                                if result['status'] == 'succeeded':
-                                    output = ''.join(result['output']) if isinstance(result['output'], list) else result['output']
-                                    return self._parse_ai_response(output, 'replicate_granite')
-                                elif result['status'] == 'failed':
-                                    logger.error(f"Replicate prediction failed: {result.get('error')}")
-                                    return None
-                    
-                    logger.error("Replicate prediction timeout")
-                    return None
-                else:
-                    logger.error(f"Replicate error: {response.status}")
-                    return None
+                if response.status != 200:
+                    logger.warning(f"Replicate cancel error: {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Error cancelling Replicate prediction: {e}")
+
+    def _replicate_result(self, prediction: Dict[str, Any]) -> Optional[str]:
+        if prediction['status'] == 'succeeded':
+            output = prediction.get('output')
+            return ''.join(output) if isinstance(output, list) else output
+        logger.error(f"Replicate prediction {prediction['status']}: {prediction.get('error')}")
+        return None
+
+    async def _stream_replicate(self, stream_url: str, headers: Dict[str, str]) -> Optional[str]:
+        """Collect a prediction's output from its server-sent event stream"""
+        chunks, event, data = [], None, []
+        async with self._get_session().get(
+            stream_url,
+            headers={'Authorization': headers['Authorization'], 'Accept': 'text/event-stream'},
+            timeout=aiohttp.ClientTimeout(total=self.replicate_timeout)
+        ) as response:
+            response.raise_for_status()
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data.append(line[len('data:'):].removeprefix(' '))
+                elif not line:
+                    # Blank line: end of one event
+                    if event == 'output':
+                        chunks.append('\n'.join(data))
+                    elif event == 'error':
+                        message = '\n'.join(data)
+                        logger.error(f"Replicate prediction failed: {message}")
+                        return None
+                    elif event == 'done':
+                        return ''.join(chunks)
+                    event, data = None, []
+        raise aiohttp.ClientPayloadError("Replicate stream ended before done event")
+
+    async def _poll_replicate(self, prediction: Dict[str, Any], headers: Dict[str, str]) -> Optional[str]:
+        """
+        Poll a prediction with jittered exponential backoff until it finishes,
+        cancelling it once replicate_timeout runs out
+        """
+        urls = prediction.get('urls') or {}
+        poll_url = urls.get('get') or f"{self.replicate_api_url}/v1/predictions/{prediction['id']}"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.replicate_timeout
+        delay = REPLICATE_POLL_INITIAL_DELAY
+        
+        while True:
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                # A hung poll must not outlive the deadline either
+                async with self._get_session().get(
+                    poll_url,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=remaining)
+                ) as poll_response:
+                    if poll_response.status == 200:
+                        result = await poll_response.json()
+                        if result['status'] in REPLICATE_TERMINAL_STATUSES:
+                            return self._replicate_result(result)
+            except asyncio.TimeoutError:
+                break
+            delay = min(delay * 2, REPLICATE_POLL_MAX_DELAY)
+        
+        logger.error("Replicate prediction timeout")
+        await self._cancel_replicate(prediction, headers)
+        return None
 
     async def _process_with_huggingface(self, query: str, preferences: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """Process with Hugging Face"""
@@ -200,22 +450,21 @@ class MultiAIService:
             }
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"https://api-inference.huggingface.co/models/{self.huggingface_model}",
-                headers=headers,
-                json=payload,
-                timeout=30
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if isinstance(data, list) and len(data) > 0:
-                        generated_text = data[0].get('generated_text', '')
-                        return self._parse_ai_response(generated_text, 'huggingface')
-                    return None
-                else:
-                    logger.error(f"Hugging Face error: {response.status}")
-                    return None
+        async with self._get_session().post(
+            f"https://api-inference.huggingface.co/models/{self.huggingface_model}",
+            headers=headers,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                if isinstance(data, list) and len(data) > 0:
+                    generated_text = data[0].get('generated_text', '')
+                    return self._parse_ai_response(generated_text, 'huggingface')
+                return None
+            else:
+                logger.error(f"Hugging Face error: {response.status}")
+                return None
 
     def _construct_travel_prompt(self, query: str, preferences: Dict[str, Any] = None) -> str:
         """Construct travel planning prompt"""
@@ -0,0 +1,81 @@
+"""
+Bounded thread pools for blocking AI provider SDK calls.
+
+The Watsonx and Replicate SDKs are synchronous; calling them inside a
+coroutine stalls every request on the worker for the whole generation.
+Each provider gets its own small thread pool instead, so slow generations
+queue behind each other rather than behind the event loop, and one provider
+cannot starve another. Time spent waiting for a free thread is recorded
+to show when a pool is undersized.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderExecutor:
+    """Thread pool for one provider's blocking calls, with queue wait metrics"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"ai-{name}")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the pool and await its result"""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def call():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        def unqueue_if_cancelled(future):
+            # Cancelled (caller gone, or pool shut down) before a thread picked it up
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        future = self._pool.submit(call)
+        future.add_done_callback(unqueue_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy and queue wait times (seconds)"""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+                "queue_wait_avg": round(self._wait_total / started, 4) if started else 0.0,
+                "queue_wait_max": round(self._wait_max, 4)
+            }
+
+    def shutdown(self):
+        """Stop accepting calls; running calls finish in the background"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
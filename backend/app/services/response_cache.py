@@ -0,0 +1,131 @@
+"""
+Exact-match cache for AI provider responses.
+
+Many requests send the provider a prompt it has already answered (the same
+trip query, the same budget estimate). Responses are cached under a hash of
+(provider, model, generation parameters, normalized prompt) in two tiers:
+an in-process LRU with per-entry expiry, answering in microseconds, and
+optionally Redis, shared by every worker. Only successful provider
+responses are stored, never fallbacks.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ai:response:"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case and whitespace insensitive form of a prompt"""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+def cache_key(provider: str, model: Optional[str], params: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps([provider, model, params, normalize_prompt(prompt)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-process LRU with TTLs, backed by an optional shared Redis tier"""
+
+    def __init__(self, max_entries: int = 1024, redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("Redis library not installed, AI response cache is in-process only")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+
+    async def get(self, key: str, purpose: str = "default") -> Optional[str]:
+        """Cached response for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._count(purpose, "memory_hits")
+                    return value
+                del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(KEY_PREFIX + key)
+                if value is not None:
+                    ttl = await self._redis.ttl(KEY_PREFIX + key)
+                    self._store(key, value, ttl if ttl > 0 else 60)
+                    with self._lock:
+                        self._count(purpose, "redis_hits")
+                    return value
+            except Exception as e:
+                logger.error(f"Error reading AI response cache from Redis: {str(e)}")
+
+        with self._lock:
+            self._count(purpose, "misses")
+        return None
+
+    async def set(self, key: str, value: str, ttl: int):
+        """Cache a response for ttl seconds"""
+        if ttl <= 0:
+            return
+        self._store(key, value, ttl)
+        if self._redis is not None:
+            try:
+                await self._redis.set(KEY_PREFIX + key, value, ex=ttl)
+            except Exception as e:
+                logger.error(f"Error writing AI response cache to Redis: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count plus hits and misses per purpose"""
+        with self._lock:
+            purposes = {purpose: dict(counts) for purpose, counts in self._stats.items()}
+            entries = len(self._entries)
+        for counts in purposes.values():
+            hits = counts.get("memory_hits", 0) + counts.get("redis_hits", 0)
+            total = hits + counts.get("misses", 0)
+            counts["hit_rate"] = round(hits / total, 3) if total else 0.0
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "shared": self._redis is not None,
+            "purposes": purposes
+        }
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _store(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, purpose: str, counter: str):
+        counts = self._stats.setdefault(purpose, {"memory_hits": 0, "redis_hits": 0, "misses": 0})
+        counts[counter] += 1
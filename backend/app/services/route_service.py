@@ -0,0 +1,171 @@
+"""
+Route Service for ordering destinations into an efficient travel route
+"""
+
+import logging
+import math
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.schemas import DestinationSchema, TransportationType
+from app.services.ai_service import AIService, get_ai_service
+from app.services.destination_service import DestinationService
+from app.services.distance_matrix import DistanceMatrix, get_distance_matrix, suggest_transportation
+from app.services.route_solver import route_cost, solve_route
+
+logger = logging.getLogger(__name__)
+
+# 2-opt/Or-opt routes are typically within a few percent of optimal
+HEURISTIC_OPTIMIZATION_SCORE = 0.95
+ALTERNATIVE_MODES = [TransportationType.MOTORCYCLE, TransportationType.BUS]
+
+
+class RouteService:
+    """
+    Service for route optimization over stored destinations.
+
+    Routes are computed locally from the distance matrix; the AI model is
+    only asked (optionally) to annotate the finished route.
+    """
+
+    def __init__(self, db: AsyncSession = None, ai_service: AIService = None):
+        self.destination_service = DestinationService(db=db)
+        self.ai_service = ai_service
+
+    async def optimize_route(
+        self,
+        destinations: List[str],
+        start_location: str,
+        preferences: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Order destinations (given by name) for the shortest trip from the
+        start location.
+
+        Preferences: "transportation" fixes the mode for every leg (chosen
+        per leg by distance otherwise), "return_to_start" plans a round
+        trip and "annotate" adds AI-written travel notes.
+        """
+        try:
+            preferences = preferences or {}
+            mode = self._preferred_mode(preferences)
+
+            start = await self._resolve(start_location)
+            stops, unresolved = [], []
+            for name in destinations:
+                match = await self._resolve(name)
+                if match is None:
+                    unresolved.append(name)
+                else:
+                    stops.append((name, match))
+
+            nodes = ([(start_location, start)] if start else []) + stops
+            matrix = get_distance_matrix(
+                (match.id, match.location.latitude, match.location.longitude) for _, match in nodes
+            )
+            positions = [matrix.index[match.id] for _, match in nodes]
+            cost = self._cost_matrix(matrix, mode)[np.ix_(positions, positions)]
+
+            closed = bool(start) and bool(preferences.get("return_to_start", False))
+            order, exact = solve_route(cost, start=0 if start else None, closed=closed)
+            if closed:
+                order = order + [0]
+
+            ordered = [nodes[i] for i in order]
+            route_details = [
+                self._leg(matrix, origin, destination, mode)
+                for origin, destination in zip(ordered, ordered[1:])
+            ]
+            baseline = route_cost(cost, list(range(len(nodes))) + ([0] if closed else []))
+            optimized = route_cost(cost, order)
+
+            result = {
+                "optimized_route": [nodes[i][0] for i in order if not (start and i == 0)] + unresolved,
+                "route_details": route_details,
+                "total_distance": round(sum(leg["distance_km"] for leg in route_details), 1),
+                "total_time": sum(leg["travel_time_minutes"] for leg in route_details),
+                "total_cost": sum(leg["cost_estimate"] for leg in route_details),
+                "optimization_score": 1.0 if exact else HEURISTIC_OPTIMIZATION_SCORE,
+                "improvement": round(1 - optimized / baseline, 3) if baseline > 0 else 0.0,
+                "alternatives": self._alternatives(matrix, ordered, mode),
+                "unresolved_destinations": unresolved
+            }
+
+            if preferences.get("annotate") and route_details:
+                notes = await self._annotate(result)
+                if notes:
+                    result["notes"] = notes
+
+            return result
+
+        except Exception as e:
+            logger.error(f"Error optimizing route: {str(e)}")
+            raise
+
+    async def _resolve(self, name: str) -> Optional[DestinationSchema]:
+        """Best matching stored destination for a place name"""
+        if not name or not name.strip():
+            return None
+        for fuzzy in (False, True):
+            result = await self.destination_service.search_destinations(
+                query=name, page_size=1, fuzzy=fuzzy, include_total=False
+            )
+            if result.destinations:
+                return result.destinations[0]
+        return None
+
+    @staticmethod
+    def _preferred_mode(preferences: Dict[str, Any]) -> Optional[TransportationType]:
+        try:
+            return TransportationType(preferences["transportation"])
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _cost_matrix(matrix: DistanceMatrix, mode: Optional[TransportationType]) -> np.ndarray:
+        """Travel time for a fixed mode, straight-line distance when mixing modes"""
+        return matrix.duration_minutes(mode) if mode else matrix.distance_km
+
+    @staticmethod
+    def _leg(matrix: DistanceMatrix, origin, destination, mode: Optional[TransportationType]) -> Dict[str, Any]:
+        (origin_name, origin_match), (destination_name, destination_match) = origin, destination
+        leg = matrix.leg(origin_match.id, destination_match.id, mode)
+        return {
+            "from": origin_name,
+            "to": destination_name,
+            "distance_km": round(leg["distance_km"], 1),
+            "travel_time_minutes": math.ceil(leg["duration_minutes"]),
+            "transportation": leg["transportation"].value,
+            "cost_estimate": round(leg["cost"])
+        }
+
+    @staticmethod
+    def _alternatives(matrix: DistanceMatrix, ordered, mode: Optional[TransportationType]) -> List[str]:
+        """Same route with other ground transport, when every leg is drivable"""
+        legs = [(matrix.index[a.id], matrix.index[b.id]) for (_, a), (_, b) in zip(ordered, ordered[1:])]
+        if not legs or any(
+            suggest_transportation(matrix.distance_km[i, j]) == TransportationType.FLIGHT for i, j in legs
+        ):
+            return []
+
+        alternatives = []
+        for alternative in ALTERNATIVE_MODES:
+            if alternative == mode:
+                continue
+            minutes = sum(matrix.duration_minutes(alternative)[i, j] for i, j in legs)
+            cost = sum(matrix.cost(alternative)[i, j] for i, j in legs)
+            rupiah = f"{round(cost):,}".replace(",", ".")
+            alternatives.append(f"Dengan {alternative.value}: sekitar {math.ceil(minutes)} menit, Rp {rupiah}")
+        return alternatives
+
+    async def _annotate(self, route: Dict[str, Any]) -> Optional[str]:
+        """Travel notes for the computed route from the AI model, if one is available"""
+        try:
+            if self.ai_service is None:
+                self.ai_service = get_ai_service()
+            return await self.ai_service.annotate_route(route)
+        except Exception as e:
+            logger.error(f"Error annotating route: {str(e)}")
+            return None
@@ -0,0 +1,178 @@
+"""
+Route solver for visiting a set of destinations in the cheapest order.
+
+Works on a precomputed, symmetric cost matrix (distance or travel time).
+Small instances are solved exactly with Held-Karp dynamic programming;
+larger ones start from a nearest-neighbour route that is improved with
+2-opt (segment reversal) and Or-opt (moving runs of up to three stops)
+until no move helps. Routes may have a fixed start, may return to it, or
+leave the start to the solver.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Held-Karp is O(n^2 * 2^n): ~25ms at 10 stops, doubling per extra stop
+EXACT_MAX_STOPS = 10
+MAX_IMPROVEMENT_PASSES = 100
+OR_OPT_MAX_SEGMENT = 3
+
+
+def route_cost(cost: np.ndarray, order: Sequence[int], closed: bool = False) -> float:
+    """Total cost of visiting nodes in order, returning to the first if closed"""
+    if len(order) < 2:
+        return 0.0
+    total = float(sum(cost[a, b] for a, b in zip(order, order[1:])))
+    if closed:
+        total += float(cost[order[-1], order[0]])
+    return total
+
+
+def solve_route(
+    cost: np.ndarray,
+    start: Optional[int] = None,
+    closed: bool = False
+) -> Tuple[List[int], bool]:
+    """
+    Order all nodes of the cost matrix to minimize total cost.
+
+    With start=None the route may begin anywhere (and closed is ignored).
+    Returns the node order and whether it is provably optimal.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n = len(cost)
+    if n <= 2:
+        order = list(range(n))
+        if start is not None and n == 2 and start == 1:
+            order.reverse()
+        return order, True
+
+    if start is None:
+        # A free start is a fixed start at a dummy node that is free to leave
+        padded = np.zeros((n + 1, n + 1))
+        padded[:n, :n] = cost
+        order, exact = solve_route(padded, start=n, closed=False)
+        return order[1:], exact
+
+    if n - 1 <= EXACT_MAX_STOPS:
+        return _held_karp(cost, start, closed), True
+
+    order = _nearest_neighbour(cost, start)
+    order = _improve(cost, order, closed)
+    return order, False
+
+
+def _held_karp(cost: np.ndarray, start: int, closed: bool) -> List[int]:
+    """Exact dynamic program over (visited set, last stop)"""
+    stops = np.array([i for i in range(len(cost)) if i != start])
+    m = len(stops)
+    between = cost[np.ix_(stops, stops)]
+    size = 1 << m
+
+    # best[mask, k]: cheapest route from start through exactly `mask`, ending at stop k
+    best = np.full((size, m), np.inf)
+    parent = np.full((size, m), -1, dtype=np.int64)
+    best[1 << np.arange(m), np.arange(m)] = cost[start, stops]
+
+    bits = 1 << np.arange(m)
+    for mask in range(1, size):
+        remaining = np.flatnonzero((mask & bits) == 0)
+        if not len(remaining):
+            continue
+        # Extend every route ending at j in mask to every unvisited k
+        totals = best[mask][:, None] + between[:, remaining]
+        via = totals.argmin(axis=0)
+        candidate = totals[via, np.arange(len(remaining))]
+        next_masks = mask | bits[remaining]
+        better = candidate < best[next_masks, remaining]
+        best[next_masks[better], remaining[better]] = candidate[better]
+        parent[next_masks[better], remaining[better]] = via[better]
+
+    final = best[size - 1] + (cost[stops, start] if closed else 0)
+    last = int(final.argmin())
+
+    order, mask = [], size - 1
+    while last != -1:
+        order.append(int(stops[last]))
+        last, mask = int(parent[mask, last]), mask & ~(1 << last)
+    return [start] + order[::-1]
+
+
+def _nearest_neighbour(cost: np.ndarray, start: int) -> List[int]:
+    """Greedy route that always moves to the closest unvisited node"""
+    visited = np.zeros(len(cost), dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(len(cost) - 1):
+        distances = np.where(visited, np.inf, cost[order[-1]])
+        nearest = int(distances.argmin())
+        order.append(nearest)
+        visited[nearest] = True
+    return order
+
+
+def _improve(cost: np.ndarray, order: List[int], closed: bool) -> List[int]:
+    """Apply 2-opt and Or-opt moves until neither improves the route"""
+    for _ in range(MAX_IMPROVEMENT_PASSES):
+        improved = _two_opt(cost, order, closed)
+        improved = _or_opt(cost, order, closed) or improved
+        if not improved:
+            break
+    return order
+
+
+def _link(cost: np.ndarray, a: int, b: Optional[int]) -> float:
+    """Cost of travelling a -> b, where b=None is the free end of an open route"""
+    return 0.0 if b is None else float(cost[a, b])
+
+
+def _two_opt(cost: np.ndarray, order: List[int], closed: bool) -> bool:
+    """Reverse order[i..j] wherever that shortens the route (in place)"""
+    n = len(order)
+    tail = order[0] if closed else None  # what follows the last stop
+    improved = False
+    for i in range(1, n - 1):
+        for j in range(i + 1, n):
+            after_j = order[j + 1] if j + 1 < n else tail
+            before = float(cost[order[i - 1], order[i]]) + _link(cost, order[j], after_j)
+            after = float(cost[order[i - 1], order[j]]) + _link(cost, order[i], after_j)
+            if after < before - 1e-9:
+                order[i:j + 1] = order[i:j + 1][::-1]
+                improved = True
+    return improved
+
+
+def _or_opt(cost: np.ndarray, order: List[int], closed: bool) -> bool:
+    """Move runs of up to OR_OPT_MAX_SEGMENT stops to a cheaper position (in place)"""
+    tail = order[0] if closed else None
+    improved = False
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = 1
+        while i + length <= len(order):
+            segment = order[i:i + length]
+            previous = order[i - 1]
+            following = order[i + length] if i + length < len(order) else tail
+            removal_gain = (
+                float(cost[previous, segment[0]])
+                + _link(cost, segment[-1], following)
+                - _link(cost, previous, following)
+            )
+
+            rest = order[:i] + order[i + length:]
+            best_delta, best_position = 0.0, None
+            for position in range(1, len(rest) + 1):
+                if position == i:
+                    continue  # where it came from
+                u = rest[position - 1]
+                v = rest[position] if position < len(rest) else tail
+                insertion = float(cost[u, segment[0]]) + _link(cost, segment[-1], v) - _link(cost, u, v)
+                if insertion - removal_gain < best_delta - 1e-9:
+                    best_delta, best_position = insertion - removal_gain, position
+
+            if best_position is not None:
+                order[:] = rest[:best_position] + segment + rest[best_position:]
+                improved = True
+            else:
+                i += 1
+    return improved
@@ -0,0 +1,147 @@
+"""
+Embedding-similarity cache for paraphrased AI requests.
+
+Travel queries repeat with different wording ("liburan 3 hari ke Bali sama
+keluarga", "trip keluarga 3 hari Bali") and miss the exact response cache.
+Here each answered query is stored with its sentence embedding; a new
+query reuses the answer of the most similar stored query when their cosine
+similarity reaches the threshold. Embeddings are L2-normalized rows of one
+NumPy matrix, so a lookup is a single matrix-vector product.
+
+Entries are partitioned by a scope string: only queries with the same
+scope (e.g. the same numbers, the same chat context) may share an answer,
+since embeddings barely distinguish "3 hari" from "5 hari".
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+
+def numbers_scope(text: str) -> str:
+    """Scope that keeps queries mentioning different numbers apart"""
+    return ",".join(sorted(re.findall(r"\d+(?:[.,]\d+)?", text)))
+
+
+def places_scope(text: str) -> str:
+    """Scope that keeps queries naming different places (capitalized words) apart"""
+    return ",".join(sorted({word.lower() for word in re.findall(r"\b[A-Z][\w-]*", text)}))
+
+
+def sentence_transformer_embedder(model_name: str) -> Optional[Embedder]:
+    """Embedding function backed by sentence-transformers, if installed"""
+    if SentenceTransformer is None:
+        logger.warning("sentence-transformers not installed, semantic AI cache disabled")
+        return None
+
+    model = None
+    lock = threading.Lock()
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        nonlocal model
+        with lock:
+            if model is None:
+                model = SentenceTransformer(model_name)
+        return model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+
+    return embed
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of answers by query embedding"""
+
+    def __init__(
+        self,
+        embed: Embedder,
+        threshold: float = 0.92,
+        max_entries: int = 2048,
+        ttl: float = 86400
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim)
+        self._created = np.empty(0, dtype=np.float64)
+        self._scopes = np.empty(0, dtype=np.int64)  # hash of each entry's scope
+        self._values: List[Any] = []
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    async def embed_text(self, text: str) -> np.ndarray:
+        """Normalized embedding of text (computed off the event loop)"""
+        vectors = await asyncio.to_thread(self.embed, [text])
+        vector = np.asarray(vectors, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray, scope: str) -> Optional[Any]:
+        """Answer of the most similar live entry in scope, if similar enough"""
+        with self._lock:
+            if self._size:
+                live = self._live_mask() & (self._scopes[:self._size] == hash(scope))
+                if live.any():
+                    similarity = np.where(live, self._vectors[:self._size] @ vector, -np.inf)
+                    best = int(similarity.argmax())
+                    if similarity[best] >= self.threshold:
+                        self._hits += 1
+                        return self._values[best]
+            self._misses += 1
+            return None
+
+    def store(self, vector: np.ndarray, scope: str, value: Any):
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._created = np.zeros(self.max_entries, dtype=np.float64)
+                self._scopes = np.zeros(self.max_entries, dtype=np.int64)
+                self._values, self._size = [None] * self.max_entries, 0
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Full: reuse the slot of an expired entry, else of the oldest one
+                slot = int(self._created.argmin())
+            self._vectors[slot] = vector
+            self._created[slot] = time.monotonic()
+            self._scopes[slot] = hash(scope)
+            self._values[slot] = value
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._size = 0
+            self._values = []
+            self._hits = self._misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": int(self._live_mask().sum()) if self._size else 0,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 3) if total else 0.0
+            }
+
+    def _live_mask(self) -> np.ndarray:
+        return self._created[:self._size] > time.monotonic() - self.ttl
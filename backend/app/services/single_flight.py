@@ -0,0 +1,46 @@
+"""
+Request coalescing for concurrent identical calls.
+
+When many identical requests arrive before the first one is answered (and
+cached), they would each call the provider. SingleFlight runs one call per
+key; callers arriving while it is in flight await the same result, or the
+same exception. The call runs as its own task, so a caller that goes away
+(e.g. a disconnected client) cancels only its own wait, never the call the
+others are waiting for.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """At most one in-flight call per key, shared by every concurrent caller"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.calls = 0  # calls actually started
+        self.shared = 0  # callers that joined a call already in flight
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Await func() for key, joining an identical call if one is running"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the outcome as seen even if every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,157 @@
+"""
+In-process trigram index for typo-tolerant destination lookup.
+
+Used when the database has no pg_trgm support (SQLite in tests and local
+development). Similarity follows pg_trgm's word_similarity: the Jaccard
+similarity between the query's trigrams and the best matching contiguous
+extent of the target's trigrams, so "yogyakrta" still finds "Yogyakarta"
+and "kuta" finds "Pantai Kuta".
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Iterable, Optional, Tuple
+
+from app.services.destination_events import DestinationChanges, on_destination_changes
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ("name", "city", "province")
+
+
+def word_trigrams(text: str) -> List[str]:
+    """Ordered trigrams of every word, padded like pg_trgm"""
+    grams = []
+    for word in re.findall(r"\w+", (text or "").lower()):
+        padded = f"  {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def word_similarity(query: str, target: str) -> float:
+    """Greatest similarity between the query and any extent of the target"""
+    query_grams = set(word_trigrams(query))
+    target_grams = word_trigrams(target)
+    if not query_grams or not target_grams:
+        return 0.0
+
+    best = 0.0
+    for start in range(len(target_grams)):
+        if target_grams[start] not in query_grams:
+            continue  # an extent starting on a non-shared trigram is never better
+        extent = set()
+        for end in range(start, len(target_grams)):
+            extent.add(target_grams[end])
+            shared = len(query_grams & extent)
+            score = shared / (len(query_grams) + len(extent) - shared)
+            if score > best:
+                best = score
+    return best
+
+
+class TrigramIndex:
+    """Inverted trigram index over destination name/city/province"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents: Dict[str, Dict[str, str]] = {}
+        self._postings: Dict[str, Dict[str, set]] = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        self.ready = False
+        self.built_at = 0.0
+
+    def build(self, rows: Iterable[Tuple[str, str, str, str]]):
+        """Replace the index contents with (id, name, city, province) rows"""
+        with self._lock:
+            self._documents.clear()
+            for postings in self._postings.values():
+                postings.clear()
+            for destination_id, name, city, province in rows:
+                self._add(str(destination_id), {"name": name, "city": city, "province": province})
+            self.ready = True
+            self.built_at = time.monotonic()
+        logger.info(f"Trigram index built with {len(self._documents)} destinations")
+
+    def add(self, destination_id: str, name: str, city: str, province: str):
+        """Insert or replace a single destination"""
+        with self._lock:
+            self._remove(str(destination_id))
+            self._add(str(destination_id), {"name": name, "city": city, "province": province})
+
+    def remove(self, destination_id: str):
+        with self._lock:
+            self._remove(str(destination_id))
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        self.ready = False
+
+    def is_stale(self, max_age: float) -> bool:
+        """Whether the index needs a (re)build: never built, or built over max_age seconds ago"""
+        return not self.ready or time.monotonic() - self.built_at > max_age
+
+    def search(
+        self,
+        query: str,
+        fields: Iterable[str] = INDEXED_FIELDS,
+        threshold: float = 0.3
+    ) -> Dict[str, float]:
+        """
+        Get {destination_id: score} for destinations whose best field
+        similarity reaches the threshold
+        """
+        query_grams = set(word_trigrams(query))
+        if not query_grams:
+            return {}
+
+        # Shared-trigram counts bound the similarity from above, so only
+        # candidates that could reach the threshold get scored exactly
+        min_shared = max(1, int(threshold * len(query_grams)))
+        with self._lock:
+            results: Dict[str, float] = {}
+            for field in fields:
+                postings = self._postings[field]
+                shared = Counter()
+                for gram in query_grams:
+                    shared.update(postings.get(gram, ()))
+                for destination_id, count in shared.items():
+                    if count < min_shared:
+                        continue
+                    score = word_similarity(query, self._documents[destination_id][field])
+                    if score >= threshold and score > results.get(destination_id, 0.0):
+                        results[destination_id] = score
+        return results
+
+    def _add(self, destination_id: str, document: Dict[str, Optional[str]]):
+        self._documents[destination_id] = {field: document.get(field) or "" for field in INDEXED_FIELDS}
+        for field in INDEXED_FIELDS:
+            for gram in set(word_trigrams(document.get(field))):
+                self._postings[field][gram].add(destination_id)
+
+    def _remove(self, destination_id: str):
+        document = self._documents.pop(destination_id, None)
+        if not document:
+            return
+        for field in INDEXED_FIELDS:
+            for gram in set(word_trigrams(document[field])):
+                ids = self._postings[field].get(gram)
+                if ids:
+                    ids.discard(destination_id)
+
+
+# Process-wide index, kept current by destination changes committed in this
+# process and rebuilt once stale to pick up changes made by other workers
+destination_trigram_index = TrigramIndex()
+
+
+@on_destination_changes
+def _apply_destination_changes(changes: DestinationChanges):
+    if not destination_trigram_index.ready:
+        return
+    for destination_id, fields in changes.items():
+        if fields is None:
+            destination_trigram_index.remove(destination_id)
+        else:
+            destination_trigram_index.add(destination_id, fields["name"], fields["city"], fields["province"])
@@ -0,0 +1,122 @@
+"""
+Geospatial helpers: great-circle distance, bounding boxes and geohash cells
+"""
+
+import math
+from typing import List, Set, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5m cells, stored on every destination
+
+# (min_lat, max_lat, min_lon, max_lon)
+BoundingBox = Tuple[float, float, float, float]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_radians(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Vectorized great-circle distance in kilometers for coordinates in
+    radians; arguments broadcast like any NumPy expression
+    """
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> BoundingBox:
+    """
+    Smallest lat/lon box containing every point within radius_km.
+
+    The longitude span widens with latitude; near the poles (or for huge
+    radii) it covers every longitude. Boxes are clamped at the antimeridian
+    rather than wrapped, which never matters for Indonesian coordinates.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(-90.0, latitude - lat_delta)
+    max_lat = min(90.0, latitude + lat_delta)
+
+    # Widest point of the circle is at the latitude closest to the pole
+    widest_lat = math.radians(max(abs(min_lat), abs(max_lat)))
+    if widest_lat >= math.radians(89.9) or lat_delta >= 90:
+        return min_lat, max_lat, -180.0, 180.0
+
+    lon_delta = lat_delta / math.cos(widest_lat)
+    return min_lat, max_lat, max(-180.0, longitude - lon_delta), min(180.0, longitude + lon_delta)
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a point as a geohash string"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+
+    while len(chars) < precision:
+        rng, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a geohash cell in degrees"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_cells(box: BoundingBox, max_cells: int = 16) -> List[str]:
+    """
+    Geohash prefixes covering a bounding box.
+
+    Uses the finest precision that needs at most max_cells cells, so each
+    prefix becomes a tight range scan on the indexed geohash column.
+    """
+    min_lat, max_lat, min_lon, max_lon = box
+    best: Set[str] = {""}
+
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = geohash_cell_size(precision)
+        lat_start = math.floor((min_lat + 90) / height)
+        lat_end = math.floor(min(max_lat + 90, 180 - 1e-9) / height)
+        lon_start = math.floor((min_lon + 180) / width)
+        lon_end = math.floor(min(max_lon + 180, 360 - 1e-9) / width)
+        if (lat_end - lat_start + 1) * (lon_end - lon_start + 1) > max_cells:
+            break
+
+        best = {
+            geohash_encode(
+                (lat_index + 0.5) * height - 90,
+                (lon_index + 0.5) * width - 180,
+                precision
+            )
+            for lat_index in range(lat_start, lat_end + 1)
+            for lon_index in range(lon_start, lon_end + 1)
+        }
+
+    return sorted(best)
@@ -0,0 +1,58 @@
+"""
+Lightweight in-process metrics helpers
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class LatencyStats:
+    """Thread-safe latency recorder with a rolling window for percentiles"""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """Record a single duration in seconds"""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Get a percentile (0-100) in seconds over the rolling window"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def reset(self):
+        """Clear all recorded samples"""
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get summary in milliseconds"""
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        p99 = self.percentile(99)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+            "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+            "max_ms": round(self.max * 1000, 3)
+        }
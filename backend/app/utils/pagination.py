@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+
+import base64
+import json
+from typing import Any, List, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import ColumnElement
+
+# (sort expression, descending)
+SortKey = Tuple[ColumnElement, bool]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of the last row into an opaque cursor"""
+    payload = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_length: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Malformed cursor: {str(e)}")
+
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise InvalidCursorError("Cursor does not match the requested ordering")
+    return values
+
+
+def keyset_condition(sort_keys: Sequence[SortKey], values: Sequence[Any]) -> ColumnElement:
+    """
+    Build the WHERE clause selecting rows strictly after the cursor row.
+
+    Expands the row comparison by hand so keys may mix ASC and DESC:
+    (k1 after v1) OR (k1 = v1 AND k2 after v2) OR ...
+    """
+    clauses = []
+    for i, (expression, descending) in enumerate(sort_keys):
+        equal_prefix = [sort_keys[j][0] == values[j] for j in range(i)]
+        after = expression < values[i] if descending else expression > values[i]
+        clauses.append(and_(*equal_prefix, after))
+    return or_(*clauses)
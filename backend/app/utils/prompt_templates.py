@@ -188,44 +188,27 @@ JSON Response:
 """
 
     @staticmethod
-    def route_optimizer(
-        destinations: List[str],
-        start_point: str,
-        preferences: Dict[str, Any]
-    ) -> str:
+    def route_annotator(route: Dict[str, Any]) -> str:
         """
-        Template for optimizing travel routes
+        Template for annotating a route computed by the route solver
         """
-        destinations_str = ", ".join(destinations)
+        legs_str = "\n".join(
+            f"- {leg['from']} -> {leg['to']}: {leg['distance_km']} km, "
+            f"{leg['travel_time_minutes']} menit dengan {leg['transportation']}"
+            for leg in route.get("route_details", [])
+        )
         
         return f"""
-Optimasi rute perjalanan untuk:
+Rute perjalanan berikut sudah dioptimasi (urutan dan jarak sudah final, jangan diubah):
 
-Titik Awal: {start_point}
-Destinasi: {destinations_str}
-Preferensi: {preferences}
+{legs_str}
 
-Berikan rute optimal dalam format JSON:
-{{
-  "optimized_route": ["string"],
-  "route_details": [
-    {{
-      "from": "string",
-      "to": "string",
-      "distance_km": 50,
-      "travel_time_minutes": 90,
-      "transportation": "string",
-      "cost_estimate": 100000
-    }}
-  ],
-  "total_distance": 200,
-  "total_time": 360,
-  "total_cost": 400000,
-  "optimization_score": 0.85,
-  "alternatives": ["string"]
-}}
+Total: {route.get('total_distance')} km, {route.get('total_time')} menit
 
-JSON Response:
+Berikan 2-3 catatan singkat untuk wisatawan (waktu terbaik berangkat, hal yang perlu disiapkan, tips lokal).
+Jawab dalam bahasa Indonesia, maksimal 80 kata.
+
+Catatan:
 """
 
     @staticmethod
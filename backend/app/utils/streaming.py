@@ -0,0 +1,27 @@
+"""
+Framing helpers for streamed API responses
+"""
+
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Keep browsers and reverse proxies from caching or buffering a stream
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+def ndjson_line(event: str, data: Any) -> str:
+    """One newline-delimited JSON frame: {"type": event, "data": payload}"""
+    return json.dumps({"type": event, "data": jsonable_encoder(data)}, ensure_ascii=False) + "\n"
@@ -2,10 +2,12 @@
 Jelajah Nusantara AI - Main FastAPI Application
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -14,15 +16,57 @@ load_dotenv()
 
 # Import settings
 from app.core.config import settings
+from app.core.database import get_async_session_factory, get_pool_status, upgrade_schema
+from app.services.ai_service import close_ai_service, get_ai_service
+from app.services.geo_index import destination_geo_index, refresh_destination_geo_index
+from app.services.itinerary_service import refresh_itinerary_templates
+from app.services.multi_ai_service import multi_ai_service
 # Import routers
 from app.api.routes import travel, ai, destinations
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Upgrade the database schema, build in-process indexes and shared
+    clients on startup; stop background jobs and close client connections
+    on shutdown
+    """
+    ai_service = get_ai_service()
+    background_tasks = []
+    if ai_service.provider == "ibm_watsonx":
+        background_tasks.append(asyncio.create_task(
+            ai_service.refresh_watsonx_token(settings.ibm_watsonx_token_refresh_interval)
+        ))
+    # Database jobs use the same (overridable) session factory as the routes
+    session_factory = app.dependency_overrides.get(get_async_session_factory, get_async_session_factory)()
+    if settings.background_jobs_enabled:
+        await upgrade_schema(session_factory)
+    if settings.background_jobs_enabled and settings.use_geo_index:
+        background_tasks.append(asyncio.create_task(
+            refresh_destination_geo_index(settings.geo_index_refresh_interval, session_factory)
+        ))
+    if settings.background_jobs_enabled and settings.itinerary_templates_enabled:
+        background_tasks.append(asyncio.create_task(
+            refresh_itinerary_templates(settings.itinerary_template_refresh_interval, session_factory)
+        ))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await close_ai_service()
+    await multi_ai_service.aclose()
+
+
 app = FastAPI(
     title="Jelajah Nusantara AI API",
     description="AI-powered travel planning platform for Indonesia",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware configuration
@@ -49,7 +93,15 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "service": "Jelajah Nusantara AI API"
+        "service": "Jelajah Nusantara AI API",
+        "database_pool": get_pool_status(),
+        "ai_executors": get_ai_service().executor_stats(),
+        "ai_response_cache": get_ai_service().cache_stats(),
+        "ai_first_token_time": get_ai_service().first_token_time.get_summary(),
+        "geo_index": {
+            "ready": destination_geo_index.ready,
+            "destinations": len(destination_geo_index)
+        }
     }
 
 # Include API routers
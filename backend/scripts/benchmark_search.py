@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark destination search under concurrent AI traffic.
+
+Compares the old path (blocking sync Session queries inside async handlers)
+with the AsyncSession path, reporting p50/p99 latency of search requests and
+of concurrently running AI calls. AI calls are simulated as network waits,
+so any latency above the simulated wait is time the event loop was blocked.
+Also reports nearby-destination lookup latency.
+"""
+
+import sys
+import os
+import asyncio
+import time
+import random
+import tempfile
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker, selectinload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.database import Base, get_async_database_url, is_sqlite_url
+from app.models.database_models import Destination
+from app.services.destination_service import DestinationService
+from app.utils.metrics import LatencyStats
+
+CITIES = ["Badung", "Gianyar", "Sleman", "Bantul", "Bandung", "Malang", "Samosir", "Labuan Bajo"]
+CATEGORIES = ["beach", "mountain", "cultural", "nature", "culinary"]
+
+
+def seed(database_url: str, count: int):
+    """Create a database with synthetic destinations"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        for i in range(count):
+            city = random.choice(CITIES)
+            db.add(Destination(
+                name=f"Destinasi {i} {city}",
+                description=f"Tempat wisata nomor {i} di {city}",
+                category=random.choice(CATEGORIES),
+                latitude=random.uniform(-10, 5),
+                longitude=random.uniform(95, 140),
+                city=city,
+                province="Indonesia",
+                rating=round(random.uniform(3, 5), 1),
+                price_range="moderate",
+                slug=f"destinasi-{i}"
+            ))
+        db.commit()
+    engine.dispose()
+
+
+def blocking_search(db, query: str, page_size: int):
+    """Old search path: sync Session queries executed on the event loop"""
+    db_query = db.query(Destination).filter(Destination.is_active == True).filter(or_(
+        Destination.name.ilike(f"%{query}%"),
+        Destination.description.ilike(f"%{query}%"),
+        Destination.city.ilike(f"%{query}%"),
+        Destination.province.ilike(f"%{query}%")
+    ))
+    db_query.count()
+    return db_query.options(
+        selectinload(Destination.tags), selectinload(Destination.facilities)
+    ).limit(page_size).all()
+
+
+async def simulated_ai_call(stats: LatencyStats, wait: float, submitted: float):
+    """Provider call that only waits on the network"""
+    await asyncio.sleep(wait)
+    stats.record(time.perf_counter() - submitted)
+
+
+async def run_before(database_url: str, requests: int, ai_wait: float):
+    connect_args = {"check_same_thread": False} if is_sqlite_url(database_url) else {}
+    engine = create_engine(database_url, connect_args=connect_args)
+    Session = sessionmaker(bind=engine)
+    search_stats, ai_stats = LatencyStats(), LatencyStats()
+
+    async def search(submitted: float):
+        with Session() as db:
+            blocking_search(db, random.choice(CITIES), 20)
+        search_stats.record(time.perf_counter() - submitted)
+
+    # All requests arrive together; latency is measured from arrival
+    submitted = time.perf_counter()
+    tasks = []
+    for _ in range(requests):
+        tasks.append(search(submitted))
+        tasks.append(simulated_ai_call(ai_stats, ai_wait, submitted))
+    await asyncio.gather(*tasks)
+    engine.dispose()
+    return search_stats, ai_stats
+
+
+async def run_after(database_url: str, requests: int, ai_wait: float):
+    engine = create_async_engine(
+        get_async_database_url(database_url),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=10
+    )
+    Session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    search_stats, ai_stats = LatencyStats(), LatencyStats()
+
+    async def search(submitted: float):
+        async with Session() as db:
+            await DestinationService(db=db).search_destinations(query=random.choice(CITIES))
+        search_stats.record(time.perf_counter() - submitted)
+
+    # All requests arrive together; latency is measured from arrival
+    submitted = time.perf_counter()
+    tasks = []
+    for _ in range(requests):
+        tasks.append(search(submitted))
+        tasks.append(simulated_ai_call(ai_stats, ai_wait, submitted))
+    await asyncio.gather(*tasks)
+    await engine.dispose()
+    return search_stats, ai_stats
+
+
+async def run_nearby(database_url: str, requests: int, radius_km: float):
+    """Sequential nearby lookups from random origins"""
+    engine = create_async_engine(get_async_database_url(database_url))
+    Session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    stats = LatencyStats()
+
+    async with Session() as db:
+        result = await db.execute(select(Destination.id).limit(requests))
+        service = DestinationService(db=db)
+        for destination_id in result.scalars().all():
+            started = time.perf_counter()
+            await service.get_nearby_destinations(str(destination_id), radius_km=radius_km)
+            stats.record(time.perf_counter() - started)
+
+    await engine.dispose()
+    return stats
+
+
+def report(label: str, search_stats: LatencyStats, ai_stats: LatencyStats):
+    search, ai = search_stats.get_summary(), ai_stats.get_summary()
+    print(f"{label:<8} search p50={search['p50_ms']:>9.1f}ms p99={search['p99_ms']:>9.1f}ms | "
+          f"ai p50={ai['p50_ms']:>9.1f}ms p99={ai['p99_ms']:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search latency benchmark")
+    parser.add_argument("--destinations", type=int, default=20000, help="Number of seeded destinations")
+    parser.add_argument("--requests", type=int, default=50, help="Concurrent search requests (and AI calls)")
+    parser.add_argument("--ai-wait", type=float, default=0.2, help="Simulated AI provider latency in seconds")
+    parser.add_argument("--radius", type=float, default=50, help="Nearby search radius in kilometers")
+    parser.add_argument("--database-url", default=None, help="Existing database to benchmark instead of a temp SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        database_url = f"sqlite:///{path}"
+        print(f"Seeding {args.destinations} destinations into {path}...")
+        seed(database_url, args.destinations)
+
+    report("before", *asyncio.run(run_before(database_url, args.requests, args.ai_wait)))
+    report("after", *asyncio.run(run_after(database_url, args.requests, args.ai_wait)))
+
+    nearby = asyncio.run(run_nearby(database_url, args.requests, args.radius)).get_summary()
+    print(f"nearby   p50={nearby['p50_ms']:>9.1f}ms p99={nearby['p99_ms']:>9.1f}ms")
@@ -2,14 +2,32 @@
 Pytest configuration and fixtures
 """
 
+import asyncio
+import os
+import sys
+import time
+import types
+import uuid
+
 import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, NullPool
+
+# The test app must not start jobs that reach the configured database
+os.environ.setdefault("BACKGROUND_JOBS_ENABLED", "false")
 
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_async_db, get_async_session_factory
 from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.circuit_breaker import reset_circuit_breakers
+from app.services.geo_index import destination_geo_index
+from app.services.trigram_index import destination_trigram_index
 from main import app
 
 # Test database URL (use in-memory SQLite for tests)
@@ -22,6 +40,19 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine on the same database; NullPool because every test (and every
+# TestClient request) runs on its own event loop
+async_engine = create_async_engine(
+    "sqlite+aiosqlite:///./test.db",
+    poolclass=NullPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
 def override_get_db():
     """Override database dependency for testing"""
@@ -32,6 +63,40 @@ def override_get_db():
         db.close()
 
 
+# Maximum number of SQL statements a single endpoint test may issue;
+# override per test with @pytest.mark.query_budget(n)
+DEFAULT_QUERY_BUDGET = 10
+
+
+class StatementCounter:
+    """Counts SQL statements executed against the test engines"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self):
+        self.statements.clear()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "query_budget(n): maximum SQL statements allowed in the test"
+    )
+
+
+async def override_get_async_db():
+    """Override async database dependency for testing"""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(scope="session")
 def test_db():
     """Create test database"""
@@ -54,15 +119,239 @@ def db_session(test_db):
     connection.close()
 
 
+@pytest_asyncio.fixture
+async def async_db_session(test_db):
+    """Create a fresh async database session for each test"""
+    # In-process indexes are rebuilt from this session's rows on first use
+    destination_geo_index.invalidate()
+    destination_trigram_index.invalidate()
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(bind=connection, autoflush=False, expire_on_commit=False)
+
+        yield session
+
+        await session.close()
+        await transaction.rollback()
+
+
+@pytest.fixture
+def query_counter(request):
+    """
+    Count SQL statements issued during a test and fail the test when it
+    exceeds its statement budget (catches N+1 query regressions)
+    """
+    counter = StatementCounter()
+    targets = [engine, async_engine.sync_engine]
+    for target in targets:
+        event.listen(target, "before_cursor_execute", counter)
+
+    yield counter
+
+    for target in targets:
+        event.remove(target, "before_cursor_execute", counter)
+
+    marker = request.node.get_closest_marker("query_budget")
+    budget = marker.args[0] if marker else DEFAULT_QUERY_BUDGET
+    if counter.count > budget:
+        pytest.fail(
+            f"Test issued {counter.count} SQL statements, budget is {budget}:\n"
+            + "\n".join(counter.statements)
+        )
+
+
 @pytest.fixture
-def client(db_session):
+def client(db_session, query_counter):
     """Create test client with database override"""
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_session_factory] = lambda: TestingAsyncSessionLocal
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
 
 
+class WatsonxStub:
+    """
+    Local stand-in for the ibm_watsonx_ai package that counts client
+    constructions (each one is an IAM token exchange in the real SDK),
+    model handle constructions and generation round trips
+    """
+
+    def __init__(self, response: str = '{"destination": "Bali", "duration": 3}'):
+        self.response = response
+        self.delay = 0.0  # seconds each generation blocks the calling thread
+        self.error: Exception = None  # raised by generations when set
+        self.clients = 0
+        self.models = 0
+        self.generations = []
+
+        stub = self
+
+        class Credentials:
+            def __init__(self, url=None, api_key=None):
+                self.url, self.api_key = url, api_key
+
+        class APIClient:
+            def __init__(self, credentials):
+                stub.clients += 1
+                self.credentials = credentials
+
+        class ModelInference:
+            def __init__(self, model_id, params=None, api_client=None, project_id=None):
+                stub.models += 1
+                self.model_id, self.params, self.api_client = model_id, params, api_client
+
+            def generate_text(self, prompt):
+                time.sleep(stub.delay)
+                stub.generations.append(prompt)
+                if stub.error is not None:
+                    raise stub.error
+                return stub.response
+
+            def generate_text_stream(self, prompt):
+                # Yields the response word by word, `delay` seconds apart
+                stub.generations.append(prompt)
+                for word in stub.response.split(" "):
+                    time.sleep(stub.delay)
+                    if stub.error is not None:
+                        raise stub.error
+                    yield word + " "
+
+        class GenTextParamsMetaNames:
+            DECODING_METHOD = "decoding_method"
+            MAX_NEW_TOKENS = "max_new_tokens"
+            MIN_NEW_TOKENS = "min_new_tokens"
+            TEMPERATURE = "temperature"
+            STOP_SEQUENCES = "stop_sequences"
+
+        self.package = types.ModuleType("ibm_watsonx_ai")
+        self.package.APIClient = APIClient
+        self.package.Credentials = Credentials
+        self.foundation_models = types.ModuleType("ibm_watsonx_ai.foundation_models")
+        self.foundation_models.ModelInference = ModelInference
+        self.metanames = types.ModuleType("ibm_watsonx_ai.metanames")
+        self.metanames.GenTextParamsMetaNames = GenTextParamsMetaNames
+
+
+class FakeReplicateServer:
+    """
+    Local Replicate HTTP API. Predictions finish `latency` seconds after
+    they are created; the server honours Prefer: wait when `honor_wait` and
+    offers an SSE output stream when `stream`, and answers polls after
+    `poll_delay` seconds. Records every request, when
+    each prediction's output became available, and which were cancelled.
+    """
+
+    def __init__(self, latency: float = 0.3, output=("{\"title\": ", "\"Bali 3 Hari\"}")):
+        self.latency = latency
+        self.output = list(output)
+        self.honor_wait = True
+        self.stream = False
+        self.poll_delay = 0.0
+        self.requests = []
+        self.predictions = {}
+        self.canceled = set()
+        self.url = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/v1/models/{owner}/{name}/predictions", self.create)
+        self.app.router.add_get("/v1/predictions/{id}", self.get)
+        self.app.router.add_post("/v1/predictions/{id}/cancel", self.cancel)
+        self.app.router.add_get("/v1/stream/{id}", self.events)
+
+    def body(self, prediction_id: str) -> dict:
+        done = time.monotonic() >= self.predictions[prediction_id]
+        if prediction_id in self.canceled:
+            status = "canceled"
+        else:
+            status = "succeeded" if done else "processing"
+        prediction = {
+            "id": prediction_id,
+            "status": status,
+            "output": self.output if done else None,
+            "urls": {"get": f"{self.url}/v1/predictions/{prediction_id}"}
+        }
+        if self.stream:
+            prediction["urls"]["stream"] = f"{self.url}/v1/stream/{prediction_id}"
+        return prediction
+
+    async def create(self, request):
+        self.requests.append(("POST", request.path))
+        prediction_id = uuid.uuid4().hex
+        self.predictions[prediction_id] = time.monotonic() + self.latency
+        prefer = request.headers.get("Prefer", "")
+        if self.honor_wait and prefer.startswith("wait"):
+            wait = float(prefer.partition("=")[2] or 60)
+            await asyncio.sleep(max(0.0, min(self.predictions[prediction_id] - time.monotonic(), wait)))
+        return web.json_response(self.body(prediction_id), status=201)
+
+    async def get(self, request):
+        self.requests.append(("GET", request.path))
+        await asyncio.sleep(self.poll_delay)
+        return web.json_response(self.body(request.match_info["id"]))
+
+    async def cancel(self, request):
+        self.requests.append(("POST", request.path))
+        self.canceled.add(request.match_info["id"])
+        return web.json_response(self.body(request.match_info["id"]))
+
+    async def events(self, request):
+        self.requests.append(("GET", request.path))
+        prediction_id = request.match_info["id"]
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(max(0.0, self.predictions[prediction_id] - time.monotonic()))
+        for chunk in self.output:
+            await response.write(f"event: output\ndata: {chunk}\n\n".encode())
+        await response.write(b"event: done\ndata: {}\n\n")
+        await response.write_eof()
+        return response
+
+
+@pytest_asyncio.fixture
+async def fake_replicate():
+    """Run FakeReplicateServer on a local port"""
+    fake = FakeReplicateServer()
+    server = TestServer(fake.app)
+    await server.start_server()
+    fake.url = str(server.make_url("")).rstrip("/")
+    yield fake
+    await server.close()
+
+
+@pytest.fixture(autouse=True)
+def circuit_breakers():
+    """Start every test with closed provider circuits"""
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
+
+
+@pytest.fixture
+def watsonx_stub(monkeypatch):
+    """Install WatsonxStub as the ibm_watsonx_ai package"""
+    stub = WatsonxStub()
+    monkeypatch.setitem(sys.modules, "ibm_watsonx_ai", stub.package)
+    monkeypatch.setitem(sys.modules, "ibm_watsonx_ai.foundation_models", stub.foundation_models)
+    monkeypatch.setitem(sys.modules, "ibm_watsonx_ai.metanames", stub.metanames)
+    return stub
+
+
+@pytest_asyncio.fixture
+async def watsonx_ai_service(watsonx_stub):
+    """AIService on the Watsonx stub, closed (executor threads included) after the test"""
+    ai_service = AIService(ai_config={
+        "provider": "ibm_watsonx",
+        "url": "https://watsonx.test",
+        "api_key": "key",
+        "project_id": "project",
+        "model": "granite-test"
+    })
+    yield ai_service
+    await ai_service.aclose()
+
+
 @pytest.fixture
 def sample_destination_data():
     """Sample destination data for testing"""
@@ -85,6 +374,45 @@ def sample_destination_data():
     }
 
 
+@pytest.fixture
+def stored_destinations(test_db, sample_destination_data):
+    """
+    Committed Bali destinations for API tests that plan itineraries (request
+    it before `client`, so seeding stays out of the query budget)
+    """
+    from sqlalchemy import delete
+    from app.models.database_models import Destination, ItineraryItem
+
+    places = {"Pantai Kuta": (-8.7184, 115.1686), "Pura Tanah Lot": (-8.6212, 115.0868)}
+
+    async def seed():
+        async with TestingAsyncSessionLocal() as db:
+            destinations = [
+                Destination(**{
+                    **sample_destination_data,
+                    "name": name,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "province": "Bali",
+                    "slug": name.lower().replace(" ", "-")
+                })
+                for name, (latitude, longitude) in places.items()
+            ]
+            db.add_all(destinations)
+            await db.commit()
+            return [destination.id for destination in destinations]
+
+    async def cleanup(ids):
+        async with TestingAsyncSessionLocal() as db:
+            await db.execute(delete(ItineraryItem).where(ItineraryItem.destination_id.in_(ids)))
+            await db.execute(delete(Destination).where(Destination.id.in_(ids)))
+            await db.commit()
+
+    ids = asyncio.run(seed())
+    yield list(places)
+    asyncio.run(cleanup(ids))
+
+
 @pytest.fixture
 def sample_travel_query():
     """Sample travel query for testing"""
@@ -36,7 +36,8 @@ class TestTravelAPI:
         response = client.post("/api/v1/travel/query", json=invalid_query)
         assert response.status_code == 422  # Validation error
     
-    def test_generate_itinerary(self, client: TestClient, sample_itinerary_request):
+    @pytest.mark.query_budget(40)
+    def test_generate_itinerary(self, stored_destinations, client: TestClient, sample_itinerary_request):
         """Test itinerary generation"""
         response = client.post("/api/v1/travel/generate-itinerary", json=sample_itinerary_request)
         assert response.status_code == 200
@@ -44,6 +45,76 @@ class TestTravelAPI:
         assert "itinerary" in data
         assert "ai_reasoning" in data
         assert "confidence_score" in data
+        assert client.delete(f"/api/v1/travel/itinerary/{data['itinerary']['id']}").status_code == 200
+    
+    def test_generate_itinerary_unknown_destination(self, client: TestClient, sample_itinerary_request):
+        """Test a trip to a place without stored destinations is reported, not made up"""
+        request = {**sample_itinerary_request, "destination": "Atlantis"}
+        response = client.post("/api/v1/travel/generate-itinerary", json=request)
+        assert response.status_code == 404
+        assert response.json()["detail"] == "No destinations found for Atlantis"
+    
+    @pytest.mark.query_budget(40)
+    def test_generate_itinerary_stream(self, stored_destinations, client: TestClient, sample_itinerary_request):
+        """Test itinerary generation streamed as newline-delimited JSON, and saved"""
+        import json
+        
+        response = client.post("/api/v1/travel/generate-itinerary/stream", json=sample_itinerary_request)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        
+        frames = [json.loads(line) for line in response.text.splitlines()]
+        assert [frame["type"] for frame in frames] == ["header", "day", "day", "day", "summary"]
+        assert frames[0]["data"]["total_duration"] == 3
+        assert frames[1]["data"]["day"] == 1
+        assert frames[-1]["data"]["total_cost"] == sum(frame["data"]["total_cost"] for frame in frames[1:-1])
+        
+        itinerary_id = frames[0]["data"]["id"]
+        stored = client.get(f"/api/v1/travel/itinerary/{itinerary_id}")
+        assert stored.status_code == 200
+        stored_days = stored.json()["data"]["days"]
+        assert [item["id"] for day in stored_days for item in day["items"]] == [
+            item["id"] for frame in frames[1:-1] for item in frame["data"]["items"]
+        ]
+        assert {item["destination"]["name"] for day in stored_days for item in day["items"]} <= set(stored_destinations)
+        assert any(day["items"] for day in stored_days)
+        assert client.delete(f"/api/v1/travel/itinerary/{itinerary_id}").status_code == 200
+    
+    def test_generate_itinerary_stream_unknown_destination(self, client: TestClient, sample_itinerary_request):
+        """Test a stream with nothing to plan sends only an error frame, never an unsaved itinerary id"""
+        import json
+        
+        response = client.post(
+            "/api/v1/travel/generate-itinerary/stream",
+            json={**sample_itinerary_request, "destination": "Atlantis"}
+        )
+        frames = [json.loads(line) for line in response.text.splitlines()]
+        assert [frame["type"] for frame in frames] == ["error"]
+        assert "No destinations found for Atlantis" in frames[0]["data"]["detail"]
+    
+    @pytest.mark.query_budget(40)
+    def test_generate_itinerary_stream_sse(self, stored_destinations, client: TestClient, sample_itinerary_request):
+        """Test itinerary generation streamed as Server-Sent Events"""
+        response = client.post(
+            "/api/v1/travel/generate-itinerary/stream",
+            json=sample_itinerary_request,
+            headers={"Accept": "text/event-stream"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+        assert events == ["event: header"] + ["event: day"] * 3 + ["event: summary"]
+    
+    def test_unknown_itinerary_not_found(self, client: TestClient):
+        """Test reading, updating or deleting a missing itinerary returns 404"""
+        missing = "/api/v1/travel/itinerary/00000000-0000-0000-0000-000000000000"
+        assert client.get(missing).status_code == 404
+        assert client.put(missing, json={"title": "Baru"}).status_code == 404
+        assert client.delete(missing).status_code == 404
+        assert client.get("/api/v1/travel/itinerary/bukan-id").status_code == 404
+        assert client.put(missing, json={"total_cost": 0}).status_code == 422
+        assert client.put(missing, json={"title": None}).status_code == 422
+        assert client.put(missing, json={"operations": [{"op": "swap", "item_id": "x"}]}).status_code == 422
     
     def test_generate_itinerary_invalid(self, client: TestClient):
         """Test itinerary generation with invalid data"""
@@ -84,6 +155,11 @@ class TestDestinationAPI:
         data = response.json()
         assert "destinations" in data
     
+    def test_search_destinations_invalid_cursor(self, client: TestClient):
+        """Test a malformed pagination cursor is rejected"""
+        response = client.get("/api/v1/destinations/search?cursor=not-a-cursor")
+        assert response.status_code == 400
+    
     def test_get_destination_categories(self, client: TestClient):
         """Test getting destination categories"""
         response = client.get("/api/v1/destinations/categories/list")
@@ -128,6 +204,21 @@ class TestAIAPI:
         assert "available" in status
         assert "capabilities" in status
     
+    def test_model_status_reports_circuit_breakers(self, client: TestClient):
+        """Test provider circuit states are exposed"""
+        from app.services.circuit_breaker import get_circuit_breaker
+        
+        breaker = get_circuit_breaker("replicate")
+        for _ in range(breaker.min_calls):
+            breaker.record_failure()
+        
+        response = client.get("/api/v1/ai/model-status")
+        assert response.status_code == 200
+        status = response.json()["data"]
+        assert status["circuit_state"] == "closed"
+        assert status["circuit_breakers"]["replicate"]["state"] == "open"
+        assert status["circuit_breakers"]["replicate"]["retry_in"] > 0
+    
     def test_chat_with_ai(self, client: TestClient):
         """Test AI chat functionality"""
         chat_data = {
@@ -140,6 +231,41 @@ class TestAIAPI:
         assert data["success"] is True
         assert "data" in data
         assert "response" in data["data"]
+    
+    def test_chat_stream(self, client: TestClient):
+        """Test streamed AI chat returns Server-Sent Events"""
+        import json
+        
+        chat_data = {"message": "Apa kuliner khas Bali?", "context": {}}
+        response = client.post("/api/v1/ai/chat/stream", json=chat_data)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+        assert events[0][0] == "token"
+        assert events[-1][0] == "done"
+        assert events[-1][1]["response"] == "".join(data["text"] for _, data in events[:-1])
+        
+        response = client.post("/api/v1/ai/chat/stream", json={"message": "", "context": {}})
+        assert response.status_code == 422
+
+    
+    def test_optimize_route(self, client: TestClient):
+        """Test route optimization keeps the response shape for unknown places"""
+        route_data = {"destinations": ["Tempat Tidak Dikenal"], "preferences": {}}
+        response = client.post(
+            "/api/v1/ai/optimize-route?start_location=Entah%20Dimana", json=route_data
+        )
+        assert response.status_code == 200
+        route = response.json()["data"]
+        assert route["optimized_route"] == ["Tempat Tidak Dikenal"]
+        assert route["route_details"] == []
+        assert route["unresolved_destinations"] == ["Tempat Tidak Dikenal"]
+        assert "total_distance" in route
+        assert "optimization_score" in route
 
 
 class TestErrorHandling:
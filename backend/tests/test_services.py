@@ -3,11 +3,12 @@ Service layer tests
 """
 
 import pytest
+import pytest_asyncio
 from unittest.mock import Mock, patch, AsyncMock
 from app.services.ai_service import AIService
 from app.services.destination_service import DestinationService
 from app.services.itinerary_service import ItineraryService
-from app.models.schemas import TravelerType, ActivityLevel
+from app.models.schemas import TravelerType, ActivityLevel, ItineraryUpdateRequest
 
 
 class TestAIService:
@@ -105,14 +106,826 @@ class TestAIService:
         response = await ai_service.chat("Berapa budget yang dibutuhkan?", {})
         assert "budget" in response.lower() or "biaya" in response.lower()
 
+    @pytest.mark.asyncio
+    async def test_shared_ai_service(self):
+        """Test one AIService is shared until closed"""
+        from app.services.ai_service import get_ai_service, close_ai_service
+        
+        shared = get_ai_service()
+        assert get_ai_service() is shared
+        
+        await close_ai_service()
+        assert get_ai_service() is not shared
+    
+    @pytest.mark.asyncio
+    async def test_provider_http_client_reused(self):
+        """Test provider calls reuse one pooled HTTP client"""
+        import httpx
+        
+        requests = []
+        
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=[{"generated_text": "ok"}])
+        
+        ai_service = AIService(ai_config={"provider": "huggingface", "model": "test-model", "api_key": "token"})
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ai_service._http_client = client
+        
+        assert await ai_service._call_huggingface("Halo") == "ok"
+        assert await ai_service._call_huggingface("Halo lagi") == "ok"
+        assert len(requests) == 2
+        assert requests[0].url.path == "/models/test-model"
+        assert ai_service._get_http_client() is client
+        
+        await ai_service.aclose()
+        assert client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_watsonx_model_reused(self, watsonx_stub, watsonx_ai_service):
+        """Test Watsonx calls reuse one authenticated model handle"""
+        assert watsonx_ai_service.provider == "ibm_watsonx"
+        
+        for query in ["Liburan ke Bali 3 hari", "Liburan ke Lombok 2 hari"]:
+            result = await watsonx_ai_service.parse_travel_query(query)
+            assert result.destination == "Bali"
+        
+        assert watsonx_stub.clients == 1
+        assert watsonx_stub.models == 1
+        assert len(watsonx_stub.generations) == 2
+    
+    @pytest.mark.asyncio
+    async def test_repeated_prompts_served_from_cache(self, watsonx_stub, watsonx_ai_service):
+        """Test identical requests reach the provider once"""
+        import time
+        
+        for _ in range(3):
+            result = await watsonx_ai_service.parse_travel_query("3 hari di Bali bersama keluarga")
+            assert result.destination == "Bali"
+        await watsonx_ai_service.estimate_budget("Bali", 3, 2)
+        await watsonx_ai_service.estimate_budget("Bali", 3, 2)
+        
+        assert len(watsonx_stub.generations) == 2
+        purposes = watsonx_ai_service.cache_stats()["purposes"]
+        assert purposes["parse_query"]["memory_hits"] == 2
+        assert purposes["parse_query"]["misses"] == 1
+        assert purposes["budget"]["memory_hits"] == 1
+        
+        prompt = watsonx_ai_service._create_parsing_prompt("3 hari di Bali bersama keluarga")
+        timings = []
+        for _ in range(20):
+            started = time.perf_counter()
+            await watsonx_ai_service._generate(prompt, "parse_query")
+            timings.append(time.perf_counter() - started)
+        assert min(timings) < 0.001
+        assert len(watsonx_stub.generations) == 2
+    
+    @pytest.mark.asyncio
+    async def test_paraphrased_queries_served_from_semantic_cache(self, watsonx_stub, watsonx_ai_service):
+        """Test paraphrased queries and chat messages reach the provider once"""
+        from app.services.semantic_cache import SemanticCache
+        
+        watsonx_ai_service._semantic_cache = SemanticCache(bag_of_words_embedder, threshold=0.6)
+        
+        first = await watsonx_ai_service.parse_travel_query("liburan 3 hari ke Bali sama keluarga")
+        second = await watsonx_ai_service.parse_travel_query("trip keluarga 3 hari Bali")
+        assert second == first
+        assert len(watsonx_stub.generations) == 1
+        
+        await watsonx_ai_service.parse_travel_query("trip keluarga 5 hari Bali")
+        assert len(watsonx_stub.generations) == 2
+        
+        await watsonx_ai_service.chat("apa kuliner khas di Bali", {})
+        await watsonx_ai_service.chat("kuliner khas Bali apa saja", {})
+        await watsonx_ai_service.chat("kuliner khas Bali apa saja", {"destination": "Bali"})
+        assert len(watsonx_stub.generations) == 4
+        assert watsonx_ai_service.cache_stats()["semantic"]["hits"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_semantic_cache_keeps_places_apart(self, watsonx_stub, watsonx_ai_service):
+        """Test similar queries about places outside the known list are not served each other's answer"""
+        from app.services.semantic_cache import SemanticCache
+        
+        watsonx_ai_service._semantic_cache = SemanticCache(bag_of_words_embedder, threshold=0.6)
+        
+        await watsonx_ai_service.parse_travel_query("liburan 3 hari ke Malang sama keluarga")
+        await watsonx_ai_service.parse_travel_query("liburan 3 hari ke Medan sama keluarga")
+        assert len(watsonx_stub.generations) == 2
+        
+        # No place to tell the trips apart: never answered semantically
+        await watsonx_ai_service.parse_travel_query("liburan 3 hari ke pantai sama keluarga")
+        await watsonx_ai_service.parse_travel_query("liburan 3 hari ke gunung sama keluarga")
+        assert len(watsonx_stub.generations) == 4
+        assert watsonx_ai_service.cache_stats()["semantic"]["hits"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_queries_coalesced(self, watsonx_stub, watsonx_ai_service):
+        """Test a burst of identical uncached queries makes one provider call"""
+        import asyncio
+        
+        watsonx_stub.delay = 0.05
+        watsonx_ai_service._response_cache = None  # nothing cached, only coalescing helps
+        
+        results = await asyncio.gather(*[
+            watsonx_ai_service.parse_travel_query("3 hari di Bali bersama keluarga") for _ in range(20)
+        ])
+        
+        assert all(result.destination == "Bali" for result in results)
+        assert len(watsonx_stub.generations) == 1
+        assert watsonx_ai_service.cache_stats()["coalesced_calls"] == 19
+    
+    @pytest.mark.asyncio
+    async def test_failing_provider_short_circuits_to_fallback(self, watsonx_stub, watsonx_ai_service):
+        """Test an open circuit skips the provider and uses the local parser"""
+        from app.core.config import get_settings
+        from app.services.circuit_breaker import get_circuit_breaker
+        
+        watsonx_stub.error = RuntimeError("provider down")
+        
+        min_calls = get_settings().ai_breaker_min_calls
+        for day in range(min_calls + 3):
+            result = await watsonx_ai_service.parse_travel_query(f"Liburan {day + 1} hari ke Bali")
+            assert result.duration == day + 1  # fallback parser
+        
+        assert len(watsonx_stub.generations) == min_calls
+        assert get_circuit_breaker("ibm_watsonx").state == "open"
+
+    @pytest.mark.asyncio
+    async def test_missing_watsonx_library_not_cached(self, watsonx_stub, watsonx_ai_service):
+        """Test a missing Watsonx SDK fails the call instead of caching a made-up answer"""
+        from app.services.circuit_breaker import get_circuit_breaker
+
+        watsonx_stub.error = ImportError("No module named 'ibm_watsonx_ai'")
+        query = "Liburan ke Lombok 2 hari"
+
+        result = await watsonx_ai_service.parse_travel_query(query)
+
+        assert result.destination != "Bali"
+        prompt = watsonx_ai_service._create_parsing_prompt(query)
+        assert await watsonx_ai_service._response_cache.get(
+            watsonx_ai_service._cache_key(prompt), "parse_query"
+        ) is None
+        assert get_circuit_breaker("ibm_watsonx").status()["failure_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_chat_falls_back_locally_when_provider_unavailable(self, watsonx_stub, watsonx_ai_service):
+        """Test chat answers with the local response on provider errors and an open circuit"""
+        from app.core.config import get_settings
+        from app.services.ai_service import CHAT_ERROR_RESPONSE
+        from app.services.circuit_breaker import get_circuit_breaker
+
+        watsonx_stub.error = RuntimeError("provider down")
+        local = watsonx_ai_service._generate_fallback_chat_response("berapa biaya ke Bali", {})
+
+        min_calls = get_settings().ai_breaker_min_calls
+        for _ in range(min_calls + 2):
+            response = await watsonx_ai_service.chat("berapa biaya ke Bali", {})
+            assert response == local
+            assert response != CHAT_ERROR_RESPONSE
+
+        assert get_circuit_breaker("ibm_watsonx").state == "open"
+        assert len(watsonx_stub.generations) == min_calls
+
+    @pytest.mark.asyncio
+    async def test_watsonx_token_refreshed_in_background(self, watsonx_stub, watsonx_ai_service):
+        """Test the Watsonx token is refreshed off the request path by re-authenticating"""
+        import asyncio
+        
+        await watsonx_ai_service.parse_travel_query("Liburan ke Bali 3 hari")
+        first_client = watsonx_ai_service._client
+        
+        task = asyncio.create_task(watsonx_ai_service.refresh_watsonx_token(0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        assert watsonx_stub.clients >= 3
+        assert watsonx_ai_service._client is not first_client
+        # Model handles were re-created on the new client ahead of the next call
+        [model] = watsonx_ai_service._watsonx_models.values()
+        assert model.api_client is watsonx_ai_service._client
+        models = watsonx_stub.models
+        await watsonx_ai_service.parse_travel_query("Liburan ke Lombok 2 hari")
+        assert watsonx_stub.models == models
+        assert len(watsonx_stub.generations) == 2
+    
+    @pytest.mark.asyncio
+    async def test_chat_stream_yields_tokens_as_generated(self, watsonx_stub, watsonx_ai_service):
+        """Test streamed chat delivers the first token before generation ends"""
+        import time
+        
+        watsonx_stub.response = "Coba nasi ayam betutu dan sate lilit di Bali"
+        watsonx_stub.delay = 0.05
+        
+        started = time.perf_counter()
+        chunks, arrivals = [], []
+        async for chunk in watsonx_ai_service.chat_stream("kuliner khas Bali", {}):
+            chunks.append(chunk)
+            arrivals.append(time.perf_counter() - started)
+        
+        assert len(chunks) == 9
+        assert "".join(chunks).strip() == watsonx_stub.response
+        assert arrivals[0] < arrivals[-1] - 0.2
+        assert watsonx_ai_service.first_token_time.count == 1
+        
+        # The finished response is cached like a non-streamed one
+        assert [chunk async for chunk in watsonx_ai_service.chat_stream("kuliner khas Bali", {})] == [watsonx_stub.response]
+        assert await watsonx_ai_service.chat("kuliner khas Bali", {}) == watsonx_stub.response
+        assert len(watsonx_stub.generations) == 1
+    
+    @pytest.mark.asyncio
+    async def test_chat_stream_error_counts_against_circuit(self, watsonx_stub, watsonx_ai_service):
+        """Test a provider failure mid-stream is raised and recorded"""
+        from app.services.circuit_breaker import get_circuit_breaker
+        
+        watsonx_stub.error = RuntimeError("provider down")
+        
+        with pytest.raises(RuntimeError):
+            async for _ in watsonx_ai_service.chat_stream("kuliner khas Bali", {}):
+                pass
+        assert get_circuit_breaker("ibm_watsonx").status()["failure_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_chat_stream_falls_back_locally_when_circuit_open(self, watsonx_stub, watsonx_ai_service):
+        """Test an open circuit streams the local response without calling the provider"""
+        from app.services.circuit_breaker import get_circuit_breaker
+
+        breaker = get_circuit_breaker("ibm_watsonx")
+        for _ in range(breaker.min_calls):
+            breaker.record_failure()
+        assert breaker.state == "open"
+
+        chunks = [chunk async for chunk in watsonx_ai_service.chat_stream("halo", {})]
+
+        assert chunks == [watsonx_ai_service._generate_fallback_chat_response("halo", {})]
+        assert watsonx_stub.generations == []
+
+    @pytest.mark.asyncio
+    async def test_watsonx_call_does_not_block_event_loop(self, watsonx_stub, watsonx_ai_service):
+        """Test slow Watsonx generations run on the provider's thread pool"""
+        import asyncio
+        
+        watsonx_stub.delay = 0.2
+        
+        call = asyncio.create_task(watsonx_ai_service.parse_travel_query("Liburan ke Bali 3 hari"))
+        ticks = 0
+        while not call.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await call
+        
+        assert ticks >= 10
+        stats = watsonx_ai_service.executor_stats()["ibm_watsonx"]
+        assert stats["completed"] == 1
+        assert stats["running"] == 0
+
+
+class TestResponseCache:
+    """Test the exact-match AI response cache"""
+    
+    @pytest.mark.asyncio
+    async def test_normalized_prompts_share_entry(self):
+        """Test prompts differing only in case and whitespace hit the same entry"""
+        from app.services.response_cache import ResponseCache, cache_key
+        
+        cache = ResponseCache(max_entries=10)
+        params = {"temperature": 0.3}
+        key = cache_key("openai", "gpt", params, "3 hari di Bali  bersama keluarga")
+        await cache.set(key, "cached", ttl=60)
+        
+        assert await cache.get(cache_key("openai", "gpt", params, " 3 Hari di bali bersama keluarga"), "parse_query") == "cached"
+        assert await cache.get(cache_key("openai", "gpt-4", params, "3 hari di Bali bersama keluarga"), "parse_query") is None
+        assert await cache.get(cache_key("openai", "gpt", {"temperature": 0.9}, "3 hari di Bali bersama keluarga"), "parse_query") is None
+        
+        stats = cache.stats()["purposes"]["parse_query"]
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["hit_rate"] == 0.333
+    
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_expiry(self, monkeypatch):
+        """Test least recently used entries are evicted and expired ones ignored"""
+        from app.services import response_cache
+        
+        now = [1000.0]
+        monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+        cache = response_cache.ResponseCache(max_entries=2)
+        
+        await cache.set("a", "A", ttl=60)
+        await cache.set("b", "B", ttl=10)
+        assert await cache.get("a") == "A"
+        await cache.set("c", "C", ttl=60)  # evicts b, the least recently used
+        
+        assert await cache.get("b") is None
+        assert await cache.get("c") == "C"
+        
+        now[0] += 30
+        assert await cache.get("a") == "A"
+        now[0] += 31
+        assert await cache.get("a") is None
+        assert cache.stats()["entries"] == 1
+
+
+def bag_of_words_embedder(texts):
+    """Deterministic stand-in for a sentence embedding model"""
+    import zlib
+    import numpy as np
+    
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, zlib.crc32(word.encode()) % 64] += 1
+    return vectors
+
+
+class TestSemanticCache:
+    """Test the embedding-similarity cache"""
+    
+    @pytest.mark.asyncio
+    async def test_similar_queries_share_answers(self):
+        """Test answers are reused above the similarity threshold and within scope"""
+        from app.services.semantic_cache import SemanticCache, numbers_scope
+        
+        cache = SemanticCache(bag_of_words_embedder, threshold=0.6, max_entries=8)
+        stored = "liburan 3 hari ke Bali sama keluarga"
+        cache.store(await cache.embed_text(stored), numbers_scope(stored), "answer")
+        
+        paraphrase = "trip keluarga 3 hari Bali"
+        assert cache.lookup(await cache.embed_text(paraphrase), numbers_scope(paraphrase)) == "answer"
+        
+        longer = "trip keluarga 5 hari Bali"
+        assert numbers_scope(longer) != numbers_scope(stored)
+        assert cache.lookup(await cache.embed_text(longer), numbers_scope(longer)) is None
+        
+        unrelated = "kuliner malam di Jakarta"
+        assert cache.lookup(await cache.embed_text(unrelated), numbers_scope(unrelated)) is None
+        
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+    
+    @pytest.mark.asyncio
+    async def test_eviction_by_capacity_and_age(self, monkeypatch):
+        """Test the oldest entry is replaced when full and expired entries never match"""
+        from app.services import semantic_cache
+        
+        now = [1000.0]
+        monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+        cache = semantic_cache.SemanticCache(bag_of_words_embedder, threshold=0.99, max_entries=2, ttl=60)
+        
+        vectors = {text: await cache.embed_text(text) for text in ["pantai", "gunung", "museum"]}
+        for text in ["pantai", "gunung", "museum"]:
+            now[0] += 1
+            cache.store(vectors[text], "", text)
+        
+        assert cache.lookup(vectors["pantai"], "") is None
+        assert cache.lookup(vectors["museum"], "") == "museum"
+        
+        now[0] += 59
+        assert cache.lookup(vectors["gunung"], "") is None
+        assert cache.lookup(vectors["museum"], "") == "museum"
+        assert cache.stats()["entries"] == 1
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical calls"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_call(self):
+        """Test callers with the same key share one call and its result"""
+        import asyncio
+        from app.services.single_flight import SingleFlight
+        
+        single_flight = SingleFlight()
+        started = []
+        
+        async def call(value):
+            started.append(value)
+            await asyncio.sleep(0.02)
+            return value
+        
+        results = await asyncio.gather(
+            *[single_flight.run("a", lambda: call("a")) for _ in range(10)],
+            single_flight.run("b", lambda: call("b"))
+        )
+        
+        assert results == ["a"] * 10 + ["b"]
+        assert started == ["a", "b"]
+        assert (single_flight.calls, single_flight.shared) == (2, 9)
+        assert len(single_flight) == 0
+        
+        # Finished calls are not reused
+        assert await single_flight.run("a", lambda: call("a2")) == "a2"
+    
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_every_caller(self):
+        """Test a failed call raises in every waiting caller"""
+        import asyncio
+        from app.services.single_flight import SingleFlight
+        
+        single_flight = SingleFlight()
+        
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+        
+        results = await asyncio.gather(
+            *[single_flight.run("key", failing) for _ in range(3)],
+            return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert single_flight.calls == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_call(self):
+        """Test cancelling the first caller leaves the shared call running"""
+        import asyncio
+        from app.services.single_flight import SingleFlight
+        
+        single_flight = SingleFlight()
+        
+        async def call():
+            await asyncio.sleep(0.02)
+            return "done"
+        
+        first = asyncio.create_task(single_flight.run("key", call))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(single_flight.run("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        
+        assert await second == "done"
+        assert first.cancelled()
+        assert single_flight.calls == 1
+
+
+class TestMultiAIService:
+    """Test hedged multi-provider travel query processing"""
+    
+    @pytest.fixture
+    def multi_ai(self, monkeypatch):
+        """Service with three providers whose calls are replaced per test"""
+        from app.services.multi_ai_service import MultiAIService
+        
+        monkeypatch.setenv("AI_PROVIDER", "ibm_watson")
+        monkeypatch.setenv("IBM_WATSON_API_KEY", "key")
+        monkeypatch.setenv("REPLICATE_API_TOKEN", "token")
+        monkeypatch.setenv("HUGGINGFACE_API_TOKEN", "token")
+        monkeypatch.setenv("AI_HEDGING", "true")
+        monkeypatch.setenv("AI_HEDGE_DELAY", "0.05")
+        monkeypatch.setenv("AI_DEADLINE", "1")
+        return MultiAIService()
+    
+    @staticmethod
+    def fake_provider(name, delay, result=True, calls=None):
+        import asyncio
+        
+        async def process(query, preferences=None):
+            calls.append(name)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                calls.append(f"{name} cancelled")
+                raise
+            if isinstance(result, Exception):
+                raise result
+            return {"title": name, "ai_provider": name} if result else None
+        return process
+    
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged(self, multi_ai):
+        """Test the next provider starts after the hedge delay and the loser is cancelled"""
+        import time
+        
+        calls = []
+        multi_ai._process_with_ibm_watson = self.fake_provider("ibm_watson", 10, calls=calls)
+        multi_ai._process_with_replicate = self.fake_provider("replicate", 0.01, calls=calls)
+        multi_ai._process_with_huggingface = self.fake_provider("huggingface", 0.01, calls=calls)
+        
+        started = time.perf_counter()
+        result = await multi_ai.process_travel_query("3 hari di Bali")
+        
+        assert result["ai_provider"] == "replicate"
+        assert time.perf_counter() - started < 0.5
+        assert calls == ["ibm_watson", "replicate", "ibm_watson cancelled"]
+    
+    @pytest.mark.asyncio
+    async def test_failed_provider_starts_next_immediately(self, multi_ai):
+        """Test an error or empty result does not wait for the hedge delay"""
+        calls = []
+        multi_ai.hedge_delay = 10
+        multi_ai._process_with_ibm_watson = self.fake_provider("ibm_watson", 0, RuntimeError("down"), calls)
+        multi_ai._process_with_replicate = self.fake_provider("replicate", 0, False, calls)
+        multi_ai._process_with_huggingface = self.fake_provider("huggingface", 0, calls=calls)
+        
+        result = await multi_ai.process_travel_query("3 hari di Bali")
+        
+        assert result["ai_provider"] == "huggingface"
+        assert calls == ["ibm_watson", "replicate", "huggingface"]
+    
+    @pytest.mark.asyncio
+    async def test_deadline_falls_back_to_mock(self, multi_ai):
+        """Test hanging providers are cancelled at the deadline"""
+        import time
+        
+        calls = []
+        multi_ai.deadline = 0.2
+        for name in ["ibm_watson", "replicate", "huggingface"]:
+            setattr(multi_ai, f"_process_with_{name}", self.fake_provider(name, 10, calls=calls))
+        
+        started = time.perf_counter()
+        result = await multi_ai.process_travel_query("3 hari di Bali")
+        
+        assert result["ai_provider"] == "mock_data"
+        assert time.perf_counter() - started < 0.5
+        assert sorted(call for call in calls if "cancelled" in call) == [
+            "huggingface cancelled", "ibm_watson cancelled", "replicate cancelled"
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_provider(self, multi_ai):
+        """Test a provider with an open circuit is skipped without waiting"""
+        from app.services.circuit_breaker import get_circuit_breaker
+        
+        calls = []
+        multi_ai.hedge_delay = 10
+        multi_ai._process_with_ibm_watson = self.fake_provider("ibm_watson", 0, calls=calls)
+        multi_ai._process_with_replicate = self.fake_provider("replicate", 0, calls=calls)
+        breaker = get_circuit_breaker("ibm_watson")
+        for _ in range(breaker.min_calls):
+            breaker.record_failure()
+        
+        result = await multi_ai.process_travel_query("3 hari di Bali")
+        
+        assert result["ai_provider"] == "replicate"
+        assert calls == ["replicate"]
+    
+    @pytest.mark.asyncio
+    async def test_priority_and_hedge_delays(self, multi_ai):
+        """Test provider order, fixed delays and p95-based delays"""
+        from app.services.multi_ai_service import MIN_HEDGE_DELAY, MIN_LATENCY_SAMPLES
+        
+        multi_ai.provider_priority = ["huggingface", "ibm_watson"]
+        assert multi_ai._available_providers() == ["huggingface", "ibm_watson"]
+        
+        multi_ai.hedge_delays = {"replicate": 3.0}
+        assert multi_ai._hedge_delay("replicate") == 3.0
+        assert multi_ai._hedge_delay("ibm_watson") == 0.05
+        
+        calls = []
+        multi_ai._process_with_ibm_watson = self.fake_provider("ibm_watson", 0, calls=calls)
+        for _ in range(MIN_LATENCY_SAMPLES):
+            await multi_ai._timed_call("ibm_watson", "query", None)
+        # Fast calls: p95 of the recorded latencies, floored
+        assert multi_ai._hedge_delay("ibm_watson") == MIN_HEDGE_DELAY
+
+
+class TestCircuitBreaker:
+    """Test provider circuit breakers"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        from app.services import circuit_breaker
+        
+        now = [1000.0]
+        monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+        return now
+    
+    @pytest.mark.asyncio
+    async def test_opens_on_failure_rate_and_recovers(self, clock):
+        """Test closed -> open -> half-open -> closed"""
+        from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+        
+        breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, open_seconds=30)
+        
+        async def fail():
+            raise RuntimeError("down")
+        
+        async def succeed():
+            return "ok"
+        
+        assert await breaker.call(succeed) == "ok"
+        assert await breaker.call(succeed) == "ok"
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await breaker.call(fail)
+        assert breaker.state == "open"
+        
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(succeed)
+        assert breaker.status()["rejected"] == 1
+        
+        clock[0] += 30
+        assert breaker.state == "half_open"
+        assert breaker.allow() is True
+        assert breaker.allow() is False  # one trial call at a time
+        breaker.record_success(0.1)
+        assert breaker.state == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_failed_trial_reopens(self, clock):
+        """Test a failing half-open trial opens the circuit again"""
+        from app.services.circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker("test", min_calls=1, open_seconds=10)
+        breaker.record_failure()
+        clock[0] += 10
+        assert breaker.allow() is True
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.status()["retry_in"] == 10
+    
+    def test_opens_on_slow_calls_within_window(self, clock):
+        """Test slow calls open the circuit and old calls leave the window"""
+        from app.services.circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker(
+            "test", slow_call_seconds=5, slow_call_rate=0.75, window_seconds=60, min_calls=4
+        )
+        for _ in range(3):
+            breaker.record_success(10)
+        clock[0] += 61  # slow calls expire from the window
+        breaker.record_success(10)
+        breaker.record_success(1)
+        assert breaker.state == "closed"
+        
+        for _ in range(2):
+            breaker.record_success(10)
+        assert breaker.state == "open"
+    
+    @pytest.mark.asyncio
+    async def test_results_can_count_as_failures(self):
+        """Test results rejected by `succeeded` count as failures"""
+        from app.services.circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker("test", min_calls=2)
+        
+        async def empty():
+            return None
+        
+        for _ in range(2):
+            assert await breaker.call(empty, succeeded=bool) is None
+        assert breaker.state == "open"
+
+
+class TestReplicatePredictions:
+    """Test Replicate predictions against a local fake server"""
+    
+    @pytest_asyncio.fixture
+    async def multi_ai(self, monkeypatch, fake_replicate):
+        from app.services.multi_ai_service import MultiAIService
+        
+        monkeypatch.setenv("REPLICATE_API_TOKEN", "token")
+        monkeypatch.setenv("REPLICATE_API_URL", fake_replicate.url)
+        monkeypatch.setenv("REPLICATE_TIMEOUT", "5")
+        service = MultiAIService()
+        yield service
+        await service.aclose()
+    
+    @staticmethod
+    async def time_to_result(multi_ai, fake_replicate):
+        """Seconds between the output being ready and the caller having it"""
+        import time
+        
+        started = time.perf_counter()
+        result = await multi_ai._process_with_replicate("3 hari di Bali")
+        assert result["title"] == "Bali 3 Hari"
+        assert result["ai_provider"] == "replicate_granite"
+        return time.perf_counter() - started - fake_replicate.latency
+    
+    @pytest.mark.asyncio
+    async def test_prefer_wait_returns_with_prediction(self, multi_ai, fake_replicate):
+        """Test a prediction finished within Prefer: wait needs one request"""
+        assert await self.time_to_result(multi_ai, fake_replicate) < 0.1
+        assert [method for method, _ in fake_replicate.requests] == ["POST"]
+    
+    @pytest.mark.asyncio
+    async def test_streams_unfinished_prediction(self, multi_ai, fake_replicate):
+        """Test output is read from the SSE stream when waiting did not finish it"""
+        fake_replicate.honor_wait = False
+        fake_replicate.stream = True
+        
+        assert await self.time_to_result(multi_ai, fake_replicate) < 0.1
+        assert [path.split("/")[2] for _, path in fake_replicate.requests] == ["models", "stream"]
+    
+    @pytest.mark.asyncio
+    async def test_polls_with_backoff(self, multi_ai, fake_replicate):
+        """Test polling backs off instead of requesting every second"""
+        fake_replicate.honor_wait = False
+        fake_replicate.latency = 1.0
+        
+        # Polls at most 0.25s, 0.5s, 1s apart: at most one backoff step late
+        assert await self.time_to_result(multi_ai, fake_replicate) < 1.0
+        polls = [path for method, path in fake_replicate.requests if method == "GET"]
+        assert 1 <= len(polls) <= 4
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_call_cancels_prediction(self, multi_ai, fake_replicate):
+        """Test a prediction whose caller lost the hedge is cancelled on Replicate"""
+        import asyncio
+        
+        fake_replicate.honor_wait = False
+        fake_replicate.latency = 5.0
+        
+        call = asyncio.create_task(multi_ai._process_with_replicate("3 hari di Bali"))
+        await asyncio.sleep(0.1)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        
+        [prediction_id] = fake_replicate.predictions
+        assert fake_replicate.canceled == {prediction_id}
+        assert ("POST", f"/v1/predictions/{prediction_id}/cancel") in fake_replicate.requests
+    
+    @pytest.mark.asyncio
+    async def test_hung_poll_times_out_and_cancels_prediction(self, multi_ai, fake_replicate):
+        """Test a poll that never answers is cut off at the deadline and the prediction cancelled"""
+        import time
+        
+        fake_replicate.honor_wait = False
+        fake_replicate.latency = 5.0
+        fake_replicate.poll_delay = 2.0
+        multi_ai.replicate_timeout = 1.0
+        
+        started = time.perf_counter()
+        assert await multi_ai._process_with_replicate("3 hari di Bali") is None
+        assert time.perf_counter() - started < 1.5
+        
+        [prediction_id] = fake_replicate.predictions
+        assert fake_replicate.canceled == {prediction_id}
+    
+    def test_hedging_is_opt_in(self, monkeypatch):
+        """Test providers are tried one at a time unless AI_HEDGING is set"""
+        from app.services.multi_ai_service import MultiAIService
+        
+        monkeypatch.delenv("AI_HEDGING", raising=False)
+        assert MultiAIService().hedging is False
+    
+    @pytest.mark.asyncio
+    async def test_shares_one_session(self, multi_ai, fake_replicate):
+        """Test predictions reuse the service's session"""
+        await multi_ai._process_with_replicate("3 hari di Bali")
+        session = multi_ai._get_session()
+        await multi_ai._process_with_replicate("5 hari di Lombok")
+        assert multi_ai._get_session() is session
+
+
+class TestProviderExecutor:
+    """Test bounded thread pools for blocking provider calls"""
+    
+    @pytest.mark.asyncio
+    async def test_calls_queue_when_pool_is_full(self):
+        """Test calls beyond max_workers wait and the wait is recorded"""
+        import asyncio
+        import time
+        from app.services.provider_executor import ProviderExecutor
+        
+        executor = ProviderExecutor("test", max_workers=1)
+        results = await asyncio.gather(*[
+            executor.run(lambda n=n: time.sleep(0.05) or n) for n in range(3)
+        ])
+        
+        assert results == [0, 1, 2]
+        stats = executor.stats()
+        assert stats["completed"] == 3
+        assert stats["queued"] == 0
+        assert stats["queue_wait_max"] >= 0.09
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_queued_call_leaves_queue(self):
+        """Test a call cancelled while waiting for a thread is no longer counted as queued"""
+        import asyncio
+        import threading
+        from app.services.provider_executor import ProviderExecutor
+        
+        executor = ProviderExecutor("test", max_workers=1)
+        release = threading.Event()
+        running = asyncio.create_task(executor.run(release.wait))
+        queued = asyncio.create_task(executor.run(lambda: "never"))
+        try:
+            await asyncio.sleep(0.05)
+            assert executor.stats()["queued"] == 1
+            
+            queued.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await queued
+            assert executor.stats()["queued"] == 0
+        finally:
+            release.set()
+        assert await running is True
+        stats = executor.stats()
+        assert stats["queued"] == 0
+        assert stats["completed"] == 1
+        executor.shutdown()
+
 
 class TestDestinationService:
     """Test destination service functionality"""
     
     @pytest.fixture
-    def destination_service(self, db_session):
+    def destination_service(self, async_db_session):
         """Create destination service instance for testing"""
-        return DestinationService(db=db_session)
+        return DestinationService(db=async_db_session)
     
     @pytest.mark.asyncio
     async def test_search_destinations_empty(self, destination_service):
@@ -145,23 +958,661 @@ class TestDestinationService:
         assert result is not None
         assert result.filters_applied == filters
     
+    @pytest.mark.asyncio
+    async def test_search_destinations_returns_matches(
+        self, destination_service, async_db_session, sample_destination_data
+    ):
+        """Test searching destinations returns stored rows with relationships"""
+        from app.models.database_models import Destination, Tag
+
+        destination = Destination(**sample_destination_data)
+        destination.tags.append(Tag(name="populer"))
+        async_db_session.add(destination)
+        await async_db_session.flush()
+
+        result = await destination_service.search_destinations(query="Test City")
+
+        assert result.total == 1
+        assert result.destinations[0].name == "Test Destination"
+        assert result.destinations[0].tags == ["populer"]
+
+    @pytest.mark.asyncio
+    async def test_search_destinations_full_text_ranking(
+        self, destination_service, async_db_session, sample_destination_data
+    ):
+        """Test full-text search matches word prefixes and ranks name matches first"""
+        from app.models.database_models import Destination
+
+        async_db_session.add_all([
+            Destination(**{
+                **sample_destination_data,
+                "name": "Pura Tanah Lot",
+                "description": "Pura di atas batu karang, tidak jauh dari Kuta",
+                "rating": 4.9,
+                "slug": "pura-tanah-lot"
+            }),
+            Destination(**{
+                **sample_destination_data,
+                "name": "Pantai Kuta",
+                "description": "Pantai dengan sunset indah",
+                "rating": 4.1,
+                "slug": "pantai-kuta"
+            }),
+            Destination(**{**sample_destination_data, "name": "Danau Toba", "slug": "danau-toba"})
+        ])
+        await async_db_session.flush()
+
+        result = await destination_service.search_destinations(query="kut")
+
+        assert result.total == 2
+        assert [dest.name for dest in result.destinations] == ["Pantai Kuta", "Pura Tanah Lot"]
+
+    @pytest.mark.asyncio
+    async def test_search_destinations_fuzzy(
+        self, destination_service, async_db_session, sample_destination_data
+    ):
+        """Test fuzzy search tolerates typos and colloquial city names"""
+        from app.models.database_models import Destination
+
+        async_db_session.add_all([
+            Destination(**{
+                **sample_destination_data,
+                "name": "Candi Prambanan",
+                "city": "Yogyakarta",
+                "province": "DI Yogyakarta",
+                "slug": "candi-prambanan"
+            }),
+            Destination(**{
+                **sample_destination_data,
+                "name": "Pulau Komodo",
+                "city": "Labuan Bajo",
+                "province": "Nusa Tenggara Timur",
+                "slug": "pulau-komodo"
+            })
+        ])
+        await async_db_session.flush()
+
+        typo = await destination_service.search_destinations(query="yogyakrta", fuzzy=True)
+        alias = await destination_service.search_destinations(
+            filters={"city": "jogja"}, fuzzy=True
+        )
+        strict = await destination_service.search_destinations(query="yogyakrta")
+
+        assert [dest.name for dest in typo.destinations] == ["Candi Prambanan"]
+        assert [dest.name for dest in alias.destinations] == ["Candi Prambanan"]
+        assert strict.total == 0
+
+    def test_trigram_word_similarity(self):
+        """Test trigram similarity matches pg_trgm word_similarity semantics"""
+        from app.services.trigram_index import word_similarity
+
+        assert word_similarity("word", "two words") == pytest.approx(0.8)
+        assert word_similarity("kuta", "Pantai Kuta") == 1.0
+        assert word_similarity("yogyakrta", "Yogyakarta") > 0.5
+        assert word_similarity("bali", "Jakarta") < 0.3
+
+    @pytest.mark.asyncio
+    async def test_trigram_index_follows_committed_changes(
+        self, destination_service, async_db_session, sample_destination_data, monkeypatch
+    ):
+        """Test only committed changes reach the trigram index, and a stale index is rebuilt"""
+        import uuid
+        from sqlalchemy import delete, insert
+        from app.models.database_models import Destination
+
+        index = await destination_service._get_trigram_index()
+
+        rolled_back = Destination(**{**sample_destination_data, "name": "Pantai Rollback", "slug": "trigram-rolled-back"})
+        async_db_session.add(rolled_back)
+        await async_db_session.flush()
+        assert index.search("rollback") == {}
+        await async_db_session.rollback()
+        assert index.search("rollback") == {}
+
+        committed = Destination(**{**sample_destination_data, "name": "Pantai Komit", "slug": "trigram-committed"})
+        async_db_session.add(committed)
+        await async_db_session.commit()
+        assert str(committed.id) in index.search("komit")
+
+        committed.is_active = False
+        await async_db_session.commit()
+        assert index.search("komit") == {}
+
+        # Rows written elsewhere (here: bypassing the ORM session) show up once the index is stale
+        other_id = uuid.uuid4()
+        await async_db_session.execute(insert(Destination).values(
+            **{**sample_destination_data, "id": other_id, "name": "Pantai Lain", "slug": "trigram-other"}
+        ))
+        await async_db_session.commit()
+        await destination_service._get_trigram_index()
+        assert index.search("lain") == {}
+
+        monkeypatch.setenv("TRIGRAM_INDEX_REFRESH_INTERVAL", "0")
+        await destination_service._get_trigram_index()
+        assert str(other_id) in index.search("lain")
+
+        # Commits after the rollback above outlive the test's transaction
+        await async_db_session.execute(delete(Destination).where(Destination.slug.like("trigram-%")))
+        await async_db_session.commit()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("search", [
+        {},
+        {"query": "pantai"},
+        {"query": "pantai", "fuzzy": True}
+    ])
+    async def test_search_destinations_cursor_pagination(
+        self, destination_service, async_db_session, sample_destination_data, search
+    ):
+        """Test walking every page with cursors returns each row exactly once"""
+        from app.models.database_models import Destination
+
+        for i in range(7):
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": f"Pantai {i}",
+                "rating": 4.0 + (i % 3) * 0.2,  # ties force the id tie-breaker
+                "slug": f"pantai-{i}"
+            }))
+        await async_db_session.flush()
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            result = await destination_service.search_destinations(
+                page_size=3, cursor=cursor, include_total=False, **search
+            )
+            seen.extend(dest.name for dest in result.destinations)
+            pages += 1
+            cursor = result.next_cursor
+            if cursor is None:
+                break
+
+        assert pages == 3
+        assert sorted(seen) == sorted(f"Pantai {i}" for i in range(7))
+        if not search.get("fuzzy"):
+            assert result.total is None  # no planner estimate on SQLite
+
+    @pytest.mark.asyncio
+    @pytest.mark.query_budget(4)
+    async def test_search_destinations_constant_queries(
+        self, destination_service, async_db_session, query_counter, sample_destination_data
+    ):
+        """Test relationships load in a fixed number of queries regardless of page size"""
+        from app.models.database_models import Destination, Tag, Facility
+
+        tag, facility = Tag(name="alam"), Facility(name="Parkir")
+        for i in range(5):
+            destination = Destination(**{**sample_destination_data, "slug": f"test-{i}"})
+            destination.tags.append(tag)
+            destination.facilities.append(facility)
+            async_db_session.add(destination)
+        await async_db_session.flush()
+        async_db_session.expire_all()
+        query_counter.reset()
+
+        result = await destination_service.search_destinations(page_size=5)
+
+        assert len(result.destinations) == 5
+        assert all(dest.facilities == ["Parkir"] for dest in result.destinations)
+        # count + page + tags + facilities
+        assert query_counter.count == 4
+
+    @pytest.mark.asyncio
+    async def test_get_and_list_destinations(
+        self, destination_service, async_db_session, sample_destination_data
+    ):
+        """Test getting and listing stored destinations"""
+        from app.models.database_models import Destination
+
+        destination = Destination(**sample_destination_data)
+        async_db_session.add(destination)
+        await async_db_session.flush()
+
+        found = await destination_service.get_destination(str(destination.id))
+        listing = await destination_service.list_destinations(page=1, page_size=10)
+
+        assert found.name == "Test Destination"
+        assert listing.total == 1
+        assert listing.total_pages == 1
+        assert listing.items[0].id == str(destination.id)
+
     @pytest.mark.asyncio
     async def test_get_destination_not_found(self, destination_service):
         """Test getting non-existent destination"""
         result = await destination_service.get_destination("non-existent-id")
         assert result is None
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("use_geo_index", [True, False])
+    async def test_get_nearby_destinations(
+        self, destination_service, async_db_session, sample_destination_data, monkeypatch, use_geo_index
+    ):
+        """Test nearby search ranks by distance within the radius, from the geo index or the geohash query"""
+        from app.models.database_models import Destination
+
+        monkeypatch.setenv("USE_GEO_INDEX", str(use_geo_index).lower())
+        if not use_geo_index:
+            # Geohash-prefiltered database query; the in-process index must not be consulted
+            monkeypatch.setattr(destination_service, "_get_geo_index", None)
+
+        places = {
+            "Pantai Kuta": (-8.7184, 115.1686),
+            "Pantai Seminyak": (-8.6913, 115.1571),  # ~3 km
+            "Pura Tanah Lot": (-8.6212, 115.0868),  # ~14 km
+            "Ubud": (-8.5069, 115.2625),  # ~26 km
+            "Monas": (-6.1754, 106.8272),  # Jakarta, ~970 km
+        }
+        created = {}
+        for name, (latitude, longitude) in places.items():
+            created[name] = Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "slug": name.lower().replace(" ", "-")
+            })
+            async_db_session.add(created[name])
+        await async_db_session.flush()
+
+        assert created["Pantai Kuta"].geohash.startswith("qw3")
+
+        nearby = await destination_service.get_nearby_destinations(
+            str(created["Pantai Kuta"].id), radius_km=20
+        )
+        assert [dest.name for dest in nearby] == ["Pantai Seminyak", "Pura Tanah Lot"]
+        assert nearby[0].distance_km == pytest.approx(3.3, abs=0.2)
+
+        limited = await destination_service.get_nearby_destinations(
+            str(created["Pantai Kuta"].id), radius_km=200, limit=2
+        )
+        assert [dest.name for dest in limited] == ["Pantai Seminyak", "Pura Tanah Lot"]
+
+        assert await destination_service.get_nearby_destinations("non-existent-id") == []
+
+    @pytest.mark.asyncio
+    async def test_nearby_postgis_query(self, destination_service, monkeypatch):
+        """Test the PostGIS nearby query filters and orders on the geography column"""
+        from sqlalchemy.dialects import postgresql
+
+        statements = []
+
+        async def execute(stmt):
+            statements.append(stmt)
+            return Mock(all=Mock(return_value=[]))
+
+        monkeypatch.setattr(destination_service.db, "execute", execute)
+        assert await destination_service._nearby_postgis((-8.7184, 115.1686), 20, 5) == []
+
+        sql = str(statements[0].compile(dialect=postgresql.dialect()))
+        assert "ST_DWithin(destinations.location" in sql
+        assert "ORDER BY ST_Distance(destinations.location" in sql
+        assert "LIMIT" in sql
+
+    def test_geo_helpers(self):
+        """Test haversine distance, bounding boxes and geohash cells"""
+        from app.utils.geo import bounding_box, geohash_cells, geohash_encode, haversine_km
+
+        # Jakarta to Bandung
+        assert haversine_km(-6.2088, 106.8456, -6.9175, 107.6191) == pytest.approx(116, abs=2)
+        assert geohash_encode(42.6, -5.6, 5) == "ezs42"
+
+        box = bounding_box(-8.7184, 115.1686, 50)
+        assert box[0] < -8.7184 - 0.44 and box[1] > -8.7184 + 0.44
+        assert box[3] - box[2] > box[1] - box[0]  # degrees of longitude are shorter
+
+        cells = geohash_cells(box)
+        assert 0 < len(cells) <= 16
+        assert any(geohash_encode(-8.7184, 115.1686).startswith(cell) for cell in cells)
+        assert any(geohash_encode(-8.5069, 115.2625).startswith(cell) for cell in cells)
+
+
+class TestGeoIndex:
+    """Test the in-process destination geo index"""
+
+    @pytest.fixture(params=["ball_tree", "brute_force"])
+    def geo_index(self, request, monkeypatch):
+        """Create a geo index over random points in Indonesia"""
+        import random
+        from app.services import geo_index as geo_index_module
+
+        if request.param == "brute_force":
+            monkeypatch.setattr(geo_index_module, "BallTree", None)
+        elif geo_index_module.BallTree is None:
+            pytest.skip("scikit-learn not installed")
+
+        rng = random.Random(7)
+        points = [(f"dest-{i}", rng.uniform(-10, 5), rng.uniform(95, 140)) for i in range(2000)]
+        index = geo_index_module.GeoIndex()
+        index.build(points)
+        return index, points
+
+    def test_nearest_matches_exact_ranking(self, geo_index):
+        """Test k-NN and radius queries agree with exact haversine ranking"""
+        from app.utils.geo import haversine_km
+
+        index, points = geo_index
+        origin = (-8.7184, 115.1686)
+        exact = sorted((haversine_km(*origin, lat, lon), dest_id) for dest_id, lat, lon in points)
+
+        nearest = index.nearest(*origin, k=5)
+        assert [dest_id for dest_id, _ in nearest] == [dest_id for _, dest_id in exact[:5]]
+        assert nearest[0][1] == pytest.approx(exact[0][0])
+
+        within = index.within(*origin, radius_km=300)
+        assert [dest_id for dest_id, _ in within] == [dest_id for distance, dest_id in exact if distance <= 300]
+
+        excluded = index.nearest(*origin, k=5, exclude=[exact[0][1]])
+        assert [dest_id for dest_id, _ in excluded] == [dest_id for _, dest_id in exact[1:6]]
+
+    def test_incremental_updates(self, geo_index, monkeypatch):
+        """Test added, moved and removed destinations are reflected, including after a rebuild"""
+        from app.services import geo_index as geo_index_module
+
+        index, points = geo_index
+        index.add("new", -8.7184, 115.1686)
+        assert index.nearest(-8.7184, 115.1686, k=1)[0] == ("new", 0.0)
+
+        index.add("new", -6.1754, 106.8272)  # moved to Jakarta
+        assert index.nearest(-6.1754, 106.8272, k=1)[0][0] == "new"
+        assert index.coordinates("new") == pytest.approx((-6.1754, 106.8272))
+
+        index.remove("new")
+        assert index.coordinates("new") is None
+        assert all(dest_id != "new" for dest_id, _ in index.nearest(-6.1754, 106.8272, k=10))
+
+        monkeypatch.setattr(geo_index_module, "MIN_REBUILD_CHANGES", 0)
+        for dest_id, _, _ in points[:600]:
+            index.remove(dest_id)
+        assert len(index) == len(points) - 600
+        assert index.nearest(*points[0][1:], k=1)[0][0] != points[0][0]
+
+    @pytest.mark.asyncio
+    async def test_refresh_job_uses_given_session_factory(self, test_db):
+        """Test the periodic rebuild reads from the session factory it is given"""
+        import asyncio
+        from app.services.geo_index import destination_geo_index, refresh_destination_geo_index
+        from tests.conftest import TestingAsyncSessionLocal
+
+        destination_geo_index.invalidate()
+        task = asyncio.create_task(refresh_destination_geo_index(3600, TestingAsyncSessionLocal))
+        for _ in range(100):
+            if destination_geo_index.ready:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert destination_geo_index.ready
+
+    @pytest.mark.asyncio
+    async def test_committed_changes_update_index(self, async_db_session, sample_destination_data):
+        """Test only committed destination changes reach the index"""
+        from app.models.database_models import Destination
+        from app.services.geo_index import destination_geo_index, load_destination_geo_index
+
+        await load_destination_geo_index(async_db_session)
+
+        rolled_back = Destination(**{**sample_destination_data, "slug": "rolled-back"})
+        async_db_session.add(rolled_back)
+        await async_db_session.flush()
+        await async_db_session.rollback()
+        assert destination_geo_index.coordinates(rolled_back.id) is None
+
+        committed = Destination(**{**sample_destination_data, "slug": "committed"})
+        async_db_session.add(committed)
+        await async_db_session.commit()
+        assert destination_geo_index.coordinates(committed.id) == pytest.approx(
+            (sample_destination_data["latitude"], sample_destination_data["longitude"])
+        )
+
+        committed.is_active = False
+        await async_db_session.commit()
+        assert destination_geo_index.coordinates(committed.id) is None
+
+
+class TestSchemaUpgrade:
+    """Test upgrading tables created by an earlier version"""
+    
+    def test_upgrade_adds_columns_indexes_and_search(self, tmp_path, sample_destination_data):
+        """Test missing columns, indexes and FTS are added, and geohashes backfilled, idempotently"""
+        from sqlalchemy import create_engine, insert, inspect
+        from app.core.database import Base
+        from app.models.database_models import Destination, upgrade_schema
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            # The tables as an earlier version created them
+            for statement in [
+                "DROP TRIGGER destinations_fts_insert",
+                "DROP TRIGGER destinations_fts_delete",
+                "DROP TRIGGER destinations_fts_update",
+                "DROP TABLE destinations_fts",
+                "DROP INDEX ix_destinations_geohash",
+                "ALTER TABLE destinations DROP COLUMN geohash",
+                "DROP INDEX ix_itineraries_template_key",
+                "ALTER TABLE itineraries DROP COLUMN template_key",
+                "DROP INDEX ix_itinerary_items_day_id",
+            ]:
+                connection.exec_driver_sql(statement)
+            connection.execute(insert(Destination.__table__).values(**{
+                **sample_destination_data,
+                "name": "Pantai Kuta",
+                "latitude": -8.7184,
+                "longitude": 115.1686,
+                "slug": "kuta"
+            }))
+        
+        for _ in range(2):
+            with engine.begin() as connection:
+                upgrade_schema(connection)
+        
+        inspector = inspect(engine)
+        assert "geohash" in {column["name"] for column in inspector.get_columns("destinations")}
+        assert "template_key" in {column["name"] for column in inspector.get_columns("itineraries")}
+        assert "ix_itinerary_items_day_id" in {index["name"] for index in inspector.get_indexes("itinerary_items")}
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql(
+                "SELECT geohash FROM destinations WHERE slug = 'kuta'"
+            ).scalar().startswith("qw3")
+            assert connection.exec_driver_sql(
+                "SELECT count(*) FROM destinations_fts WHERE destinations_fts MATCH 'kuta'"
+            ).scalar() == 1
+        engine.dispose()
+
+
+class TestDistanceMatrix:
+    """Test the vectorized distance/duration matrix"""
+
+    points = [
+        ("kuta", -8.7184, 115.1686),
+        ("ubud", -8.5069, 115.2625),
+        ("monas", -6.1754, 106.8272),
+    ]
+
+    def test_matrix_matches_haversine(self):
+        """Test the batched matrix equals pairwise haversine distances"""
+        from app.services.distance_matrix import get_distance_matrix
+        from app.utils.geo import haversine_km
+
+        matrix = get_distance_matrix(self.points)
+
+        assert matrix.ids == ("kuta", "monas", "ubud")
+        for a, lat_a, lon_a in self.points:
+            for b, lat_b, lon_b in self.points:
+                assert matrix.distance_km[matrix.index[a], matrix.index[b]] == pytest.approx(
+                    haversine_km(lat_a, lon_a, lat_b, lon_b)
+                )
+
+    def test_durations_follow_speed_profiles(self):
+        """Test travel times per transportation mode"""
+        from app.models.schemas import TransportationType
+        from app.services.distance_matrix import SPEED_PROFILES, get_distance_matrix
+
+        matrix = get_distance_matrix(self.points)
+        car = matrix.duration_minutes(TransportationType.CAR)
+        walking = matrix.duration_minutes(TransportationType.WALKING)
+        i, j = matrix.index["kuta"], matrix.index["ubud"]
+
+        profile = SPEED_PROFILES[TransportationType.CAR]
+        expected = matrix.distance_km[i, j] * profile.detour_factor / profile.speed_kmh * 60 + profile.overhead_minutes
+        assert car[i, j] == pytest.approx(expected)
+        assert walking[i, j] > car[i, j]
+        assert (car.diagonal() == 0).all()
+
+        assert matrix.leg("kuta", "ubud")["transportation"] == TransportationType.CAR
+        assert matrix.leg("kuta", "monas")["transportation"] == TransportationType.FLIGHT
+
+    def test_matrix_cached_per_destination_set(self):
+        """Test matrices are reused for the same destinations and coordinates"""
+        from app.services.distance_matrix import get_distance_matrix
+
+        matrix = get_distance_matrix(self.points)
+        assert get_distance_matrix(reversed(self.points)) is matrix
+
+        moved = [("kuta", -8.70, 115.17)] + self.points[1:]
+        assert get_distance_matrix(moved) is not matrix
+
+    @pytest.mark.asyncio
+    async def test_destination_service_matrix(self, async_db_session, sample_destination_data):
+        """Test building a matrix for stored destinations"""
+        from app.models.database_models import Destination
+        from app.services.destination_service import DestinationService
+
+        created = []
+        for name, latitude, longitude in self.points:
+            created.append(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "slug": name
+            }))
+            async_db_session.add(created[-1])
+        await async_db_session.flush()
+
+        ids = [str(dest.id) for dest in created] + ["non-existent-id"]
+        matrix = await DestinationService(db=async_db_session).get_distance_matrix(ids)
+
+        assert len(matrix) == 3
+        kuta, ubud = matrix.index[str(created[0].id)], matrix.index[str(created[1].id)]
+        assert matrix.distance_km[kuta, ubud] == pytest.approx(26, abs=1)
+
+
+class TestRouteSolver:
+    """Test the local route solver"""
+
+    @staticmethod
+    def random_matrix(n, seed=0):
+        import numpy as np
+
+        points = np.random.default_rng(seed).uniform(0, 100, (n, 2))
+        return np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+
+    @pytest.mark.parametrize("start,closed", [(0, False), (0, True), (None, False)])
+    def test_exact_solution_matches_brute_force(self, start, closed):
+        """Test small routes are solved optimally"""
+        import itertools
+        from app.services.route_solver import route_cost, solve_route
+
+        cost = self.random_matrix(7)
+        order, exact = solve_route(cost, start=start, closed=closed)
+
+        best = min(
+            route_cost(cost, permutation, closed)
+            for permutation in itertools.permutations(range(7))
+            if start is None or permutation[0] == start
+        )
+        assert exact is True
+        assert sorted(order) == list(range(7))
+        assert route_cost(cost, order, closed) == pytest.approx(best)
+
+    def test_heuristic_improves_nearest_neighbour(self):
+        """Test large routes get 2-opt/Or-opt improvement over the greedy route"""
+        from app.services import route_solver
+
+        cost = self.random_matrix(40, seed=3)
+        order, exact = route_solver.solve_route(cost, start=0)
+        greedy = route_solver._nearest_neighbour(cost, 0)
+
+        assert exact is False
+        assert order[0] == 0 and sorted(order) == list(range(40))
+        assert route_solver.route_cost(cost, order) < route_solver.route_cost(cost, greedy)
+
+
+class TestRouteService:
+    """Test route optimization over stored destinations"""
+
+    @pytest.mark.asyncio
+    async def test_optimize_route(self, async_db_session, sample_destination_data):
+        """Test destinations are ordered along the shortest route"""
+        from app.models.database_models import Destination
+        from app.services.route_service import RouteService
+
+        places = {
+            "Pantai Kuta": (-8.7184, 115.1686),
+            "Pura Uluwatu": (-8.8291, 115.0849),
+            "Pura Tanah Lot": (-8.6212, 115.0868),
+            "Ubud": (-8.5069, 115.2625),
+        }
+        for name, (latitude, longitude) in places.items():
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "slug": name.lower().replace(" ", "-")
+            }))
+        await async_db_session.flush()
+
+        route = await RouteService(db=async_db_session).optimize_route(
+            destinations=["Ubud", "Pura Uluwatu", "Pura Tanah Lot", "Gunung Entah"],
+            start_location="Pantai Kuta",
+            preferences={"transportation": "car"}
+        )
+
+        assert route["optimized_route"] == ["Pura Uluwatu", "Pura Tanah Lot", "Ubud", "Gunung Entah"]
+        assert route["unresolved_destinations"] == ["Gunung Entah"]
+        assert [leg["from"] for leg in route["route_details"]] == ["Pantai Kuta", "Pura Uluwatu", "Pura Tanah Lot"]
+        assert all(leg["transportation"] == "car" for leg in route["route_details"])
+        assert route["total_distance"] == pytest.approx(
+            sum(leg["distance_km"] for leg in route["route_details"])
+        )
+        assert route["optimization_score"] == 1.0
+        assert route["improvement"] > 0
+
 
 class TestItineraryService:
     """Test itinerary service functionality"""
     
     @pytest.fixture
-    def itinerary_service(self, db_session):
+    def itinerary_service(self, async_db_session):
         """Create itinerary service instance for testing"""
-        return ItineraryService()
+        return ItineraryService(db=async_db_session)
+    
+    @pytest_asyncio.fixture
+    async def bali_destinations(self, async_db_session, sample_destination_data):
+        """Stored destinations around Bali for the planner to choose from"""
+        from app.models.database_models import Destination
+        
+        places = {
+            "Pantai Kuta": (-8.7184, 115.1686),
+            "Pantai Seminyak": (-8.6913, 115.1571),
+            "Pura Tanah Lot": (-8.6212, 115.0868),
+        }
+        for name, (latitude, longitude) in places.items():
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "province": "Bali",
+                "slug": name.lower().replace(" ", "-")
+            }))
+        await async_db_session.flush()
+        return list(places)
     
     @pytest.mark.asyncio
-    async def test_generate_itinerary(self, itinerary_service, sample_itinerary_request):
+    async def test_generate_itinerary(self, itinerary_service, bali_destinations):
         """Test itinerary generation"""
         from app.models.schemas import ItineraryGenerationRequest, TravelerType, ActivityLevel
         
@@ -187,61 +1638,583 @@ class TestItineraryService:
         assert result.confidence_score <= 1
     
     @pytest.mark.asyncio
-    async def test_create_mock_itinerary(self, itinerary_service, sample_itinerary_request):
-        """Test mock itinerary creation"""
+    async def test_generate_itinerary_stream(self, itinerary_service, bali_destinations):
+        """Test streamed itineraries send the header, each day, then the totals"""
         from app.models.schemas import ItineraryGenerationRequest, TravelerType, ActivityLevel
         
         request = ItineraryGenerationRequest(
-            destination="Jakarta",
-            duration=2,
-            budget=3000000,
+            destination="Bali",
+            duration=5,
+            budget=5000000,
             traveler_count=2,
             traveler_type=TravelerType.COUPLE,
-            interests=["kuliner", "budaya"],
+            interests=["pantai"],
             activity_level=ActivityLevel.MODERATE
         )
         
-        result = await itinerary_service._create_mock_itinerary(request)
+        frames = [frame async for frame in itinerary_service.generate_itinerary_stream(request)]
         
-        assert result is not None
-        assert result.total_duration == 2
-        assert result.traveler_count == 2
-        assert result.traveler_type == TravelerType.COUPLE
-        assert len(result.days) == 2
+        assert [event for event, _ in frames] == ["header"] + ["day"] * 5 + ["summary"]
+        header = frames[0][1]
+        assert header.title == "Perjalanan 5 Hari ke Bali"
+        assert header.days == []
+        days = [data for event, data in frames if event == "day"]
+        assert [day.day for day in days] == [1, 2, 3, 4, 5]
+        summary = frames[-1][1]
+        assert summary["total_cost"] == sum(day.total_cost for day in days)
+        assert 0 <= summary["confidence_score"] <= 1
+    
+    @pytest.mark.asyncio
+    async def test_no_destinations_found(self, itinerary_service, bali_destinations):
+        """Test trips to places without stored destinations fail instead of using made-up ones"""
+        from app.models.schemas import ItineraryGenerationRequest
+        from app.services.itinerary_service import NoDestinationsFoundError
+        
+        request = ItineraryGenerationRequest(
+            destination="Atlantis",
+            duration=2,
+            budget=3000000,
+            traveler_count=2,
+            traveler_type=TravelerType.COUPLE
+        )
+        
+        with pytest.raises(NoDestinationsFoundError, match="Atlantis"):
+            await itinerary_service.generate_itinerary(request)
+        frames = []
+        with pytest.raises(NoDestinationsFoundError):
+            async for frame in itinerary_service.generate_itinerary_stream(request):
+                frames.append(frame)
+        assert frames == []  # no header with an itinerary id that is never saved
+    
+    @pytest.mark.asyncio
+    async def test_typo_in_destination_still_planned(self, itinerary_service, bali_destinations):
+        """Test a misspelled place falls back to a typo-tolerant anchor match"""
+        from app.models.schemas import ItineraryGenerationRequest
+        
+        request = ItineraryGenerationRequest(
+            destination="Seminyk",
+            duration=1,
+            budget=3000000,
+            traveler_count=2,
+            traveler_type=TravelerType.COUPLE
+        )
+        result = await itinerary_service.generate_itinerary(request)
         
-        # Check that each day has items
-        for day in result.days:
-            assert len(day.items) > 0
-            assert day.total_cost > 0
+        assert {item.destination.name for item in result.itinerary.days[0].items} <= set(bali_destinations)
+        assert result.itinerary.days[0].items
+
+
+class TestItineraryPersistence:
+    """Test storing and loading itineraries"""
     
-    def test_create_mock_destinations_bali(self, itinerary_service):
-        """Test mock destination creation for Bali"""
-        destinations = itinerary_service._create_mock_destinations("Bali")
+    @staticmethod
+    async def generated_itinerary(db, sample_destination_data, days=30, items_per_day=5):
+        """A stored-destination itinerary of days x items_per_day items"""
+        import uuid
+        from datetime import date, datetime, timedelta
+        from app.models.database_models import Destination
+        from app.models.schemas import (
+            ItineraryGenerationResponse, ItinerarySchema, ItineraryDaySchema,
+            ItineraryItemSchema, TransportationSchema
+        )
         
-        assert len(destinations) > 0
-        # Should have Bali-specific destinations
-        destination_names = [dest.name for dest in destinations]
-        assert any("Bali" in name or "Kuta" in name or "Ubud" in name or "Tanah Lot" in name 
-                  for name in destination_names)
+        destinations = []
+        for i in range(items_per_day):
+            destination = Destination(**{
+                **sample_destination_data, "name": f"Tempat {i}", "slug": f"tempat-{i}",
+                "latitude": sample_destination_data["latitude"] + 0.02 * i
+            })
+            db.add(destination)
+            destinations.append(destination)
+        await db.flush()
+        schemas = await DestinationService(db=db).get_destinations_by_ids([d.id for d in destinations])
+        
+        return ItineraryGenerationResponse(
+            itinerary=ItinerarySchema(
+                id=str(uuid.uuid4()),
+                title="Perjalanan",
+                description="Itinerary",
+                days=[
+                    ItineraryDaySchema(
+                        day=day,
+                        date=date(2026, 10, 19) + timedelta(days=day - 1),
+                        items=[
+                            ItineraryItemSchema(
+                                id=str(uuid.uuid4()),
+                                destination=schema,
+                                start_time=f"{8 + 2 * index:02d}:00",
+                                end_time=f"{9 + 2 * index:02d}:30",
+                                duration=90,
+                                estimated_cost=10000 * (index + 1),
+                                transportation_to_next=TransportationSchema(
+                                    type="car", duration=20, cost=15000, description="ke berikutnya"
+                                ) if index < items_per_day - 1 else None
+                            )
+                            for index, schema in enumerate(schemas)
+                        ],
+                        total_cost=150000,
+                        notes=f"Hari {day}"
+                    )
+                    for day in range(1, days + 1)
+                ],
+                total_cost=150000 * days,
+                total_duration=days,
+                traveler_count=2,
+                traveler_type=TravelerType.COUPLE,
+                created_at=datetime(2026, 10, 1, 12, 0),
+                updated_at=datetime(2026, 10, 1, 12, 0)
+            ),
+            ai_reasoning="Alasan",
+            confidence_score=0.85
+        )
     
-    def test_create_mock_destinations_generic(self, itinerary_service):
-        """Test mock destination creation for generic location"""
-        destinations = itinerary_service._create_mock_destinations("Unknown City")
+    @pytest.mark.asyncio
+    async def test_itinerary_saved_and_loaded_in_constant_queries(
+        self, async_db_session, query_counter, sample_destination_data
+    ):
+        """Test a 30-day, 150-item itinerary round-trips in a few statements"""
+        generated = await self.generated_itinerary(async_db_session, sample_destination_data)
+        service = ItineraryService(db=async_db_session)
+        
+        query_counter.reset()
+        await service.save_itinerary(generated)
+        assert query_counter.count == 3  # itinerary, days, items
         
-        assert len(destinations) > 0
-        # Should have at least one destination
-        assert destinations[0].name is not None
-        assert destinations[0].location is not None
+        query_counter.reset()
+        loaded = await service.get_itinerary(generated.itinerary.id)
+        # itinerary, days, items, destinations, tags, facilities
+        assert query_counter.count == 6
+        assert loaded == generated.itinerary
+    
+    @pytest.mark.asyncio
+    async def test_itinerary_update_and_delete(self, async_db_session, sample_destination_data):
+        """Test stored itineraries can be renamed and deleted"""
+        generated = await self.generated_itinerary(async_db_session, sample_destination_data, days=2, items_per_day=2)
+        service = ItineraryService(db=async_db_session)
+        await service.save_itinerary(generated)
+        itinerary_id = generated.itinerary.id
+        
+        updated = await service.update_itinerary(itinerary_id, ItineraryUpdateRequest(title="Bulan Madu"))
+        assert updated.title == "Bulan Madu"
+        assert updated.days == generated.itinerary.days
+        with pytest.raises(ValueError):
+            ItineraryUpdateRequest(total_cost=0)
+        with pytest.raises(ValueError):
+            ItineraryUpdateRequest(title=None)
+        cleared = await service.update_itinerary(itinerary_id, ItineraryUpdateRequest(description=None))
+        assert (cleared.title, cleared.description) == ("Bulan Madu", "")
+        
+        assert await service.delete_itinerary(itinerary_id) is True
+        assert await service.get_itinerary(itinerary_id) is None
+        assert await service.delete_itinerary(itinerary_id) is False
+        assert await service.update_itinerary(itinerary_id, ItineraryUpdateRequest(title="x")) is None
+        assert await service.get_itinerary("bukan-id") is None
 
+    
+    @pytest.mark.asyncio
+    @pytest.mark.query_budget(20)
+    async def test_itinerary_operations_retime_only_touched_days(
+        self, async_db_session, query_counter, sample_destination_data
+    ):
+        """Test move/insert/remove operations re-time and re-cost only the days they touch"""
+        generated = await self.generated_itinerary(async_db_session, sample_destination_data, items_per_day=3)
+        service = ItineraryService(db=async_db_session)
+        await service.save_itinerary(generated)
+        original = generated.itinerary.days
+        moved, removed = original[0].items[2], original[0].items[0]
+        added = original[9].items[1].destination
+        
+        query_counter.reset()
+        updated = await service.update_itinerary(generated.itinerary.id, ItineraryUpdateRequest(operations=[
+            {"op": "move", "item_id": moved.id.upper(), "to_day": 5, "position": 0},
+            {"op": "remove", "item_id": removed.id.replace("-", "")},
+            {"op": "insert", "destination_id": added.id, "day": 5, "duration": 60}
+        ]))
+        # Only the two touched days' rows are loaded and written, however long the trip
+        writes = [statement for statement in query_counter.statements if not statement.startswith("SELECT")]
+        assert len(writes) <= 10
+        
+        first, fifth = updated.days[0], updated.days[4]
+        assert [item.id for item in first.items] == [original[0].items[1].id]
+        assert first.items[0].start_time == "08:00"
+        assert first.items[0].transportation_to_next is None
+        assert first.total_cost == 20000
+        
+        assert [item.id for item in fifth.items[:4]] == [moved.id] + [item.id for item in original[4].items]
+        inserted = fifth.items[-1]
+        assert inserted.destination.id == added.id
+        assert (inserted.duration, inserted.estimated_cost) == (60, 50000 * 2)
+        assert fifth.items[0].start_time == "08:00"
+        for item, following in zip(fifth.items, fifth.items[1:]):
+            assert item.transportation_to_next is not None
+            assert item.end_time <= following.start_time
+        assert fifth.items[-1].transportation_to_next is None
+        assert fifth.total_cost == sum(item.estimated_cost for item in fifth.items) + 2 * sum(
+            item.transportation_to_next.cost for item in fifth.items[:-1]
+        )
+        
+        assert updated.days[1:4] == original[1:4]
+        assert updated.days[5:] == original[5:]
+        assert updated.total_cost == pytest.approx(sum(day.total_cost for day in updated.days))
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("operations", [
+        [{"op": "remove", "item_id": "ITEM"}, {"op": "remove", "item_id": "ITEM"}],
+        [{"op": "move", "item_id": "ITEM", "to_day": 3}],
+        [{"op": "move", "item_id": "bukan-id", "to_day": 1}],
+        [{"op": "insert", "destination_id": "bukan-id", "day": 1}],
+        [{"op": "insert", "destination_id": "DESTINATION", "day": 1, "duration": 16 * 60}]  # runs past midnight
+    ])
+    async def test_invalid_itinerary_operations_rejected(self, async_db_session, sample_destination_data, operations):
+        """Test operations on unknown items, days or destinations are rejected"""
+        from app.services.itinerary_service import InvalidItineraryUpdateError
+        
+        generated = await self.generated_itinerary(async_db_session, sample_destination_data, days=2, items_per_day=2)
+        service = ItineraryService(db=async_db_session)
+        await service.save_itinerary(generated)
+        item = generated.itinerary.days[0].items[0]
+        placeholders = {"ITEM": item.id, "DESTINATION": item.destination.id}
+        
+        with pytest.raises(InvalidItineraryUpdateError):
+            await service.update_itinerary(generated.itinerary.id, ItineraryUpdateRequest(operations=[
+                {key: placeholders.get(value, value) for key, value in op.items()} for op in operations
+            ]))
+
+class TestItineraryPlanner:
+    """Test the constraint-based itinerary planner"""
+    
+    @staticmethod
+    def candidate(name, category, latitude, longitude, rating=4.5, entry_fee=None, opening_hours=None):
+        import uuid
+        from app.models.schemas import DestinationSchema, LocationSchema
+        from app.services.itinerary_planner import PlannerCandidate
+        
+        return PlannerCandidate(
+            DestinationSchema(
+                id=str(uuid.uuid4()),
+                name=name,
+                description=name,
+                location=LocationSchema(
+                    latitude=latitude, longitude=longitude, address="", city="Badung", province="Bali"
+                ),
+                category=category,
+                rating=rating,
+                review_count=200,
+                price_range="moderate"
+            ),
+            entry_fee=entry_fee,
+            opening_hours=opening_hours
+        )
+    
+    @staticmethod
+    def request(**overrides):
+        from datetime import date
+        from app.models.schemas import ItineraryGenerationRequest
+        
+        return ItineraryGenerationRequest(**{
+            "destination": "Bali",
+            "duration": 1,
+            "budget": 5000000,
+            "traveler_count": 2,
+            "traveler_type": TravelerType.COUPLE,
+            "activity_level": ActivityLevel.LOW,
+            "start_date": date(2026, 10, 19),  # a Monday
+            **overrides
+        })
+    
+    def test_month_long_trip_planned_quickly(self):
+        """Test a 30-day plan is fast, never repeats a stop and stays in budget"""
+        import time
+        import numpy as np
+        from app.models.schemas import DestinationCategory
+        from app.services.itinerary_planner import plan_days
+        from app.utils.geo import haversine_km
+        
+        rng = np.random.default_rng(7)
+        categories = list(DestinationCategory)
+        candidates = [
+            self.candidate(
+                f"Tempat {i}", categories[i % len(categories)],
+                -8.6 + rng.uniform(-0.4, 0.4), 115.2 + rng.uniform(-0.4, 0.4),
+                rating=3.5 + (i % 15) / 10
+            )
+            for i in range(200)
+        ]
+        request = self.request(duration=30, budget=50000000, activity_level=ActivityLevel.HIGH)
+        
+        started = time.perf_counter()
+        days = list(plan_days(request, candidates, anchor=(-8.6, 115.2)))
+        elapsed = time.perf_counter() - started
+        
+        assert elapsed < 0.1
+        assert [day.day for day in days] == list(range(1, 31))
+        names = [item.destination.name for day in days for item in day.items]
+        assert len(names) > 90
+        assert len(names) == len(set(names))
+        assert sum(day.total_cost for day in days) <= request.budget
+        
+        # Each day's stops are closer together than stops picked at random
+        def spread(stops):
+            return np.mean([
+                haversine_km(a.location.latitude, a.location.longitude, b.location.latitude, b.location.longitude)
+                for a, b in zip(stops, stops[1:])
+            ])
+        day_spread = np.mean([spread([item.destination for item in day.items]) for day in days if len(day.items) > 1])
+        all_stops = [item.destination for day in days for item in day.items]
+        assert day_spread < spread(list(rng.permutation(all_stops))) / 2
+        
+        for day in days:
+            for item, next_item in zip(day.items, day.items[1:]):
+                assert item.end_time <= next_item.start_time
+    
+    def test_interests_and_opening_hours(self):
+        """Test interests pick the stops and visits fit inside opening hours"""
+        from app.services.itinerary_planner import WEEKDAYS, plan_days
+        
+        late_opening = {day: [{"open": "10:00", "close": "16:00"}] for day in WEEKDAYS}
+        closed_monday = {day: [{"open": "08:00", "close": "17:00"}] for day in WEEKDAYS if day != "monday"}
+        candidates = [
+            self.candidate("Pantai Kuta", "beach", -8.72, 115.17),
+            self.candidate("Pantai Seminyak", "beach", -8.69, 115.16, opening_hours=late_opening),
+            self.candidate("Museum Bali", "historical", -8.65, 115.22, rating=4.9),
+            self.candidate("Pasar Seni", "shopping", -8.70, 115.18, rating=4.9),
+        ]
+        
+        day = next(plan_days(self.request(interests=["pantai"]), candidates))
+        items = {item.destination.name: item for item in day.items}
+        assert set(items) == {"Pantai Kuta", "Pantai Seminyak"}
+        assert items["Pantai Seminyak"].start_time >= "10:00"
+        assert items["Pantai Seminyak"].end_time <= "16:00"
+        
+        candidates[2].opening_hours = closed_monday
+        day = next(plan_days(self.request(interests=["sejarah"]), candidates))
+        assert "Museum Bali" not in [item.destination.name for item in day.items]
+    
+    def test_budget_limits_stops(self):
+        """Test stops the budget cannot cover are left out"""
+        from app.services.itinerary_planner import plan_days
+        
+        candidates = [self.candidate("Taman Mahal", "nature", -8.6, 115.2, entry_fee=1000000)]
+        
+        day = next(plan_days(self.request(budget=500000), candidates))
+        assert day.items == []
+        assert day.total_cost == 0
+        assert "bebas" in day.notes
+    
+    def test_retimed_visits_stay_within_opening_hours_and_the_day(self):
+        """Test visits kept in place are re-timed, or rejected when they cannot fit"""
+        from datetime import date
+        from app.services.distance_matrix import get_distance_matrix
+        from app.services.itinerary_planner import UnschedulableVisitError, Visit, retime_visits
+        
+        monday = date(2026, 10, 19)
+        distances = get_distance_matrix([("a", -8.72, 115.17), ("b", -8.70, 115.17)])
+        afternoons = {"monday": [{"open": "14:00", "close": "18:00"}]}
+        
+        times = retime_visits([Visit("a", "A", 120), Visit("b", "B", 60, afternoons)], monday, 8 * 60, distances)
+        assert [(time.start_time, time.end_time) for time in times] == [("08:00", "10:00"), ("14:00", "15:00")]
+        assert times[0].transportation_to_next is not None
+        
+        closed = {"tuesday": [{"open": "08:00", "close": "18:00"}]}
+        with pytest.raises(UnschedulableVisitError):
+            retime_visits([Visit("a", "A", 120), Visit("b", "B", 60, closed)], monday, 8 * 60, distances)
+        with pytest.raises(UnschedulableVisitError):
+            retime_visits([Visit("a", "A", 180), Visit("b", "B", 120)], monday, 20 * 60, distances)
+    
+    @pytest.mark.asyncio
+    async def test_itinerary_planned_from_database(self, async_db_session, sample_destination_data):
+        """Test generated itineraries are planned from stored destinations"""
+        from app.models.database_models import Destination
+        
+        fees = {"Pantai Kuta": 0, "Pantai Seminyak": 0, "Pura Uluwatu": 50000, "Tanah Lot": 60000, "Monas": 0}
+        places = {
+            "Pantai Kuta": (-8.7184, 115.1686),
+            "Pantai Seminyak": (-8.6913, 115.1571),
+            "Pura Uluwatu": (-8.8291, 115.0849),
+            "Tanah Lot": (-8.6212, 115.0868),
+            "Monas": (-6.1754, 106.8272),  # Jakarta, outside the trip's radius
+        }
+        for name, (latitude, longitude) in places.items():
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "entry_fee": fees[name],
+                "opening_hours": {"monday": [{"open": "09:00", "close": "18:00"}]},
+                "slug": name.lower().replace(" ", "-")
+            }))
+        await async_db_session.flush()
+        
+        service = ItineraryService(db=async_db_session)
+        result = await service.generate_itinerary(self.request(destination="Kuta", duration=2))
+        
+        days = result.itinerary.days
+        assert [len(day.items) for day in days] == [2, 0]  # only open on Mondays
+        assert {item.destination.name for item in days[0].items} <= set(places) - {"Monas"}
+        assert days[0].items[0].start_time >= "09:00"
+        assert days[0].items[0].transportation_to_next.type == "car"
+        assert days[0].items[-1].transportation_to_next is None
+        assert result.itinerary.total_cost == sum(day.total_cost for day in days)
+
+
+
+class TestItineraryTemplates:
+    """Test precomputed itinerary templates for popular trips"""
+    
+    def test_template_demand(self):
+        """Test requests are counted per trip and the most requested ones kept"""
+        from app.services.itinerary_templates import TemplateDemand, template_key
+        
+        request = TestItineraryPlanner.request
+        assert template_key(request(destination="Bali ", interests=["Pantai", "kuliner"])) == template_key(
+            request(destination="bali", interests=["kuliner", "pantai"], budget=1000000, traveler_count=5)
+        )
+        assert template_key(request(duration=2)) != template_key(request(duration=3))
+        
+        demand = TemplateDemand(max_keys=4)
+        for _ in range(3):
+            demand.record(request(destination="Bali"))
+        demand.record(request(destination="Lombok", traveler_count=3))
+        demand.record(request(destination="Lombok", traveler_count=4))
+        demand.record(request(destination="Bandung"))
+        top = demand.top(5, min_requests=2)
+        assert [(r.destination, r.traveler_count) for r in top] == [("Bali", 2), ("Lombok", 4)]
+        
+        demand.decay()
+        assert [r.destination for r in demand.top(5)] == ["Bali", "Lombok"]
+        for i in range(5):
+            demand.record(request(destination=f"Kota {i}"))
+        assert len(demand) <= 4
+    
+    @pytest.mark.asyncio
+    async def test_popular_trip_served_from_template(self, async_db_session, sample_destination_data):
+        """Test a trip with a stored template is adapted from it instead of planned"""
+        from datetime import date
+        from sqlalchemy import select
+        from app.models.database_models import Destination, Itinerary
+        
+        places = {
+            "Pantai Kuta": (-8.7184, 115.1686, 0),
+            "Pantai Seminyak": (-8.6913, 115.1571, 0),
+            "Pura Uluwatu": (-8.8291, 115.0849, 50000),
+            "Tanah Lot": (-8.6212, 115.0868, 60000),
+        }
+        for name, (latitude, longitude, fee) in places.items():
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "entry_fee": fee,
+                "slug": name.lower().replace(" ", "-")
+            }))
+        await async_db_session.flush()
+        
+        request = TestItineraryPlanner.request
+        service = ItineraryService(db=async_db_session)
+        assert await service.build_templates([request(destination="Kuta", duration=2)]) == 1
+        assert await service.build_templates([request(destination="Kuta", duration=2)]) == 1
+        result = await async_db_session.execute(select(Itinerary.id).where(Itinerary.is_template == True))
+        template_ids = result.scalars().all()
+        assert len(template_ids) == 1  # rebuilding replaces the trip's template
+        template = await service.get_itinerary(str(template_ids[0]))
+        
+        with patch.object(ItineraryService, "_create_itinerary", side_effect=AssertionError("planned")):
+            result = await service.generate_itinerary(
+                request(destination="kuta", duration=2, traveler_count=4, start_date=date(2026, 11, 2))
+            )
+        itinerary = result.itinerary
+        assert itinerary.id != template.id
+        assert itinerary.traveler_count == 4
+        assert [day.date for day in itinerary.days] == [date(2026, 11, 2), date(2026, 11, 3)]
+        for day, template_day in zip(itinerary.days, template.days):
+            assert [item.destination.id for item in day.items] == [item.destination.id for item in template_day.items]
+            assert not {item.id for item in day.items} & {item.id for item in template_day.items}
+            assert day.total_cost == pytest.approx(2 * template_day.total_cost)
+        assert itinerary.total_cost == pytest.approx(2 * template.total_cost)
+        assert await service.get_itinerary(itinerary.id) == itinerary
+        
+        # A template over the request's budget is not served
+        with patch.object(ItineraryService, "_create_itinerary", side_effect=AssertionError("planned")):
+            with pytest.raises(AssertionError):
+                await service.generate_itinerary(request(destination="Kuta", duration=2, budget=1))
+    
+    @pytest.mark.asyncio
+    async def test_template_not_served_when_closed_on_new_dates(self, async_db_session, sample_destination_data):
+        """Test a template moved to a weekday its places are closed on is planned afresh"""
+        from datetime import date
+        from app.models.database_models import Destination
+        
+        for name, latitude in [("Pantai Kuta", -8.7184), ("Pantai Legian", -8.7050)]:
+            async_db_session.add(Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "opening_hours": {"monday": [{"open": "09:00", "close": "18:00"}]},
+                "slug": name.lower().replace(" ", "-")
+            }))
+        await async_db_session.flush()
+        
+        request = TestItineraryPlanner.request  # starts on a Monday
+        service = ItineraryService(db=async_db_session)
+        assert await service.build_templates([request(destination="Kuta")]) == 1
+        
+        with patch.object(ItineraryService, "_create_itinerary", side_effect=AssertionError("planned")):
+            served = await service.generate_itinerary(request(destination="Kuta", start_date=date(2026, 10, 26)))
+            assert served.itinerary.days[0].items
+            with pytest.raises(AssertionError):
+                await service.generate_itinerary(request(destination="Kuta", start_date=date(2026, 10, 20)))
+    
+    @pytest.mark.asyncio
+    async def test_template_not_served_with_deactivated_destination(self, async_db_session, sample_destination_data):
+        """Test a template visiting a destination that was deactivated since is planned afresh"""
+        from app.models.database_models import Destination
+        
+        destinations = []
+        for name, latitude in [("Pantai Kuta", -8.7184), ("Pantai Legian", -8.7050)]:
+            destination = Destination(**{
+                **sample_destination_data,
+                "name": name,
+                "latitude": latitude,
+                "slug": name.lower().replace(" ", "-")
+            })
+            async_db_session.add(destination)
+            destinations.append(destination)
+        await async_db_session.flush()
+        
+        request = TestItineraryPlanner.request
+        service = ItineraryService(db=async_db_session)
+        assert await service.build_templates([request(destination="Kuta")]) == 1
+        template = await service._itinerary_from_template(request(destination="Kuta"))
+        assert {item.destination.name for day in template.days for item in day.items} == {"Pantai Kuta", "Pantai Legian"}
+        
+        destinations[1].is_active = False
+        await async_db_session.flush()
+        assert await service._itinerary_from_template(request(destination="Kuta")) is None
+        with patch.object(ItineraryService, "_create_itinerary", side_effect=AssertionError("planned")):
+            with pytest.raises(AssertionError):
+                await service.generate_itinerary(request(destination="Kuta"))
 
 class TestServiceIntegration:
     """Test service integration"""
     
     @pytest.mark.asyncio
-    async def test_ai_to_itinerary_flow(self):
+    async def test_ai_to_itinerary_flow(self, async_db_session, sample_destination_data):
         """Test complete flow from AI parsing to itinerary generation"""
+        from app.models.database_models import Destination
+        
+        async_db_session.add(Destination(**{
+            **sample_destination_data,
+            "name": "Monas",
+            "latitude": -6.1754,
+            "longitude": 106.8272,
+            "city": "Jakarta",
+            "slug": "monas"
+        }))
+        await async_db_session.flush()
         ai_service = AIService()
-        itinerary_service = ItineraryService()
+        itinerary_service = ItineraryService(db=async_db_session)
         
         # Parse query
         query = "Liburan 2 hari di Jakarta bersama pasangan, budget 3 juta"